@@ -0,0 +1,6 @@
+"""
+Headless benchmarks for utils/ (no Kivy, no display needed).
+
+    python -m benchmarks.run --sizes 100 1000 10000 --out bench.json
+    python -m benchmarks.run --compare bench.json
+"""
@@ -0,0 +1,197 @@
+"""
+Learner-session load simulator: many synthetic sessions (draw -> answer ->
+update_progress) in threads and processes, all against one progress
+directory, followed by an audit of the answer log for lost updates.
+
+    python -m benchmarks.contention --processes 4 --threads 8 --sessions 2000
+    python -m benchmarks.contention --unsafe    # answer-log lock off: shows the lost updates it prevents
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from benchmarks.run import percentile
+from benchmarks.synthetic import isolated_data, reset_caches, write_banks
+from utils import loader
+from utils.answer_log import answer_log
+from utils.progress_manager import initialize_all_progress_files
+from utils.progress_store import progress_store
+from utils.quiz_logic import draw_questions, update_progress
+
+CHAPTER = "basics"
+# Small banks, so that sessions keep answering the same questions.
+DEFAULT_BANK_SIZE = 40
+
+
+def run_worker(root, backend, worker, threads, sessions, accuracy, seed, unsafe):
+    """
+    One process: `threads` threads sharing `sessions` sessions. Returns the
+    number of answers and the draw / update latencies in seconds.
+    """
+    with isolated_data(root, backend):
+        answer_log.locking = not unsafe
+        draws, updates, answers = [], [], [0]
+        lock = threading.Lock()
+        remaining = [sessions]
+
+        def session_loop(rng):
+            mode = 'learn_new'
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                started = time.perf_counter()
+                questions = draw_questions(CHAPTER, mode)
+                draw_time = time.perf_counter() - started
+                if not questions:
+                    mode = 'review_old' if mode == 'learn_new' else 'learn_new'
+                    continue
+                times = []
+                for qtype, index, _ in questions:
+                    correct = rng.random() < accuracy
+                    started = time.perf_counter()
+                    update_progress(CHAPTER, qtype, index, correct, mode, response_ms=rng.randint(500, 5000))
+                    times.append(time.perf_counter() - started)
+                with lock:
+                    draws.append(draw_time)
+                    updates.extend(times)
+                    answers[0] += len(times)
+
+        pool = [threading.Thread(target=session_loop, args=(random.Random(seed * 1000 + worker * 100 + n),))
+                for n in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        progress_store.flush()
+        answer_log.locking = True
+        return answers[0], draws, updates
+
+
+def audit(root, backend):
+    """
+    Checks the journal of every answer, in sequence order: each streak must
+    follow from the previous one of the same question (lost update), every
+    sequence number must be unique, and a cold reload must end on the last
+    journaled streak.
+    """
+    with isolated_data(root, backend):
+        # without the lock, processes archive each other's records twice
+        unique = {json.dumps(record): record for record in answer_log.records(archived=True)}
+        records = sorted(unique.values(), key=lambda r: r[0])
+        lost = duplicates = 0
+        last, seen = {}, set()
+        for seq, _, chapter, qtype, index, correct, streak, _, _, mode in records:
+            duplicates += seq in seen
+            seen.add(seq)
+            key = (chapter, qtype, str(index))
+            previous = last.get(key, 0)
+            expected = previous if mode == "r" else (previous + 1 if correct else 0)
+            lost += streak != expected
+            last[key] = streak
+        reset_caches()
+        mismatched = sum(
+            1 for (chapter, qtype, qkey), streak in last.items()
+            if progress_store.get_streak(chapter, qtype, qkey) != streak
+        )
+        return {"records": len(records), "lost_updates": lost, "duplicate_seqs": duplicates,
+                "final_mismatches": mismatched}
+
+
+def disk_usage(progress_dir):
+    """Bytes per file kind in the progress directory."""
+    kinds = {"answer_log": 0, "archive": 0, "stats": 0, "snapshots": 0, "other": 0}
+    for path in Path(progress_dir).glob("*"):
+        size = path.stat().st_size
+        if path.name == "answers.log":
+            kinds["answer_log"] += size
+        elif path.name.startswith("answers_archive"):
+            kinds["archive"] += size
+        elif path.name == "answer_stats.json":
+            kinds["stats"] += size
+        elif path.name.startswith("learned_"):
+            kinds["snapshots"] += size
+        else:
+            kinds["other"] += size
+    kinds["total"] = sum(kinds.values())
+    return kinds
+
+
+def simulate(root, backend="json", processes=2, threads=4, sessions=400, accuracy=0.6,
+             bank_size=DEFAULT_BANK_SIZE, seed=0, unsafe=False):
+    root = Path(root)
+    write_banks(root / "data", bank_size, chapters=[CHAPTER])
+    with isolated_data(root, backend), contextlib.redirect_stdout(io.StringIO()):
+        initialize_all_progress_files()
+        progress_dir = loader.PROGRESS_DIR
+    before = disk_usage(progress_dir)
+
+    shares = [sessions // processes + (n < sessions % processes) for n in range(processes)]
+    jobs = [(str(root), backend, n, threads, shares[n], accuracy, seed, unsafe) for n in range(processes)]
+    started = time.perf_counter()
+    if processes == 1:
+        results = [run_worker(*jobs[0])]
+    else:
+        with multiprocessing.get_context("spawn").Pool(processes) as pool:
+            results = pool.starmap(run_worker, jobs)
+    elapsed = time.perf_counter() - started
+
+    answers = sum(r[0] for r in results)
+    draws = sorted(t for r in results for t in r[1])
+    updates = sorted(t for r in results for t in r[2])
+    after = disk_usage(progress_dir)
+    report = {
+        "config": {"backend": backend, "processes": processes, "threads": threads, "sessions": sessions,
+                   "accuracy": accuracy, "bank_size": bank_size, "locking": not unsafe},
+        "seconds": round(elapsed, 3),
+        "answers": answers,
+        "answers_per_s": round(answers / elapsed, 1),
+        "sessions_per_s": round(len(draws) / elapsed, 1),
+        "update_p50_ms": round(percentile(updates, 0.50) * 1000, 3),
+        "update_p99_ms": round(percentile(updates, 0.99) * 1000, 3),
+        "draw_p50_ms": round(percentile(draws, 0.50) * 1000, 3),
+        "draw_p99_ms": round(percentile(draws, 0.99) * 1000, 3),
+        "disk_before": before,
+        "disk_after": after,
+        "bytes_per_answer": round((after["total"] - before["total"]) / max(1, answers), 1),
+    }
+    report.update(audit(root, backend))
+    report["missing_records"] = answers - report["records"]
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent learner-session simulator for utils/ storage.")
+    parser.add_argument("--backend", choices=("json", "sqlite", "binary"), default="json")
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4, help="threads per process")
+    parser.add_argument("--sessions", type=int, default=400, help="sessions in total")
+    parser.add_argument("--accuracy", type=float, default=0.6, help="probability of a correct answer")
+    parser.add_argument("--bank-size", type=int, default=DEFAULT_BANK_SIZE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--unsafe", action="store_true", help="switch the answer-log lock off")
+    parser.add_argument("--keep", help="run in this directory and keep it (default: a temporary one)")
+    parser.add_argument("--out", help="also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = simulate(args.keep or tmp, args.backend, args.processes, args.threads, args.sessions,
+                          args.accuracy, args.bank_size, args.seed, args.unsafe)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    problems = report["lost_updates"] + report["missing_records"] + report["duplicate_seqs"] + report["final_mismatches"]
+    return 1 if problems and not args.unsafe else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,155 @@
+"""
+Load generator for server/quiz_server.py: simulated learners drawing rounds
+and answering them over keep-alive connections.
+
+    python -m server.quiz_server --state-dir /tmp/nvshu_load &
+    python -m benchmarks.loadgen --learners 50 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from benchmarks.run import percentile
+from server.quiz_server import DEFAULT_PORT
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection speaking JSON."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, payload=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        self.writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        data = await self.reader.readexactly(length)
+        return status, json.loads(data) if data else None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def learner_loop(host, port, learner_id, chapters, deadline, stats, rng):
+    """Draws rounds and answers every question at random until the deadline."""
+    conn = Connection(host, port)
+
+    async def timed(name, method, path, payload=None):
+        started = time.perf_counter()
+        try:
+            status, body = await conn.request(method, path, payload)
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            stats["errors"] += 1
+            conn.close()
+            conn.writer = None
+            return None
+        stats.setdefault(name, []).append(time.perf_counter() - started)
+        if status != 200:
+            stats["errors"] += 1
+            return None
+        return body
+
+    mode = "learn_new"
+    try:
+        while time.perf_counter() < deadline:
+            chapter = rng.choice(chapters)
+            drawn = await timed("draw", "POST", "/draw", {"learner": learner_id, "chapter": chapter, "mode": mode})
+            if not drawn or not drawn["questions"]:
+                mode = "review_old" if mode == "learn_new" else "learn_new"
+                continue
+            for question in drawn["questions"]:
+                if time.perf_counter() >= deadline:
+                    break
+                options = question["options"]
+                if question["qtype"] == "single":
+                    chosen = rng.choice(options)
+                else:
+                    chosen = rng.sample(options, min(len(options), rng.randint(2, 3)))
+                await timed("answer", "POST", "/answer", {
+                    "learner": learner_id, "round": drawn["round"], "item": question["item"],
+                    "chosen": chosen, "response_ms": rng.randint(800, 8000)})
+            await timed("progress", "GET", f"/progress?learner={learner_id}&chapter={chapter}")
+    finally:
+        conn.close()
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+async def run(host, port, learners, duration, prefix, seed):
+    conn = Connection(host, port)
+    try:
+        _, chapters = await conn.request("GET", "/chapters")
+    finally:
+        conn.close()
+    chapters = [c["chapter"] for c in chapters if c["single"] or c["multi"]]
+
+    stats = {"errors": 0}
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(
+        learner_loop(host, port, f"{prefix}{n}", chapters, deadline, stats, random.Random(seed + n))
+        for n in range(learners)
+    ))
+    elapsed = time.perf_counter() - started
+
+    errors = stats.pop("errors")
+    every = [t for latencies in stats.values() for t in latencies]
+    report = {
+        "learners": learners,
+        "seconds": round(elapsed, 3),
+        "requests_per_s": round(len(every) / elapsed, 1),
+        "errors": errors,
+        "all": summarize(every),
+        "endpoints": {name: summarize(latencies) for name, latencies in sorted(stats.items())},
+    }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load generator for the headless quiz server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--learners", type=int, default=20, help="concurrent simulated learners")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--prefix", default="load-", help="learner ids are <prefix><n>")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args.host, args.port, args.learners, args.duration, args.prefix, args.seed))
+    print(f"{report['learners']} learners, {report['seconds']} s: {report['requests_per_s']} req/s, "
+          f"p50 {report['all']['p50_ms']} ms, p99 {report['all']['p99_ms']} ms, errors {report['errors']}")
+    for name, stats in report["endpoints"].items():
+        print(f"  {name:<10} {stats['requests']:>8}  p50 {stats['p50_ms']:>8.3f} ms  p99 {stats['p99_ms']:>8.3f} ms")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
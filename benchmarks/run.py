@@ -0,0 +1,235 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.synthetic import isolated_data, reset_caches, write_banks
+from utils import loader
+from utils.distractors import INDEX_DIR_NAME as DISTRACTOR_DIR_NAME, distractor_index
+from utils.progress_manager import initialize_all_progress_files
+from utils.progress_store import progress_store
+from utils.question_ids import question_ids
+from utils.quiz_logic import draw_questions, get_question_indices, pick_options, update_progress
+from utils.search_index import INDEX_DIR_NAME, search_index
+
+DEFAULT_SIZES = (100, 1000, 10000)
+# Stop repeating an operation once it has used this much wall time.
+TIME_BUDGET_S = 1.0
+MAX_REPEATS = 200
+CHAPTER = "basics"
+# Building the search index tokenizes every text field; skip it for huge banks.
+SEARCH_MAX_SIZE = 10000
+# Distractor neighbours compare every answer string of a chapter with every other one.
+DISTRACTOR_MAX_SIZE = 100
+# Absolute limits checked on every run, with or without --compare: a slow
+# large-bank case is not a regression against a baseline that was slow too.
+BUDGETS = {
+    "search@1000": {"p50_ms": 1.0},
+    "search_phrase@1000": {"p50_ms": 1.0},
+    "search_index_load@1000": {"p50_ms": 100.0, "peak_kb": 32 * 1024},
+}
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def measure(fn, setup=None, budget=TIME_BUDGET_S, max_repeats=MAX_REPEATS):
+    """
+    Calls fn repeatedly (setup() before each call, untimed) and returns
+    throughput, p50/p99 latency and the peak traced memory of one extra call.
+    """
+    latencies = []
+    started = time.perf_counter()
+    while len(latencies) < max_repeats and (len(latencies) < 3 or time.perf_counter() - started < budget):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        "calls": len(latencies),
+        "ops_per_s": round(len(latencies) / total, 3) if total else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 4),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def bench_size(size, backend):
+    """Runs every operation against banks of `size` questions per chapter/type."""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp, isolated_data(tmp, backend):
+        write_banks(loader.DATA_DIR, size)
+        loader.save_settings({"questions_per_session": 10})
+        quiet = contextlib.redirect_stdout(io.StringIO())
+
+        def remove_progress():
+            for path in loader.PROGRESS_DIR.glob("learned_*"):
+                path.unlink()
+            loader.set_backend(loader.create_backend(backend))
+            reset_caches()
+
+        with quiet:
+            results["initialize_all_progress_files"] = measure(initialize_all_progress_files, remove_progress)
+
+        results["load_quiz_cold"] = measure(lambda: loader.load_quiz(CHAPTER, "single"), loader.quiz_cache.invalidate)
+        results["load_quiz_cached"] = measure(lambda: loader.load_quiz(CHAPTER, "single"))
+
+        progress = loader.load_progress(CHAPTER, "single")
+        results["load_progress"] = measure(lambda: loader.load_progress(CHAPTER, "single"))
+        results["save_progress"] = measure(lambda: loader.save_progress(CHAPTER, "single", progress))
+
+        quiz = loader.load_quiz(CHAPTER, "single")
+        results["get_question_indices"] = measure(lambda: get_question_indices(quiz, progress))
+
+        reset_caches()
+        results["draw_questions_first"] = measure(lambda: draw_questions(CHAPTER), reset_caches)
+        results["draw_questions"] = measure(lambda: draw_questions(CHAPTER))
+
+        if size <= SEARCH_MAX_SIZE:
+            def drop_search_index():
+                shutil.rmtree(loader.DATA_DIR / INDEX_DIR_NAME, ignore_errors=True)
+                search_index.invalidate()
+
+            results["search_index_build"] = measure(search_index.refresh, drop_search_index, max_repeats=5)
+            results["search_index_load"] = measure(search_index.refresh, search_index.invalidate, max_repeats=20)
+            results["search"] = measure(lambda: search_index.search("女书"))
+            results["search_phrase"] = measure(lambda: search_index.search("结交老同"))
+
+        if size <= DISTRACTOR_MAX_SIZE:
+            def drop_distractors():
+                shutil.rmtree(loader.DATA_DIR / DISTRACTOR_DIR_NAME, ignore_errors=True)
+                distractor_index.invalidate()
+
+            results["distractor_build"] = measure(lambda: distractor_index.chapter(CHAPTER), drop_distractors,
+                                                  max_repeats=5)
+            results["distractor_load"] = measure(lambda: distractor_index.chapter(CHAPTER),
+                                                 distractor_index.invalidate, max_repeats=20)
+            question = loader.load_quiz(CHAPTER, "single")[0]
+            key = question_ids.key(CHAPTER, "single", 0)
+            results["pick_options"] = measure(
+                lambda: pick_options("single", question, extra=distractor_index.distractors(CHAPTER, "single", key)))
+
+        counter = iter(range(10 ** 9))
+        results["update_progress"] = measure(
+            lambda: update_progress(CHAPTER, "single", next(counter) % size, True))
+        results["update_progress_flush"] = measure(
+            lambda: (update_progress(CHAPTER, "single", next(counter) % size, True), progress_store.flush()))
+
+        def journal_answers(count=100):
+            for _ in range(count):
+                update_progress(CHAPTER, "single", next(counter) % size, next(counter) % 3 != 0)
+
+        results["progress_compact"] = measure(progress_store.compact, journal_answers, max_repeats=20)
+        progress_store.flush()
+    return results
+
+
+def run(sizes, backend):
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": backend,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": {},
+    }
+    for size in sizes:
+        for op, stats in bench_size(size, backend).items():
+            report["results"][f"{op}@{size}"] = stats
+            print(f"{op + '@' + str(size):<40} p50 {stats['p50_ms']:>10.3f} ms  p99 {stats['p99_ms']:>10.3f} ms  "
+                  f"{stats['ops_per_s'] or 0:>12.1f} ops/s  peak {stats['peak_kb']:>10.1f} KB", file=sys.stderr)
+    return report
+
+
+def compare(report, baseline, threshold, min_delta_ms=0.0):
+    """
+    Returns the list of (key, baseline_p50, current_p50) that got slower than
+    threshold allows; differences under min_delta_ms are treated as noise.
+    """
+    regressions = []
+    for key, stats in report["results"].items():
+        base = baseline.get("results", {}).get(key)
+        if base is None or not base.get("p50_ms"):
+            continue
+        if (stats["p50_ms"] > base["p50_ms"] * (1 + threshold)
+                and stats["p50_ms"] - base["p50_ms"] >= min_delta_ms):
+            regressions.append((key, base["p50_ms"], stats["p50_ms"]))
+    return regressions
+
+
+def check_budgets(report, budgets=BUDGETS):
+    """Returns the list of (key, metric, budget, value) that exceed BUDGETS."""
+    over = []
+    for key, limits in budgets.items():
+        stats = report["results"].get(key)
+        if stats is None:
+            continue
+        for metric, budget in limits.items():
+            if stats[metric] > budget:
+                over.append((key, metric, budget, stats[metric]))
+    return over
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless benchmarks for loader, quiz_logic and progress_manager.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="questions per bank, e.g. 100 1000 10000 100000 1000000")
+    parser.add_argument("--backend", default="json", choices=["json", "sqlite", "binary"])
+    parser.add_argument("--out", type=Path, help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", type=Path, help="baseline report to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed p50 slowdown before flagging a regression (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05,
+                        help="ignore p50 slowdowns smaller than this many milliseconds")
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.backend)
+    regressions = []
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.threshold, args.min_delta_ms)
+        report["regressions"] = [{"key": k, "baseline_p50_ms": b, "p50_ms": c} for k, b, c in regressions]
+    over_budget = check_budgets(report)
+    report["over_budget"] = [{"key": k, "metric": m, "budget": b, "value": v} for k, m, b, v in over_budget]
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        args.out.write_text(text, encoding="utf-8")
+    elif not args.compare:
+        print(text)
+
+    if args.compare:
+        for key, base, current in regressions:
+            print(f"REGRESSION {key}: p50 {base:.3f} ms -> {current:.3f} ms", file=sys.stderr)
+        if not regressions:
+            print("no regressions", file=sys.stderr)
+    for key, metric, budget, value in over_budget:
+        print(f"OVER BUDGET {key}: {metric} {value} > {budget}", file=sys.stderr)
+    return 1 if regressions or over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
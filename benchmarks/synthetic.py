@@ -0,0 +1,84 @@
+import json
+import random
+from contextlib import contextmanager
+from pathlib import Path
+
+from utils import loader, progress_manager
+from utils.answer_log import answer_log
+from utils.distractors import distractor_index
+from utils.mastery import mastery_index
+from utils.progress_store import progress_store
+from utils.question_ids import question_ids
+from utils.sampler import sampler
+from utils.scheduler import scheduler
+from utils.search_index import search_index
+
+_HAN = "女书江永结交老同字音字形历史地理非遗保护田野调查音节表文记录方言土话"
+
+
+def _text(rng, length):
+    return "".join(rng.choice(_HAN) for _ in range(length))
+
+
+def make_bank(size, seed=0, multi=False):
+    """A bank in the real quiz_<chapter>_<qtype>.json schema."""
+    rng = random.Random(seed)
+    bank = []
+    for i in range(size):
+        bank.append({
+            "id": i,
+            "question": _text(rng, 24) + "？",
+            "correct_answers": [_text(rng, 8) for _ in range(3 if multi else 2)],
+            "wrong_options": [_text(rng, 8) for _ in range(5)],
+            "explanation": _text(rng, 80),
+        })
+    return bank
+
+
+def write_banks(data_dir, size, chapters=None):
+    """Writes single/multi banks of `size` questions for every chapter."""
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    for n, chapter in enumerate(chapters or progress_manager.CHAPTERS):
+        for qtype in progress_manager.Q_TYPES:
+            bank = make_bank(size, seed=n * 2 + (qtype == "multi"), multi=qtype == "multi")
+            with open(data_dir / f"quiz_{chapter}_{qtype}.json", "w", encoding="utf-8") as f:
+                json.dump(bank, f, ensure_ascii=False, indent=2)
+
+
+def reset_caches():
+    """Drops every in-process cache so the next call starts cold."""
+    loader.quiz_cache.invalidate()
+    progress_store.invalidate()
+    sampler.invalidate()
+    scheduler.invalidate()
+    mastery_index.invalidate()
+    search_index.invalidate()
+    question_ids.invalidate()
+    distractor_index.invalidate()
+    answer_log.invalidate()
+
+
+@contextmanager
+def isolated_data(root, backend="json"):
+    """
+    Points loader/progress_manager at `root` (data/, data/progress/, state/)
+    for the duration of the block, then restores the real paths.
+    """
+    root = Path(root)
+    saved = (loader.DATA_DIR, loader.PROGRESS_DIR, loader.STATE_FILE, loader.DB_FILE,
+             progress_manager.DATA_DIR, progress_manager.PROGRESS_DIR, loader._backend)
+    loader.DATA_DIR = progress_manager.DATA_DIR = root / "data"
+    loader.PROGRESS_DIR = progress_manager.PROGRESS_DIR = root / "data" / "progress"
+    loader.STATE_FILE = root / "state" / "settings.json"
+    loader.DB_FILE = root / "state" / "learner.db"
+    loader._backend = None
+    loader.set_backend(loader.create_backend(backend))
+    reset_caches()
+    try:
+        yield root
+    finally:
+        loader.get_backend().close()
+        (loader.DATA_DIR, loader.PROGRESS_DIR, loader.STATE_FILE, loader.DB_FILE,
+         progress_manager.DATA_DIR, progress_manager.PROGRESS_DIR, loader._backend) = saved
+        reset_caches()
@@ -13,11 +13,11 @@ package.domain = org.kivy
 source.dir = .
 
 # (list) Source files to include (let empty to include all the files)
-source.include_exts = py,kv,png,jpg,jpeg,ttf,json,atlas,txt
+source.include_exts = py,kv,png,jpg,jpeg,ttf,json,atlas,txt,bin
 
 # (list) List of inclusions using pattern matching
 #source.include_patterns = assets/*,images/*.png
-include_patterns = assets/fonts/*.ttf, app.kv, screens/*.py
+include_patterns = assets/fonts/*.ttf, app.kv, screens/*.py, screens/*.kv
 # (list) Source files to exclude (let empty to not exclude anything)
 #source.exclude_exts = spec
 
@@ -1,15 +1,56 @@
-from kivy.app import App
-from kivy.uix.screenmanager import ScreenManager, Screen
-from kivy.core.text import LabelBase
-from kivy.lang import Builder
-from kivy.properties import ListProperty
-
-from screens.menu_screen import MenuScreen
-from screens.chapter_screen import ChapterScreen
-from screens.learning_screen import LearningScreen
-from screens.testing_screen import TestingScreen
-from screens.settings_screen import SettingsScreen
-from screens.review_screen import ReviewScreen
+import importlib
+
+# Imported first so its clock starts before anything heavy is loaded.
+from utils.startup_profiler import startup_profiler
+
+with startup_profiler.measure("import", "kivy"):
+    from kivy.app import App
+    from kivy.clock import Clock
+    from kivy.uix.screenmanager import ScreenManager, Screen
+    from kivy.core.text import LabelBase
+    from kivy.lang import Builder
+    from kivy.logger import Logger
+    from kivy.properties import ListProperty
+
+with startup_profiler.measure("import", "utils"):
+    from utils.instrumentation import tracer
+    from utils.io_worker import io_worker
+    from utils.loader import STATE_FILE, load_settings
+    from utils.profiles import profile_manager
+    from utils.progress_store import progress_store
+    from utils.text_render_cache import text_cache
+    from utils.text_utils import configure_fonts, find_han_font
+
+# =============================================================
+# Lazy screen registry
+# =============================================================
+# name -> (module, class, kv file). Only the menu is built at launch; every
+# other screen is imported, has its kv rules loaded and is constructed the
+# first time HistoryScreenManager is asked for it.
+SCREEN_REGISTRY = {
+    'menu': ('screens.menu_screen', 'MenuScreen', None),
+    'chapter': ('screens.chapter_screen', 'ChapterScreen', 'screens/chapter_screen.kv'),
+    'learning': ('screens.learning_screen', 'LearningScreen', 'screens/learning_screen.kv'),
+    'testing': ('screens.testing_screen', 'TestingScreen', None),
+    'settings': ('screens.settings_screen', 'SettingsScreen', 'screens/settings_screen.kv'),
+    'review': ('screens.review_screen', 'ReviewScreen', 'screens/review_screen.kv'),
+    'search': ('screens.search_screen', 'SearchScreen', 'screens/search_screen.kv'),
+    'profiles': ('screens.profile_screen', 'ProfileScreen', 'screens/profile_screen.kv'),
+}
+_loaded_kv_files = set()
+
+
+def build_screen(name):
+    """Imports, loads the kv rules for and constructs one registered screen."""
+    module_name, class_name, kv_file = SCREEN_REGISTRY[name]
+    with startup_profiler.measure("import", module_name):
+        screen_class = getattr(importlib.import_module(module_name), class_name)
+    if kv_file and kv_file not in _loaded_kv_files:
+        with startup_profiler.measure("kv", kv_file):
+            Builder.load_file(kv_file)
+        _loaded_kv_files.add(kv_file)
+    with startup_profiler.measure("screen", name):
+        return screen_class(name=name)
 
 # =============================================================
 # Custom ScreenManager with History Tracking
@@ -17,18 +58,31 @@ from screens.review_screen import ReviewScreen
 class HistoryScreenManager(ScreenManager):
     """
     A custom ScreenManager that keeps track of the screen history.
+    Screens listed in SCREEN_REGISTRY are built on first use.
     """
     history = ListProperty()
 
+    def get_screen(self, name):
+        """
+        Returns the screen widget with the given name, building it first if it
+        is registered but has not been constructed yet.
+        """
+        if name in SCREEN_REGISTRY and name not in self.screen_names:
+            self.add_widget(build_screen(name))
+        return super(HistoryScreenManager, self).get_screen(name)
+
+    def has_screen(self, name):
+        return name in SCREEN_REGISTRY or super(HistoryScreenManager, self).has_screen(name)
+
     def on_current(self, instance, value):
         """
         Called whenever the 'current' screen changes. We use this to
         update our history list.
         """
         # The 'current' property is the name of the screen (a string).
-        # We find the actual screen widget from the name.
+        # We find the actual screen widget from the name (building it if needed).
         screen_widget = self.get_screen(value)
-        
+
         # Avoid adding the same screen twice in a row
         if not self.history or self.history[-1] != screen_widget:
             self.history.append(screen_widget)
@@ -44,22 +98,61 @@ class HistoryScreenManager(ScreenManager):
 
 # =============================================================
 
-Builder.load_file("app.kv")
+with startup_profiler.measure("kv", "app.kv"):
+    Builder.load_file("app.kv")
 
 # Register the custom font
-LabelBase.register(name="NvshuFont", fn_regular="assets/fonts/NyushuFirmiaItal-1.003.ttf")
+with startup_profiler.measure("font", "NvshuFont"):
+    LabelBase.register(name="NvshuFont", fn_regular="assets/fonts/NyushuFirmiaItal-1.003.ttf")
+
+# 汉字交给中文字体显示，女书字符仍用 NvshuFont（见 utils/text_utils.py）；
+# 找不到中文字体时保持原样，全部使用 NvshuFont
+with startup_profiler.measure("font", "HanFont"):
+    han_font_path = find_han_font()
+    if han_font_path:
+        LabelBase.register(name="HanFont", fn_regular=han_font_path)
+        configure_fonts(han="HanFont")
 
 class NvshuApp(App):
     def build(self):
+        # I/O 线程的回调统一回到主线程（下一帧）执行，回调里可以直接操作控件
+        io_worker.set_dispatcher(lambda callback, future: Clock.schedule_once(lambda dt: callback(future), 0))
+        # 回到上次使用的学习者（进度和设置都按学习者分开存放）
+        profile_manager.activate()
+        # NVSHU_TRACE or the "trace" setting turns on hot-path tracing
+        tracer.configure(load_settings())
         # Use our custom HistoryScreenManager instead of the default one
         sm = HistoryScreenManager()
-        sm.add_widget(MenuScreen(name='menu'))
-        sm.add_widget(ChapterScreen(name='chapter'))
-        sm.add_widget(LearningScreen(name='learning'))
-        sm.add_widget(TestingScreen(name='testing'))
-        sm.add_widget(SettingsScreen(name='settings'))
-        sm.add_widget(ReviewScreen(name='review'))
+        sm.add_widget(build_screen('menu'))
         return sm
 
+    def on_start(self):
+        # The first frame is drawn on the next clock tick after on_start.
+        Clock.schedule_once(self.report_startup, 0)
+
+    def report_startup(self, dt):
+        startup_profiler.mark("first_frame")
+        Logger.info(startup_profiler.report())
+        if startup_profiler.dump(STATE_FILE.parent / "startup_profile.json"):
+            Logger.info("Startup: 已写入 startup_profile.json")
+
+    def on_pause(self):
+        # Android may kill a paused app without calling on_stop, so persist now.
+        io_worker.drain(timeout=5)
+        progress_store.flush()
+        self.dump_trace()
+        return True
+
+    def on_stop(self):
+        io_worker.drain(timeout=5)
+        # fold the answer log into the progress snapshot, so the next start replays nothing
+        progress_store.compact()
+        Logger.info(f"TextCache: {text_cache.stats()}")
+        self.dump_trace()
+
+    def dump_trace(self):
+        if tracer.dump(STATE_FILE.parent):
+            Logger.info("Trace: 已写入 trace.json / trace_summary.json")
+
 if __name__ == '__main__':
     NvshuApp().run()
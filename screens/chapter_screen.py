@@ -3,7 +3,14 @@ from kivy.uix.button import Button
 from kivy.uix.popup import Popup
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
-from utils.loader import load_quiz, load_progress
+from utils.answer_log import answer_log
+from utils.io_worker import io_worker
+from utils.loader import load_settings
+from utils.mastery import mastery_index
+from utils.question_ids import question_ids
+from utils.quiz_logic import practice_round
+from utils.text_render_cache import CachedButton
+from utils.text_utils import to_markup
 # 关键：从我们新的 progress_manager 导入重置函数
 from utils.progress_manager import reset_chapter_progress
 
@@ -17,26 +24,33 @@ class ChapterScreen(Screen):
         self.populate_chapters()
 
     def populate_chapters(self):
+        """在 I/O 线程读取各章进度，读完后再填充章节列表。"""
+        io_worker.read("chapter_counts", self.chapter_counts, callback=self.show_chapters)
+
+    def chapter_counts(self):
+        """(章节, 标题, 已学会, 总题数) 列表；在 I/O 线程中运行。"""
+        # 掌握情况来自持久化的统计索引，不加载题库和进度
+        return [(key, title, *mastery_index.chapter_counts(key)) for key, title in self.chapter_map.items()]
+
+    def show_chapters(self, future):
         """清除并重新填充章节列表及其当前进度。"""
         self.ids.chapter_box.clear_widgets()
+        try:
+            chapters = future.result()
+        except Exception as e:
+            print(f"[chapter] 读取章节进度失败: {e}")
+            retry_btn = Button(text=to_markup('读取进度失败，点此重试'), markup=True, font_size="20sp", font_name="NvshuFont", size_hint_y=None, height="70dp")
+            retry_btn.bind(on_release=lambda b: self.populate_chapters())
+            self.ids.chapter_box.add_widget(retry_btn)
+            return
 
-        for key, title in self.chapter_map.items():
-            single_total = len(load_quiz(key, "single"))
-            multi_total = len(load_quiz(key, "multi"))
-            total_questions = single_total + multi_total
-
+        for key, title, total_learned, total_questions in chapters:
             if total_questions == 0: continue
 
-            single_prog = load_progress(key, "single")
-            multi_prog = load_progress(key, "multi")
-            
-            single_learned = sum(1 for v in single_prog.values() if v >= 2)
-            multi_learned = sum(1 for v in multi_prog.values() if v >= 2)
-            total_learned = single_learned + multi_learned
             progress_rate = (total_learned / total_questions) * 100
 
             progress_text = f"{title}\n进度: {progress_rate:.2f}%    𛉑𛋥：{total_learned}/{total_questions}"
-            btn = Button(text=progress_text, font_size="20sp", font_name="NvshuFont", size_hint_y=None, height="70dp", halign='center')
+            btn = CachedButton(text=to_markup(progress_text), markup=True, font_size="20sp", font_name="NvshuFont", size_hint_y=None, height="70dp", halign='center')
             btn.bind(on_release=lambda b, k=key, t=title, p=(total_learned/total_questions if total_questions > 0 else 0): self.show_chapter_options(k, t, p))
             self.ids.chapter_box.add_widget(btn)
             
@@ -47,27 +61,35 @@ class ChapterScreen(Screen):
         popup = Popup(title=chapter_title, content=content, size_hint=(0.9, 0.5), auto_dismiss=True, title_font='NvshuFont')
 
         if progress_ratio >= 1.0:
-            content.add_widget(Label(text='恭喜！本章已全部学会！', font_name="NvshuFont", font_size='24sp'))
+            content.add_widget(Label(text=to_markup('恭喜！本章已全部学会！'), markup=True, font_name="NvshuFont", font_size='24sp'))
             
-            review_btn = Button(text='复习旧闻\n𛋷𛆓𛆝𛋁', font_name="NvshuFont", font_size='20sp')
+            review_btn = Button(text=to_markup('复习旧闻\n𛋷𛆓𛆝𛋁'), markup=True, font_name="NvshuFont", font_size='20sp')
             # 绑定事件：先关闭当前弹窗，然后开始学习
             review_btn.bind(on_release=lambda x: (popup.dismiss(), self.start_learning(chapter_key, 'review_old')))
             content.add_widget(review_btn)
 
-            reset_btn = Button(text='重置学习进度\n𛊻𛋔𛉬𛆓𛉑𛋥', font_name="NvshuFont", font_size='20sp')
+            reset_btn = Button(text=to_markup('重置学习进度\n𛊻𛋔𛉬𛆓𛉑𛋥'), markup=True, font_name="NvshuFont", font_size='20sp')
             # 关键：绑定到新的、统一的确认流程
             reset_btn.bind(on_release=lambda x: (popup.dismiss(), self.confirm_reset(chapter_key)))
             content.add_widget(reset_btn)
 
+            missed_btn = Button(text=to_markup('复习易错题'), markup=True, font_name="NvshuFont", font_size='20sp')
+            missed_btn.bind(on_release=lambda x: (popup.dismiss(), self.start_missed(chapter_key)))
+            content.add_widget(missed_btn)
+
         else:
-            learn_btn = Button(text='学习新知\n𛉬𛆓𛊛𛇟', font_name="NvshuFont", font_size=36)
+            learn_btn = Button(text=to_markup('学习新知\n𛉬𛆓𛊛𛇟'), markup=True, font_name="NvshuFont", font_size=36)
             learn_btn.bind(on_release=lambda x: (popup.dismiss(), self.start_learning(chapter_key, 'learn_new')))
             content.add_widget(learn_btn)
             
-            review_btn = Button(text='复习旧闻\n𛋷𛆓𛆝𛋁', font_name="NvshuFont", font_size=36)
+            review_btn = Button(text=to_markup('复习旧闻\n𛋷𛆓𛆝𛋁'), markup=True, font_name="NvshuFont", font_size=36)
             review_btn.bind(on_release=lambda x: (popup.dismiss(), self.start_learning(chapter_key, 'review_old')))
             content.add_widget(review_btn)
 
+            missed_btn = Button(text=to_markup('复习易错题'), markup=True, font_name="NvshuFont", font_size=36)
+            missed_btn.bind(on_release=lambda x: (popup.dismiss(), self.start_missed(chapter_key)))
+            content.add_widget(missed_btn)
+
         popup.open()
         
     def confirm_reset(self, chapter_key):
@@ -76,11 +98,11 @@ class ChapterScreen(Screen):
         显示最终确认弹窗，防止误操作。
         """
         content = BoxLayout(orientation='vertical', padding=10, spacing=10)
-        content.add_widget(Label(text=f"您确定要重置\n'{self.get_chapter_display_name(chapter_key)}'\n的所有学习进度吗？\n此操作不可撤销！", halign='center', font_size='20sp'))
+        content.add_widget(Label(text=to_markup(f"您确定要重置\n'{self.get_chapter_display_name(chapter_key)}'\n的所有学习进度吗？\n此操作不可撤销！"), markup=True, halign='center', font_size='20sp'))
         
         btn_layout = BoxLayout(spacing=10, size_hint_y=None, height='48dp')
-        yes_btn = Button(text='确定重置\n𛆄𛉽𛊻𛋔', font_size='20sp')
-        no_btn = Button(text='取消\n𛉛𛈨', font_size='20sp')
+        yes_btn = Button(text=to_markup('确定重置\n𛆄𛉽𛊻𛋔'), markup=True, font_size='20sp')
+        no_btn = Button(text=to_markup('取消\n𛉛𛈨'), markup=True, font_size='20sp')
         btn_layout.add_widget(yes_btn)
         btn_layout.add_widget(no_btn)
         content.add_widget(btn_layout)
@@ -98,7 +120,11 @@ class ChapterScreen(Screen):
         执行重置，显示反馈，并刷新本页面。
         """
         popup_to_dismiss.dismiss()
-        reset_chapter_progress(chapter_key)
+        io_worker.write(("reset", chapter_key), reset_chapter_progress, chapter_key,
+                        callback=lambda future: self.on_reset_done(chapter_key))
+
+    def on_reset_done(self, chapter_key):
+        """重置写盘完成后（主线程）显示反馈并刷新本页面。"""
         self.show_feedback_popup(title="操作完成    𛋴𛊅𛆧𛈒", message=f"'{self.get_chapter_display_name(chapter_key)}' 的进度已重置。")
         # 核心：重置后，刷新章节列表以立即看到变化
         self.populate_chapters()
@@ -109,8 +135,8 @@ class ChapterScreen(Screen):
         通用的反馈弹窗。
         """
         content = BoxLayout(orientation='vertical', padding=10, spacing=10)
-        content.add_widget(Label(text=message, halign='center'))
-        ok_btn = Button(text='好的', size_hint_y=None, height='48dp')
+        content.add_widget(Label(text=to_markup(message), markup=True, halign='center'))
+        ok_btn = Button(text=to_markup('好的'), markup=True, size_hint_y=None, height='48dp')
         content.add_widget(ok_btn)
         popup = Popup(title=title, title_font='NvshuFont', content=content, size_hint=(0.7, 0.4))
         ok_btn.bind(on_release=popup.dismiss)
@@ -130,3 +156,32 @@ class ChapterScreen(Screen):
         learning_screen.chapter = chapter_key
         learning_screen.mode = mode
         self.manager.current = "learning"
+
+    def start_missed(self, chapter_key):
+        """按答题日志挑出本章答错次数最多的题目，组成一轮练习。"""
+        io_worker.read(("missed", chapter_key), self.load_missed, chapter_key, callback=self.start_missed_round)
+
+    @staticmethod
+    def load_missed(chapter_key):
+        """在 I/O 线程中运行：返回 (chapter, mode, questions)。"""
+        limit = load_settings().get("questions_per_session", 10)
+        missed = answer_log.most_missed(chapter_key, limit)
+        # 日志按题目 id 记录，换算成题目在当前题库中的位置；已删除的题目跳过
+        items = [(qtype, question_ids.position(chapter_key, qtype, qkey)) for _, qtype, qkey, _, _ in missed]
+        mode, questions = practice_round(chapter_key, [item for item in items if item[1] is not None], limit)
+        return chapter_key, mode, questions
+
+    def start_missed_round(self, future):
+        try:
+            chapter_key, mode, questions = future.result()
+        except Exception as e:
+            print(f"[chapter] 读取易错题失败: {e}")
+            return
+        if not questions:
+            self.show_feedback_popup(title="复习易错题", message="本章还没有答错过的题目。")
+            return
+        learning_screen = self.manager.get_screen("learning")
+        learning_screen.chapter = chapter_key
+        learning_screen.mode = mode
+        learning_screen.preset_questions = questions
+        self.manager.current = "learning"
@@ -1,14 +1,129 @@
-import random
+import time
 from kivy.uix.screenmanager import Screen
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
 from kivy.uix.button import Button
 from kivy.uix.scrollview import ScrollView
 from kivy.uix.popup import Popup
+from kivy.clock import Clock
 from kivy.properties import StringProperty, ListProperty, ObjectProperty, NumericProperty, BooleanProperty
 
-from utils.quiz_logic import draw_questions, update_progress
-from utils.loader import load_progress
+from utils.distractors import distractor_index
+from utils.instrumentation import traced
+from utils.io_worker import io_worker
+from utils.quiz_logic import draw_questions, is_correct_answer, pick_options, update_progress
+from utils.mastery import mastery_index
+from utils.progress_store import progress_store
+from utils.question_ids import question_ids
+from utils.scheduler import scheduler
+from utils.text_render_cache import CachedButton, CachedLabel
+from utils.text_utils import to_markup
+
+# 在用户阅读解析的空闲帧里提前准备后面几道题
+PREFETCH_DEPTH = 2
+
+UNSELECTED_COLOR = (0.5, 0.5, 0.5, 1)
+SELECTED_COLOR = (0.3, 0.7, 0.3, 1)
+DEFAULT_BUTTON_COLOR = (0.2, 0.2, 0.2, 1)
+
+
+class QuestionView(BoxLayout):
+    """
+    The question area of LearningScreen, built once and reused for every
+    question: the question label and option buttons are rebound (text,
+    colors, enabled state) instead of being recreated. Option buttons live in
+    a pool that only grows when a question has more options than ever before.
+    """
+
+    def __init__(self, screen, **kwargs):
+        super().__init__(orientation='vertical', spacing=10, **kwargs)
+        self.screen = screen
+        self.qtype = 'single'
+        self.option_buttons = []   # buttons currently shown, in option order
+        self._pool = []
+
+        self.q_label = CachedLabel(font_size="22sp", size_hint_y=None, halign='left', markup=True)
+        self.q_label.bind(texture_size=lambda i, v: setattr(i, 'height', v[1]))
+        self.q_scroll = ScrollView(size_hint_y=0.4, do_scroll_x=False)
+        self.q_scroll.add_widget(self.q_label)
+        self.add_widget(self.q_scroll)
+
+        self.options_box = BoxLayout(orientation='vertical', spacing=10, size_hint_y=None)
+        self.options_box.bind(minimum_height=self.options_box.setter('height'))
+        self.opt_scroll = ScrollView(size_hint_y=0.6, do_scroll_x=False)
+        self.opt_scroll.add_widget(self.options_box)
+        self.add_widget(self.opt_scroll)
+
+        self.submit_button = CachedButton(text=to_markup("提交选择"), markup=True, size_hint_y=None, height="48dp", font_size='24sp')
+        self.submit_button.bind(on_release=self.on_submit)
+
+        # Off-screen twins of the label/buttons above, used to lay out upcoming
+        # questions ahead of time; same options, so they share text_cache keys.
+        # One probe renders many strings: this relies on every miss getting its
+        # own texture (see TextCacheMixin.texture_update).
+        self._probe_label = CachedLabel(font_size="22sp", size_hint_y=None, halign='left', markup=True)
+        self._probe_button = CachedButton(font_size="18sp", size_hint_y=None, height="48dp", markup=True)
+
+    @staticmethod
+    def question_text(q_data):
+        qtype, _, question = q_data
+        return to_markup(f"[{'单选' if qtype == 'single' else '多选'}]\n\n{question['question']}")
+
+    def prerender(self, q_data, session_info):
+        """Renders a question's texts off-screen so show() later hits text_cache."""
+        self._probe_label.text_size = (self.screen.width * 0.85, None)
+        self._probe_label.text = self.question_text(q_data)
+        self._probe_label.texture_update()
+        for opt_text in session_info.get('options_shuffled', []):
+            self._probe_button.text = to_markup(opt_text)
+            self._probe_button.texture_update()
+        # the renders now belong to text_cache; the probes keep none alive after eviction
+        self._probe_label.texture = None
+        self._probe_button.texture = None
+
+    def show(self, q_data, session_info):
+        """Rebinds the widget tree to a question whose options are already prepared."""
+        qtype, _, question = q_data
+        self.qtype = qtype
+        self.q_label.text_size = (self.screen.width * 0.85, None)
+        self.q_label.text = self.question_text(q_data)
+        self.q_scroll.scroll_y = 1
+        self.opt_scroll.scroll_y = 1
+
+        options = session_info.get('options_shuffled', [])
+        while len(self._pool) < len(options):
+            btn = CachedButton(font_size="18sp", size_hint_y=None, height="48dp", markup=True)
+            btn.bind(on_release=self.on_option)
+            self._pool.append(btn)
+
+        self.options_box.clear_widgets()
+        self.option_buttons = self._pool[:len(options)]
+        selection = session_info.get('user_selection', set())
+        for btn, opt_text in zip(self.option_buttons, options):
+            # the shown text carries font markup; answers are compared by btn.option
+            btn.option = opt_text
+            btn.text = to_markup(opt_text)
+            btn.disabled = False
+            if qtype == 'single':
+                btn.background_color = DEFAULT_BUTTON_COLOR
+            else:
+                btn.background_color = SELECTED_COLOR if opt_text in selection else UNSELECTED_COLOR
+            self.options_box.add_widget(btn)
+
+        if qtype == 'multi':
+            self.submit_button.disabled = False
+            self.options_box.add_widget(self.submit_button)
+
+    def on_option(self, btn):
+        if self.qtype == 'single':
+            self.screen.check_answer(btn.option)
+        else:
+            self.screen.toggle_selection(btn)
+
+    def on_submit(self, btn):
+        session_info = self.screen.session_data[self.screen.pass_indices[self.screen.current_pass_pos]]
+        self.screen.check_answer(session_info.get('user_selection', set()))
+
 
 class LearningScreen(Screen):
     chapter = StringProperty("")
@@ -18,26 +133,90 @@ class LearningScreen(Screen):
     session_data = ListProperty([])
     pass_indices = ListProperty([]) 
     current_pass_pos = NumericProperty(0) 
+    # 本轮学会的题目数，在 check_answer 中增量维护
+    learned_count = NumericProperty(0)
+    progress_snapshot = {}
+    # 复用的题目/选项控件树，首次渲染时创建
+    question_view = None
+    # 下一轮（pass）已提前准备好选项的题目: index -> session_info
+    next_pass_prep = {}
+    # 由搜索页等直接指定的下一轮题目；为空时按章节抽题
+    preset_questions = []
+    _prefetch_event = None
+    # 当前题目显示出来的时刻，用于记录作答用时
+    _shown_at = None
     
     def on_enter(self, *args):
         self.start_new_round()
 
+    def on_leave(self, *args):
+        self.cancel_prefetch()
+        # 离开学习界面时把本轮积攒的进度一次性写盘（在 I/O 线程）
+        io_worker.write("progress", progress_store.flush)
+
     def start_new_round(self, *args):
-        """Initializes a learning round with a fixed set of 10 questions."""
-        self.questions = draw_questions(self.chapter, self.mode)
+        """
+        Prepares a learning round on the I/O worker; begin_round() runs on
+        the main thread once the questions have been drawn.
+        """
+        self.cancel_prefetch()
+        preset, self.preset_questions = self.preset_questions, []
+        self.ids.learned_label.text = "正在准备题目…"
+        key = ("round", self.chapter, self.mode, tuple((qtype, qidx) for qtype, qidx, _ in preset))
+        io_worker.read(key, self.load_round, self.chapter, self.mode, preset, callback=self.on_round_loaded)
+
+    @staticmethod
+    def load_round(chapter, mode, preset):
+        """
+        Runs on the I/O worker: draws the questions and loads everything that
+        answering them will touch (progress, review schedule, mastery index,
+        cross-question distractors).
+        """
+        questions = preset or draw_questions(chapter, mode)
+        distractor_index.chapter(chapter)
+        for qtype in ("single", "multi"):
+            progress_store.get(chapter, qtype)
+            scheduler.bank(chapter, qtype)
+            mastery_index.counts(chapter, qtype)
+        return questions
+
+    def on_round_loaded(self, future):
+        if self.manager is None or self.manager.current != self.name:
+            return  # the learner left while the round was being prepared
+        try:
+            questions = future.result()
+        except Exception as e:
+            print(f"[learning] 准备题目失败: {e}")
+            questions = []
+        self.begin_round(questions)
+
+    def begin_round(self, questions):
+        """Initializes a learning round with a fixed set of questions."""
+        self.questions = questions
         if not self.questions:
             self.show_no_questions_popup()
             return
 
         self.session_data = [{} for _ in self.questions]
+        self.next_pass_prep = {}
+        # One progress snapshot per round: the store's live dicts, so they always
+        # reflect what update_progress writes without touching the disk.
+        self.progress_snapshot = {
+            qtype: progress_store.get(self.chapter, qtype) for qtype in ("single", "multi")
+        }
+        self.learned_count = sum(1 for qtype, qidx, _ in self.questions if self.get_streak(qtype, qidx) >= 2)
         self.start_new_pass()
 
+    def get_streak(self, qtype, qidx):
+        """Returns the current streak of a question from the session snapshot (stored under its id)."""
+        return self.progress_snapshot[qtype].get(question_ids.key(self.chapter, qtype, qidx), 0)
+
     def start_new_pass(self):
         """Starts a new loop (pass) through questions not yet learned."""
         if self.mode == 'learn_new':
             self.pass_indices = [
                 i for i, (qtype, qidx, _) in enumerate(self.questions)
-                if load_progress(self.chapter, qtype).get(str(qidx), 0) < 2
+                if self.get_streak(qtype, qidx) < 2
             ]
             if not self.pass_indices:
                 self.show_end_of_round_popup()
@@ -46,92 +225,56 @@ class LearningScreen(Screen):
             self.pass_indices = list(range(len(self.questions)))
 
         for i in self.pass_indices:
-            self.session_data[i] = {}
+            # options prepared during the previous pass's idle frames, if any
+            self.session_data[i] = self.next_pass_prep.pop(i, {})
+        self.next_pass_prep = {}
         
         self.current_pass_pos = 0
         self.render_current_question()
+        self.schedule_prefetch()
 
+    @traced("render_current_question")
     def render_current_question(self):
         """Renders the question at the current position in the current pass."""
         if not self.pass_indices: return
         current_q_index = self.pass_indices[self.current_pass_pos]
         
-        self.ids.content_area.clear_widgets()
+        if self.question_view is None:
+            self.question_view = QuestionView(self)
+            self.ids.content_area.add_widget(self.question_view)
         self.ids.explanation_scroll.height = 0
         self.ids.explanation_scroll.opacity = 0
         self.update_ui_state()
 
         q_data = self.questions[current_q_index]
         session_info = self.session_data[current_q_index]
-        qtype, _, question = q_data
-
-        q_text = f"[{'单选' if qtype == 'single' else '多选'}]\n\n{question['question']}"
-        q_label = Label(text=q_text, font_size="22sp", size_hint_y=None, text_size=(self.width*0.85, None), halign='left')
-        q_label.bind(texture_size=lambda i, v: setattr(i, 'height', v[1]))
-        
-        q_scroll = ScrollView(size_hint_y=0.4, do_scroll_x=False); q_scroll.add_widget(q_label)
-        self.ids.content_area.add_widget(q_scroll)
-
-        options_box = self.build_options(q_data, session_info)
-        opt_scroll = ScrollView(size_hint_y=0.6, do_scroll_x=False); opt_scroll.add_widget(options_box)
-        self.ids.content_area.add_widget(opt_scroll)
+        self.prepare_options(q_data, session_info)
+        self.question_view.show(q_data, session_info)
 
         if session_info.get('answered'):
             self.show_feedback(session_info)
+        else:
+            self._shown_at = time.perf_counter()
 
-    def build_options(self, q_data, session_info):
-        """Builds the answer option widgets for the current question."""
-        qtype, _, question = q_data
-        container = BoxLayout(orientation='vertical', spacing=10, size_hint_y=None)
-        container.bind(minimum_height=container.setter('height'))
-        
-        if 'options_shuffled' not in session_info:
-            if qtype == "single":
-                correct = random.choice(question["correct_answers"])
-                session_info['correct_answers'] = [correct]
-                wrongs = random.sample(question["wrong_options"], min(3, len(question["wrong_options"])))
-                options = wrongs + [correct]
-            else:
-                corrects = question["correct_answers"]
-                num_corrects = random.randint(2, min(3, len(corrects)))
-                corrects_sample = random.sample(corrects, num_corrects)
-                session_info['correct_answers'] = corrects_sample
-                num_wrongs = max(1, 5 - len(corrects_sample))
-                wrongs_sample = random.sample(question["wrong_options"], min(len(question["wrong_options"]), num_wrongs))
-                options = corrects_sample + wrongs_sample
-            random.shuffle(options)
-            session_info['options_shuffled'] = options
-        
-        options = session_info.get('options_shuffled', [])
-        session_info['option_widgets'] = []
-        for opt_text in options:
-            btn = Button(text=opt_text, font_size="18sp", size_hint_y=None, height="48dp")
-            session_info['option_widgets'].append(btn)
-            if qtype == 'single':
-                btn.bind(on_release=lambda instance, s=opt_text: self.check_answer(s))
-            else: # multi
-                btn.background_color = (0.5, 0.5, 0.5, 1)
-                btn.bind(on_release=self.toggle_selection)
-            container.add_widget(btn)
-
-        if qtype == 'multi':
-            submit_btn = Button(text="提交选择", size_hint_y=None, height="48dp", font_size='24sp')
-            submit_btn.bind(on_release=lambda b: self.check_answer(session_info.get('user_selection', set())))
-            container.add_widget(submit_btn)
-            session_info['submit_button'] = submit_btn
-        return container
+    def prepare_options(self, q_data, session_info):
+        """Picks and shuffles the answer options of a question once per pass."""
+        if 'options_shuffled' in session_info:
+            return
+        qtype, qidx, question = q_data
+        extra = distractor_index.distractors(self.chapter, qtype, question_ids.key(self.chapter, qtype, qidx))
+        session_info['options_shuffled'], session_info['correct_answers'] = pick_options(qtype, question, extra=extra)
 
     def toggle_selection(self, btn):
         """Handles selection for multiple-choice questions."""
         current_q_index = self.pass_indices[self.current_pass_pos]
         session_info = self.session_data[current_q_index]
         selection_set = session_info.setdefault('user_selection', set())
-        if btn.text in selection_set:
-            selection_set.remove(btn.text)
-            btn.background_color = (0.5, 0.5, 0.5, 1)
+        if btn.option in selection_set:
+            selection_set.remove(btn.option)
+            btn.background_color = UNSELECTED_COLOR
         else:
-            selection_set.add(btn.text)
-            btn.background_color = (0.3, 0.7, 0.3, 1)
+            selection_set.add(btn.option)
+            btn.background_color = SELECTED_COLOR
 
     def check_answer(self, user_selection):
         """Checks the user's answer, updates progress, and shows feedback."""
@@ -142,28 +285,80 @@ class LearningScreen(Screen):
         qtype, qidx, _ = self.questions[current_q_index]
         correct_answers = session_info['correct_answers']
         
-        is_correct = (set(user_selection) == set(correct_answers)) if qtype == 'multi' else (user_selection in correct_answers)
+        is_correct = is_correct_answer(qtype, user_selection, correct_answers)
         
         session_info['answered'] = True
         session_info['is_correct'] = is_correct
         session_info['user_selection'] = {user_selection} if qtype == 'single' else user_selection
         session_info['attempts'] = session_info.get('attempts', 0) + 1
 
-        update_progress(self.chapter, qtype, qidx, is_correct, self.mode)
+        old_streak = self.get_streak(qtype, qidx)
+        response_ms = (time.perf_counter() - self._shown_at) * 1000 if self._shown_at is not None else None
+        new_streak = update_progress(self.chapter, qtype, qidx, is_correct, self.mode,
+                                     chosen=session_info['user_selection'], response_ms=response_ms)
+        if old_streak < 2 <= new_streak:
+            self.learned_count += 1
+        elif new_streak < 2 <= old_streak:
+            self.learned_count -= 1
         self.show_feedback(session_info)
         self.update_ui_state()
+        # the learner now reads the explanation: use those idle frames
+        self.schedule_prefetch()
+
+    def upcoming(self):
+        """
+        The next PREFETCH_DEPTH questions as (index, session_info) pairs:
+        the rest of this pass, then the start of the next one once this pass
+        is answered through (the next pass's options live in next_pass_prep).
+        """
+        pos = self.current_pass_pos
+        upcoming = [(i, self.session_data[i]) for i in self.pass_indices[pos + 1:pos + 1 + PREFETCH_DEPTH]]
+        if len(upcoming) < PREFETCH_DEPTH and self.mode == 'learn_new' and pos == len(self.pass_indices) - 1:
+            for i, (qtype, qidx, _) in enumerate(self.questions):
+                if len(upcoming) >= PREFETCH_DEPTH:
+                    break
+                if self.get_streak(qtype, qidx) < 2:
+                    upcoming.append((i, self.next_pass_prep.setdefault(i, {})))
+        return upcoming
+
+    def schedule_prefetch(self):
+        """Prepares upcoming questions one per frame, starting next frame."""
+        self.cancel_prefetch()
+        queue = self.upcoming()
+        if not queue:
+            return
+
+        def prefetch_one(dt):
+            if not queue or self.question_view is None:
+                self._prefetch_event = None
+                return False
+            index, session_info = queue.pop(0)
+            self.prepare_options(self.questions[index], session_info)
+            self.question_view.prerender(self.questions[index], session_info)
+            if not queue:
+                self._prefetch_event = None
+                return False
+            return True
+
+        self._prefetch_event = Clock.schedule_interval(prefetch_one, 0)
+
+    def cancel_prefetch(self):
+        if self._prefetch_event is not None:
+            self._prefetch_event.cancel()
+            self._prefetch_event = None
 
     def show_feedback(self, session_info):
         """Displays visual feedback (colors, explanation) after an answer."""
-        for btn in session_info.get('option_widgets', []): btn.disabled = True
-        if 'submit_button' in session_info: session_info['submit_button'].disabled = True
+        option_buttons = self.question_view.option_buttons
+        for btn in option_buttons: btn.disabled = True
+        self.question_view.submit_button.disabled = True
         
         user_selection = session_info.get('user_selection', set())
         correct_answers = session_info.get('correct_answers', [])
-        for btn in session_info.get('option_widgets', []):
-            if btn.text in user_selection:
-                btn.background_color = (0.2, 0.8, 0.2, 1) if btn.text in correct_answers else (0.9, 0.3, 0.3, 1)
-            elif btn.text in correct_answers:
+        for btn in option_buttons:
+            if btn.option in user_selection:
+                btn.background_color = (0.2, 0.8, 0.2, 1) if btn.option in correct_answers else (0.9, 0.3, 0.3, 1)
+            elif btn.option in correct_answers:
                 btn.background_color = (0.2, 0.8, 0.2, 1)
             else:
                 btn.background_color = (0.2, 0.2, 0.2, 1)
@@ -171,7 +366,7 @@ class LearningScreen(Screen):
         is_correct = session_info.get('is_correct', False)
         result_text = "[color=33FF33]回答正确！[/color]\n\n" if is_correct else "[color=FF5733]回答错误。[/color]\n\n"
         explanation = self.questions[self.pass_indices[self.current_pass_pos]][2].get("explanation", "暂无解析。")
-        self.ids.explanation_label.text = result_text + explanation
+        self.ids.explanation_label.text = result_text + to_markup(explanation)
         self.ids.explanation_scroll.height = self.height * 0.3
         self.ids.explanation_scroll.opacity = 1
         self.ids.explanation_label.font_size = '18sp'
@@ -198,8 +393,7 @@ class LearningScreen(Screen):
         if not self.pass_indices: return
         
         if self.mode == 'learn_new':
-            learned_count = sum(1 for q_type, q_idx, _ in self.questions if load_progress(self.chapter, q_type).get(str(q_idx), 0) >= 2)
-            self.ids.learned_label.text = f"本轮学会: {learned_count}/{len(self.questions)}"
+            self.ids.learned_label.text = f"本轮学会: {self.learned_count}/{len(self.questions)}"
             self.ids.learned_label.font_size = '18sp'
         else:
             self.ids.learned_label.text = f"复习进度: {self.current_pass_pos + 1}/{len(self.pass_indices)}"
@@ -215,21 +409,21 @@ class LearningScreen(Screen):
         """Shows the end-of-round summary popup."""
         content = BoxLayout(orientation='vertical', padding=10, spacing=20)
         message = '本轮复习已完成！' if self.mode == 'review_old' else '恭喜！本轮题目已全部学会！'
-        content.add_widget(Label(text=message, font_name="NvshuFont", font_size='24sp'))
+        content.add_widget(Label(text=to_markup(message), markup=True, font_name="NvshuFont", font_size='24sp'))
         
         btn_layout = BoxLayout(spacing=10, size_hint_y=None, height='50dp')
         popup = Popup(title='恭喜    𛈌𛆻', title_font='NvshuFont', content=content, size_hint=(0.9, 0.5), auto_dismiss=False)
         
-        review_btn = Button(text='复盘\n𛋷𛋅', font_size='20sp')
+        review_btn = Button(text=to_markup('复盘\n𛋷𛋅'), markup=True, font_size='20sp')
         review_btn.bind(on_release=lambda x: self.go_to_review(popup))
         btn_layout.add_widget(review_btn)
 
         if self.mode == 'learn_new':
-            continue_btn = Button(text='再学一组\n𛇥𛉬𛆼𛊽', font_size='20sp')
+            continue_btn = Button(text=to_markup('再学一组\n𛇥𛉬𛆼𛊽'), markup=True, font_size='20sp')
             continue_btn.bind(on_release=lambda x: popup.dismiss(), on_press=self.start_new_round)
             btn_layout.add_widget(continue_btn)
 
-        menu_btn = Button(text='主菜单\n𛋱𛈠𛈁', font_size='20sp')
+        menu_btn = Button(text=to_markup('主菜单\n𛋱𛈠𛈁'), markup=True, font_size='20sp')
         menu_btn.bind(on_release=lambda x: self.go_to_menu(popup))
         btn_layout.add_widget(menu_btn)
         
@@ -252,8 +446,8 @@ class LearningScreen(Screen):
         """Shows a popup when no questions are available to draw."""
         message = '太棒了！\n本章节已没有新题目可学！' if self.mode == 'learn_new' else '本章节还没有已学会的题目，\n快去“学习新知”吧！'
         content = BoxLayout(orientation='vertical', padding=10, spacing=20)
-        content.add_widget(Label(text=message, font_name="NvshuFont", font_size='24sp', halign='center'))
-        menu_btn = Button(text='返回章节选择', size_hint_y=None, height='48dp', font_size='20sp')
+        content.add_widget(Label(text=to_markup(message), markup=True, font_name="NvshuFont", font_size='24sp', halign='center'))
+        menu_btn = Button(text=to_markup('返回章节选择'), markup=True, size_hint_y=None, height='48dp', font_size='20sp')
         popup = Popup(title='提示    𛊹𛆹', title_font='NvshuFont', content=content, size_hint=(0.8, 0.5), auto_dismiss=False)
         
         # 关键修复：使用一个辅助函数来正确处理关闭弹窗和屏幕跳转的顺序。
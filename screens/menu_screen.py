@@ -1,3 +1,12 @@
+from kivy.properties import StringProperty
 from kivy.uix.screenmanager import Screen
+
+from utils.profiles import profile_manager
+
+
 class MenuScreen(Screen):
-    pass
+    # 当前学习者，显示在“切换学习者”按钮上
+    profile_text = StringProperty("")
+
+    def on_pre_enter(self, *args):
+        self.profile_text = f"学习者：{profile_manager.current_name()}"
@@ -0,0 +1,57 @@
+from kivy.properties import StringProperty
+from kivy.uix.screenmanager import Screen
+
+from utils.io_worker import io_worker
+from utils.profiles import profile_manager
+from utils.text_render_cache import CachedButton
+from utils.text_utils import to_markup
+
+
+class ProfileRow(CachedButton):
+    """One learner in the picker (recycled by the RecycleView); tapping it switches to them."""
+    profile_id = StringProperty("")
+
+
+class ProfileScreen(Screen):
+    """
+    Picks and adds learners (see utils/profiles.py). The list is a
+    RecycleView, so a tablet shared by hundreds of learners only builds the
+    rows on screen.
+    """
+    status_text = StringProperty("")
+
+    def on_pre_enter(self, *args):
+        self.status_text = ""
+        self.show_profiles()
+
+    def show_profiles(self):
+        current = profile_manager.current
+        self.ids.profile_list.data = [
+            {"text": to_markup(f"{'▶ ' if pid == current else ''}{name}"), "profile_id": pid}
+            for pid, name in profile_manager.profiles()
+        ]
+
+    def add_profile(self):
+        name = self.ids.name_input.text
+        try:
+            profile_id = profile_manager.create(name)
+        except ValueError as e:
+            self.status_text = str(e)
+            return
+        self.ids.name_input.text = ""
+        self.switch_to(profile_id)
+
+    def switch_to(self, profile_id):
+        """切换学习者：先在 I/O 线程写完当前学习者的进度，再换到新的目录。"""
+        self.status_text = "正在切换…"
+        io_worker.write("profile", profile_manager.switch, profile_id, callback=self.on_switched)
+
+    def on_switched(self, future):
+        try:
+            future.result()
+        except Exception as e:
+            print(f"[profile] 切换学习者失败: {e}")
+            self.status_text = "切换失败"
+            return
+        self.manager.current = 'menu'
+
@@ -1,17 +1,38 @@
-from kivy.uix.label import Label
+from collections import OrderedDict
+
+from utils.instrumentation import traced
+from utils.text_render_cache import CachedLabel, text_cache
+from utils.text_utils import to_markup_many
 from kivy.properties import StringProperty
 from kivy.uix.screenmanager import Screen
 from kivy.properties import ListProperty, ObjectProperty
 from kivy.clock import Clock
 from kivy.logger import Logger
+
+# 每帧最多生成多少道题的复盘行；第一批同步生成，其余分帧补齐
+QUESTIONS_PER_FRAME = 5
+# 最多记住多少行的行高（按最近使用淘汰），约等于几十次复盘的报告
+ROW_HEIGHT_ENTRIES = 2000
+
+
+class ReportRow(CachedLabel):
+    """One line of the session report (recycled by the RecycleView)."""
+    pass
+
+
 class ReviewScreen(Screen):
     """
     A screen that displays a text-based report of the last session.
+    The report is a virtualized RecycleView: only visible rows exist as
+    widgets, and rows are generated and measured a few questions per frame.
     """
     session_data = ListProperty([])
     review_text = StringProperty("")
     learning_screen = ObjectProperty(None, allownone=True)
     questions = ListProperty([])
+    # (text, width) -> row height; survives across sessions, LRU-bounded
+    row_heights = OrderedDict()
+
     def on_pre_enter(self):
         Clock.schedule_once(self.delayed_generate_report, 0.1)
 
@@ -22,64 +43,102 @@ class ReviewScreen(Screen):
             Logger.error(f"🧨 generate_report() 调用失败: {e}")
 
 
+    @traced("generate_report")
     def generate_report(self):
         print("🧪 正在调用 generate_report() 方法")
 
-        container = self.ids.review_container
-        container.clear_widgets()
-
-        for index, q_data in enumerate(self.questions):
-            session_info = self.session_data[index]
-            q_type, _, question = q_data
-
-            blocks = []
-
-            blocks.append(f"[b]第 {index + 1} 题 ({'单选' if q_type == 'single' else '多选'})[/b]")
-            blocks.append(question['question'])
-
-            options = session_info.get('options_shuffled', [])
-            correct_answers = session_info.get('correct_answers', [])
-            user_selection = session_info.get('user_selection', set())
-
-            for i, opt_text in enumerate(options):
-                option_char = chr(ord('A') + i)
-                display_line = f"{option_char}. {opt_text}"
-
-                if opt_text in correct_answers:
-                    display_line += " [color=33FF33](正确答案)[/color]"
-                if opt_text in user_selection and opt_text not in correct_answers:
-                    display_line += " [color=FF5733](我的错误选择)[/color]"
-
-                blocks.append(display_line)
-
-            if self.learning_screen.mode == 'review_old':
-                if 'is_correct' in session_info:
-                    is_correct = session_info.get('is_correct', False)
-                    result_str = "[color=33FF33]回答正确[/color]" if is_correct else "[color=FF5733]回答错误[/color]"
-                    blocks.append(f"[b]作答结果：[/b] {result_str}")
-                else:
-                    blocks.append("[b]作答结果：[/b] 本题未作答。")
-
-            blocks.append(f"[b]解析：[/b] {question.get('explanation', '暂无解析。')}")
-            blocks.append("-" * 40)
-
-            for line in blocks:
-                lbl = Label(
-                    text=line,
-                    markup=True,
-                    font_name="NvshuFont",
-                    font_size="16sp",
-                    size_hint_y=None,
-                    text_size=(self.width - 40, None),
-                    color=(1, 1, 1, 1),
-                )
-                lbl.texture_update()
-                lbl.height = lbl.texture_size[1] + 10
-                container.add_widget(lbl)
+        self.cancel_report_fill()
+        self.ids.review_list.data = []
+        self._next_question = 0
+        self._row_width = self.width - 40
+        self._probe = ReportRow(width=self._row_width)
+
+        # the first screenful right away, the rest over the following frames
+        if self.fill_report_chunk(0):
+            self._fill_event = Clock.schedule_interval(self.fill_report_chunk, 0)
+
+    @traced("fill_report_chunk")
+    def fill_report_chunk(self, dt):
+        """Appends the rows of the next few questions; returns False when done."""
+        end = min(self._next_question + QUESTIONS_PER_FRAME, len(self.questions))
+        rows = []
+        for index in range(self._next_question, end):
+            for line in self.report_lines(index):
+                rows.append({"text": line, "height": self.row_height(line)})
+        self.ids.review_list.data.extend(rows)
+        self._next_question = end
+
+        if end >= len(self.questions):
+            self._fill_event = None
+            Logger.info(f"ReviewScreen: 文本缓存 {text_cache.stats()}")
+            return False
+        return True
+
+    def cancel_report_fill(self):
+        event = getattr(self, '_fill_event', None)
+        if event is not None:
+            event.cancel()
+            self._fill_event = None
+
+    def row_height(self, line):
+        """Measures a row once per (text, width); the render lands in text_cache for the real row."""
+        key = (line, self._row_width)
+        height = self.row_heights.get(key)
+        if height is not None:
+            self.row_heights.move_to_end(key)
+            return height
+        self._probe.text = line
+        self._probe.texture_update()
+        height = self._probe.texture_size[1] + 10
+        self.row_heights[key] = height
+        if len(self.row_heights) > ROW_HEIGHT_ENTRIES:
+            self.row_heights.popitem(last=False)
+        return height
+
+    def report_lines(self, index):
+        """Builds the report lines (with markup) for one question."""
+        session_info = self.session_data[index]
+        q_type, _, question = self.questions[index]
+
+        blocks = []
+
+        blocks.append(f"[b]第 {index + 1} 题 ({'单选' if q_type == 'single' else '多选'})[/b]")
+        blocks.append(question['question'])
+
+        options = session_info.get('options_shuffled', [])
+        correct_answers = session_info.get('correct_answers', [])
+        user_selection = session_info.get('user_selection', set())
+
+        for i, opt_text in enumerate(options):
+            option_char = chr(ord('A') + i)
+            display_line = f"{option_char}. {opt_text}"
+
+            if opt_text in correct_answers:
+                display_line += " [color=33FF33](正确答案)[/color]"
+            if opt_text in user_selection and opt_text not in correct_answers:
+                display_line += " [color=FF5733](我的错误选择)[/color]"
+
+            blocks.append(display_line)
+
+        if self.learning_screen.mode == 'review_old':
+            if 'is_correct' in session_info:
+                is_correct = session_info.get('is_correct', False)
+                result_str = "[color=33FF33]回答正确[/color]" if is_correct else "[color=FF5733]回答错误[/color]"
+                blocks.append(f"[b]作答结果：[/b] {result_str}")
+            else:
+                blocks.append("[b]作答结果：[/b] 本题未作答。")
+
+        blocks.append(f"[b]解析：[/b] {question.get('explanation', '暂无解析。')}")
+        blocks.append("-" * 40)
+        # 汉字/女书分段换字体；各行已带 [b]/[color] 标记，故不再转义
+        return to_markup_many(blocks, escape=False)
+
     def back_to_menu(self):
         """
         Clears session data and returns to the main menu.
         """
+        self.cancel_report_fill()
+        self.ids.review_list.data = []
         self.session_data = []
         self.questions = []
         self.learning_screen = None
@@ -0,0 +1,102 @@
+from kivy.clock import Clock
+from kivy.properties import ListProperty, ObjectProperty, StringProperty
+from kivy.uix.screenmanager import Screen
+
+from screens.chapter_screen import ChapterScreen
+from utils.io_worker import io_worker
+from utils.loader import load_quiz, load_settings
+from utils.quiz_logic import practice_round
+from utils.search_index import search_index
+from utils.text_render_cache import CachedButton
+from utils.text_utils import to_markup
+
+# 输入停顿这么久（秒）后才检索，连续打字时不会每个键都刷新结果列表
+SEARCH_DELAY = 0.15
+MAX_RESULTS = 100
+
+
+class SearchResultRow(CachedButton):
+    """One search hit (recycled by the RecycleView); tapping it practises that question."""
+    hit = ObjectProperty(None, allownone=True)
+
+
+class SearchScreen(Screen):
+    """
+    Full-text search over every chapter's questions, options and explanations
+    (see utils/search_index.py). The hits can be practised as a round in
+    LearningScreen.
+    """
+    results = ListProperty([])
+    status_text = StringProperty("")
+    _search_event = None
+
+    def on_pre_enter(self, *args):
+        # 只有内容变化过的题库才会重新建索引（在 I/O 线程）
+        io_worker.read("search_index", search_index.refresh)
+
+    def schedule_search(self, query):
+        if self._search_event is not None:
+            self._search_event.cancel()
+        self._search_event = Clock.schedule_once(lambda dt: self.run_search(query), SEARCH_DELAY)
+
+    def run_search(self, query):
+        """Searches on the I/O worker; show_results() fills the list when the hits land."""
+        self._search_event = None
+        io_worker.read(("search", query), self.search_rows, query,
+                       callback=lambda future: self.show_results(query, future))
+
+    @staticmethod
+    def search_rows(query):
+        """Runs on the I/O worker: the hits and one result-list row per hit."""
+        hits = search_index.search(query, MAX_RESULTS)
+        rows = []
+        for chapter, qtype, position in hits:
+            title = ChapterScreen.chapter_map.get(chapter, chapter).split()[0]
+            question = load_quiz(chapter, qtype)[position]
+            rows.append({"text": to_markup(f"[{title}] {question['question']}"), "hit": (chapter, qtype, position)})
+        return hits, rows
+
+    def show_results(self, query, future):
+        if query != self.ids.query_input.text:
+            return  # a newer query is on its way
+        try:
+            self.results, rows = future.result()
+        except Exception as e:
+            print(f"[search] 检索失败: {e}")
+            self.results, rows = [], []
+        self.ids.result_list.data = rows
+        self.status_text = f"找到 {len(self.results)} 道相关题目" if query.strip() else ""
+
+    def practice_results(self):
+        """Practises the hits of the best-ranked chapter (a round belongs to one chapter)."""
+        if not self.results:
+            return
+        chapter = self.results[0][0]
+        self.practice([hit for hit in self.results if hit[0] == chapter])
+
+    def practice(self, hits):
+        """Starts a LearningScreen round made of the given hits of one chapter."""
+        io_worker.read(("practice", tuple(hits)), self.load_practice, hits, callback=self.start_practice)
+
+    @staticmethod
+    def load_practice(hits):
+        """Runs on the I/O worker: returns (chapter, mode, questions) for the round."""
+        chapter = hits[0][0]
+        limit = load_settings().get("questions_per_session", 10)
+        # 还有没学会的题就按“学习新知”练这些题，否则按“复习旧闻”过一遍
+        items = [(qtype, position) for hit_chapter, qtype, position in hits if hit_chapter == chapter]
+        mode, questions = practice_round(chapter, items, limit)
+        return chapter, mode, questions
+
+    def start_practice(self, future):
+        try:
+            chapter, mode, questions = future.result()
+        except Exception as e:
+            print(f"[search] 练习题目加载失败: {e}")
+            self.status_text = "练习题目加载失败，请重试"
+            return
+        learning_screen = self.manager.get_screen('learning')
+        learning_screen.chapter = chapter
+        learning_screen.mode = mode
+        learning_screen.preset_questions = questions
+        self.manager.current = 'learning'
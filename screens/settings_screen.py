@@ -1,5 +1,3 @@
-import json
-
 from kivy.uix.screenmanager import Screen
 from kivy.uix.popup import Popup
 from kivy.uix.boxlayout import BoxLayout
@@ -8,10 +6,12 @@ from kivy.uix.button import Button
 from kivy.uix.scrollview import ScrollView # 关键：导入 ScrollView
 from kivy.properties import StringProperty
 
-from utils.loader import load_settings, STATE_FILE
+from utils.io_worker import io_worker
+from utils.loader import load_settings, update_settings
 from utils.progress_manager import reset_chapter_progress, CHAPTERS
 
 from screens.chapter_screen import ChapterScreen
+from utils.text_utils import to_markup
 
 class SettingsScreen(Screen):
     questions_per_session_text = StringProperty("")
@@ -21,8 +21,16 @@ class SettingsScreen(Screen):
         self.load_current_settings()
 
     def load_current_settings(self):
-        """加载每轮题量设置并更新UI。"""
-        settings = load_settings()
+        """在 I/O 线程加载设置，读完后更新UI。"""
+        io_worker.read("settings", load_settings, callback=self.show_current_settings)
+
+    def show_current_settings(self, future):
+        """用读到的设置更新每轮题量显示。"""
+        try:
+            settings = future.result()
+        except Exception as e:
+            print(f"[settings] 读取设置失败: {e}")
+            return
         self.questions_per_session_text = str(settings.get("questions_per_session", 10))
 
     def save_settings(self):
@@ -30,11 +38,9 @@ class SettingsScreen(Screen):
         try:
             num = int(self.ids.questions_input.text)
             if 5 <= num <= 50: # 合理范围检查
-                settings = load_settings()
-                settings["questions_per_session"] = num
-                with open(STATE_FILE, "w", encoding="utf-8") as f:
-                    json.dump(settings, f, indent=2)
-                self.show_feedback_popup("成功    𛈒𛇕", "设置已保存！")
+                # 读-改-写整个过程在 I/O 线程完成，写盘结果回到主线程再提示
+                io_worker.write("settings", update_settings,
+                                {"questions_per_session": num}, callback=self.on_settings_saved)
             else:
                 self.show_feedback_popup("错误    𛋞𛊃", "请输入一个 5 到 50 之间的整数。")
         except ValueError:
@@ -42,12 +48,20 @@ class SettingsScreen(Screen):
         except Exception as e:
             self.show_feedback_popup("保存失败    𛉎𛊶𛊼𛇣", f"发生未知错误：\n{e}")
 
+    def on_settings_saved(self, future):
+        """设置写盘完成（主线程回调）。"""
+        try:
+            future.result()
+        except Exception as e:
+            self.show_feedback_popup("保存失败    𛉎𛊶𛊼𛇣", f"发生未知错误：\n{e}")
+            return
+        self.show_feedback_popup("成功    𛈒𛇕", "设置已保存！")
 
     def show_reset_options(self):
         """显示一个包含所有章节的弹窗，让用户选择要重置哪一章。"""
         # 弹窗的主布局
         popup_content_layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
-        popup_content_layout.add_widget(Label(text="请选择要重置进度的章节：", size_hint_y=None, height='30dp'))
+        popup_content_layout.add_widget(Label(text=to_markup("请选择要重置进度的章节："), markup=True, size_hint_y=None, height='30dp'))
 
         # 关键修复：创建一个 BoxLayout 来容纳所有按钮
         button_grid = BoxLayout(orientation='vertical', size_hint_y=None, spacing=10)
@@ -65,7 +79,7 @@ class SettingsScreen(Screen):
         print(chapter_map)
         # 动态生成所有章节的重置按钮，并添加到 button_grid 中
         for chapter_key in CHAPTERS:
-            btn = Button(text=f"重置：{chapter_map.get(chapter_key, chapter_key)}", size_hint_y=None, height='48dp')
+            btn = Button(text=to_markup(f"重置：{chapter_map.get(chapter_key, chapter_key)}"), markup=True, size_hint_y=None, height='48dp')
             btn.bind(on_release=lambda instance, k=chapter_key: self.confirm_reset(k))
             button_grid.add_widget(btn)
 
@@ -84,11 +98,11 @@ class SettingsScreen(Screen):
             self.reset_popup.dismiss()
 
         content = BoxLayout(orientation='vertical', padding=10, spacing=10)
-        content.add_widget(Label(text=f"您确定要重置\n'{self.get_chapter_display_name(chapter_key)}'\n的所有学习进度吗？\n此操作不可撤销！", font_size='20sp', halign='center'))
+        content.add_widget(Label(text=to_markup(f"您确定要重置\n'{self.get_chapter_display_name(chapter_key)}'\n的所有学习进度吗？\n此操作不可撤销！"), markup=True, font_size='20sp', halign='center'))
         
         btn_layout = BoxLayout(spacing=10, size_hint_y=None, height='48dp')
-        yes_btn = Button(text='确定重置\n𛆄𛉽𛊻𛋔', font_size='20sp')
-        no_btn = Button(text='取消\n𛉛𛈨', font_size='20sp')
+        yes_btn = Button(text=to_markup('确定重置\n𛆄𛉽𛊻𛋔'), markup=True, font_size='20sp')
+        no_btn = Button(text=to_markup('取消\n𛉛𛈨'), markup=True, font_size='20sp')
         btn_layout.add_widget(yes_btn)
         btn_layout.add_widget(no_btn)
         content.add_widget(btn_layout)
@@ -103,14 +117,15 @@ class SettingsScreen(Screen):
     def do_reset(self, chapter_key, popup_to_dismiss):
         """执行重置操作并关闭弹窗。"""
         popup_to_dismiss.dismiss()
-        reset_chapter_progress(chapter_key)
-        self.show_feedback_popup("操作完成    𛋴𛊅𛆧𛈒", f"'{self.get_chapter_display_name(chapter_key)}' 的进度已重置。")
+        io_worker.write(("reset", chapter_key), reset_chapter_progress, chapter_key,
+                        callback=lambda future: self.show_feedback_popup(
+                            "操作完成    𛋴𛊅𛆧𛈒", f"'{self.get_chapter_display_name(chapter_key)}' 的进度已重置。"))
 
     def show_feedback_popup(self, title, message):
         """通用的反馈弹窗。"""
         content = BoxLayout(orientation='vertical', padding=10, spacing=10)
-        content.add_widget(Label(text=message, halign='center', font_size='20sp'))
-        ok_btn = Button(text='好的', size_hint_y=None, height='48dp', font_size='20sp')
+        content.add_widget(Label(text=to_markup(message), markup=True, halign='center', font_size='20sp'))
+        ok_btn = Button(text=to_markup('好的'), markup=True, size_hint_y=None, height='48dp', font_size='20sp')
         content.add_widget(ok_btn)
         popup = Popup(title=title, title_font='NvshuFont', content=content, size_hint=(0.7, 0.4))
         ok_btn.bind(on_release=popup.dismiss)
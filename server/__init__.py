@@ -0,0 +1,7 @@
+"""
+Headless quiz server: the app's banks and learning rules over HTTP/JSON,
+for a whole class from one machine (stdlib only, no Kivy).
+
+    python -m server.quiz_server --port 8765
+    python -m benchmarks.loadgen --port 8765 --learners 50 --duration 10
+"""
@@ -0,0 +1,507 @@
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlsplit
+
+from utils import loader
+from utils.answer_log import COMPACT_THRESHOLD, RESET, AnswerLog
+from utils.distractors import distractor_index
+from utils.io_worker import IOWorker
+from utils.profiles import ProfileManager
+from utils.progress_manager import CHAPTERS, Q_TYPES
+from utils.question_ids import question_ids
+from utils.quiz_logic import is_correct_answer, pick_options
+from utils.sampler import DEFAULT_TYPE_WEIGHTS, LEARNED_THRESHOLD, QuestionSampler
+from utils.storage import JsonBackend, SqliteBackend
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_PORT = 8765
+# Learners kept in memory; the least recently active one is closed beyond this.
+MAX_LEARNERS = 2000
+# File descriptors a learner holds while its files are open: answers.log,
+# answers.lock, answers.compact.lock and, for a migrated learner, learner.db
+# with its -wal and -shm files.
+FDS_PER_LEARNER = 6
+# Learners with open files when the descriptor limit cannot be read.
+DEFAULT_MAX_OPEN = 64
+# A learner's files are closed after this many seconds without a request.
+IDLE_SECONDS = 60
+# Open (drawn, not fully answered) rounds kept per learner.
+MAX_ROUNDS = 8
+MAX_BODY = 64 * 1024
+LEARNER_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 409: "Conflict", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def open_backend(progress_dir, state_file):
+    """A learner's storage: their SQLite database if it was migrated, else JSON files."""
+    db_file = state_file.parent / "learner.db"
+    return SqliteBackend(db_file) if db_file.exists() else JsonBackend(progress_dir, state_file)
+
+
+def max_open_learners():
+    """
+    How many learners may have their files open at once: half of the
+    process's descriptor limit (the rest is left to client connections),
+    FDS_PER_LEARNER each.
+    """
+    if resource is None:
+        return DEFAULT_MAX_OPEN
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return MAX_LEARNERS
+    return max(1, soft // 2 // FDS_PER_LEARNER)
+
+
+class Learner:
+    """
+    One learner's progress, draw pools and open rounds.
+
+    The event loop reads `progress` to draw and report; every disk access
+    (loading, journaling answers, writing snapshots) and every change to
+    `progress` runs on the server's I/O worker. `lock` guards `progress`
+    and its draw pools between the two threads.
+
+    The learner's directory may be shared with the app or another server:
+    answers are read, journaled and applied under the answer log's file
+    lock after catching up with what the others journaled (sync()), the
+    same protocol update_progress follows, so no update is lost.
+
+    release_files() closes the answer log, its lock files and the storage
+    of a learner that has gone quiet; they are opened again on the next
+    request, which catches up like after another process's compaction.
+    """
+
+    def __init__(self, learner_id, progress_dir, state_file, ids):
+        self.id = learner_id
+        self.progress_dir = progress_dir
+        self.state_file = state_file
+        self._backend = None
+        self.log = AnswerLog(progress_dir)
+        self.ids = ids  # the server's (chapter, qtype) -> question keys
+        self.progress = {}  # (chapter, qtype) -> {qkey: streak}
+        self.settings = None
+        self.sampler = QuestionSampler()
+        self.rounds = OrderedDict()  # round id -> [item dicts]
+        self.lock = threading.Lock()
+        self.last_active = time.monotonic()  # set by the event loop
+
+    # --- run on the I/O worker ---
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = open_backend(self.progress_dir, self.state_file)
+        return self._backend
+
+    def load_chapter(self, chapter):
+        """Reads settings (once) and a chapter's snapshot plus journaled answers into `progress`."""
+        if self.settings is None:
+            self.settings = self.backend.load_settings()
+        with self.log.locked():
+            self.sync()
+            loaded = self._read_chapter(chapter)
+            with self.lock:
+                for qtype, progress in loaded.items():
+                    self.progress.setdefault((chapter, qtype), progress)
+
+    def _read_chapter(self, chapter):
+        loaded = {}
+        for qtype in Q_TYPES:
+            progress = self.backend.load_progress(chapter, qtype)
+            self.log.replay(chapter, qtype, progress)
+            loaded[qtype] = progress
+        return loaded
+
+    def record(self, chapter, qtype, index, qkey, correct, chosen, response_ms, mode):
+        """Reads the streak, journals the answer and applies it; returns the streak after it."""
+        with self.log.locked():
+            self.sync()
+            progress = self.progress[(chapter, qtype)]
+            with self.lock:
+                streak = progress.get(qkey, 0)
+            if mode == 'learn_new':
+                streak = streak + 1 if correct else 0
+            self.log.append(chapter, qtype, qkey, correct, streak, chosen, response_ms, mode)
+            if mode == 'learn_new':
+                with self.lock:
+                    progress[qkey] = streak
+                    self.sampler.on_streak_change(chapter, qtype, index, streak)
+        if self.log.pending() >= COMPACT_THRESHOLD:
+            self.compact()
+        return streak
+
+    def sync(self):
+        """Applies what other processes journaled to this learner's log (call it inside log.locked())."""
+        records, reloaded = self.log.sync()
+        if reloaded:
+            # another process compacted the log: the snapshots changed
+            with self.lock:
+                chapters = {chapter for chapter, _ in self.progress}
+            for chapter in chapters:
+                loaded = self._read_chapter(chapter)
+                with self.lock:
+                    for qtype, progress in loaded.items():
+                        self.progress[(chapter, qtype)].clear()
+                        self.progress[(chapter, qtype)].update(progress)
+                    self.sampler.invalidate(chapter)
+            return
+        with self.lock:
+            for record in records:
+                if record[2] == RESET:
+                    for qtype in Q_TYPES:
+                        progress = self.progress.get((record[3], qtype), {})
+                        for key in progress:
+                            progress[key] = 0
+                    self.sampler.invalidate(record[3])
+                    continue
+                _, _, chapter, qtype, qkey, _, streak = record[:7]
+                progress = self.progress.get((chapter, qtype))
+                if progress is None:
+                    continue
+                progress[str(qkey)] = streak
+                index = self.ids[(chapter, qtype)].position(qkey)
+                if index is not None:
+                    self.sampler.on_streak_change(chapter, qtype, index, streak)
+
+    def compact(self):
+        """Writes a snapshot of every journaled bank and empties the answer log."""
+        # locks held from the snapshot until the log is rewritten; requests wait
+        # on this learner's I/O anyway, so nothing is gained by splitting them
+        with self.log.compacting(), self.log.locked():
+            self.sync()
+            seq, banks = self.log.touched()
+            for (chapter, qtype), keys in banks.items():
+                with self.lock:
+                    progress = self.progress.get((chapter, qtype))
+                    progress = progress.copy() if progress is not None else None
+                if progress is None:
+                    # answered in an earlier session but not loaded by this one
+                    progress = self.backend.load_progress(chapter, qtype)
+                    self.log.replay(chapter, qtype, progress)
+                if progress:
+                    self.backend.save_progress(chapter, qtype, progress, keys)
+            self.log.compact(seq)
+
+    def release_files(self):
+        """Closes the learner's files until the next request needs them."""
+        self.log.close()
+        if self._backend is not None:
+            self._backend.close()
+            self._backend = None
+
+    def close(self):
+        self.compact()
+        self.release_files()
+
+
+class QuizServer:
+    """
+    Serves draw / answer / progress for many learners from one process.
+
+    Quiz banks are loaded once at start-up and shared read-only by every
+    learner. Each learner has their own progress, draw pools and answer log
+    (see utils/answer_log.py) in the same per-learner directory the app's
+    profiles use (utils/profiles.py), so a learner id created on a tablet
+    can be served too, even while the app itself is open on the same
+    state directory (see Learner). Answers are journaled and applied on a
+    background I/O worker; the event loop awaits the write without
+    blocking, so an answer is only confirmed once it is on disk.
+
+    'review_old' rounds draw a random sample of learned questions: the
+    review scheduler of the app is per device and is not used here.
+
+    Only the max_open most recently active learners keep their files open
+    (see max_open_learners()), and a learner's files are closed once it has
+    been idle for IDLE_SECONDS, so thousands of learners in memory never
+    exhaust the process's file descriptors.
+    """
+
+    def __init__(self, state_dir=None, max_learners=MAX_LEARNERS, max_open=None):
+        self.profiles = ProfileManager(state_dir=state_dir)
+        self.max_learners = max_learners
+        self.max_open = max_open or max_open_learners()
+        self.banks = {}
+        self.ids = {}  # (chapter, qtype) -> question keys (utils/question_ids.py)
+        self.distractors = {}  # (chapter, qtype) -> {qkey: cross-question distractors}
+        self.learners = OrderedDict()
+        self.open_learners = OrderedDict()  # learners whose files may be open, least recently active first
+        self.io = IOWorker("server-io")
+        self.requests = 0
+        self._round_ids = iter(range(1, 1 << 62))
+        self.routes = {
+            ("GET", "/health"): self.health,
+            ("GET", "/chapters"): self.chapters,
+            ("GET", "/progress"): self.progress,
+            ("POST", "/draw"): self.draw,
+            ("POST", "/answer"): self.answer,
+        }
+
+    def load_banks(self):
+        for chapter in CHAPTERS:
+            for qtype in Q_TYPES:
+                self.banks[(chapter, qtype)] = loader.load_quiz(chapter, qtype)
+                self.ids[(chapter, qtype)] = question_ids.bank(chapter, qtype)
+                self.distractors[(chapter, qtype)] = distractor_index.chapter(chapter)[qtype]
+
+    # --- learners ---
+
+    def learner(self, learner_id):
+        if not isinstance(learner_id, str) or not LEARNER_ID.match(learner_id):
+            raise HttpError(400, "learner must be 1-64 letters, digits, '-' or '_'")
+        learner = self.learners.get(learner_id)
+        if learner is None:
+            progress_dir, state_file = self.profiles.paths(learner_id)
+            learner = Learner(learner_id, progress_dir, state_file, self.ids)
+            self.learners[learner_id] = learner
+            while len(self.learners) > self.max_learners:
+                _, evicted = self.learners.popitem(last=False)
+                self.open_learners.pop(evicted.id, None)
+                self.io.write(("close", evicted.id), evicted.close)
+        else:
+            self.learners.move_to_end(learner_id)
+        learner.last_active = time.monotonic()
+        self.open_learners[learner_id] = learner
+        self.open_learners.move_to_end(learner_id)
+        while len(self.open_learners) > self.max_open:
+            self.release(next(iter(self.open_learners.values())))
+        return learner
+
+    def release(self, learner):
+        """Closes a learner's files on the I/O worker, after the work already queued for it."""
+        del self.open_learners[learner.id]
+        self.io.write(("release", learner.id), learner.release_files)
+
+    async def release_idle(self):
+        """Closes the files of every learner idle for IDLE_SECONDS."""
+        while True:
+            await asyncio.sleep(IDLE_SECONDS / 4)
+            idle_since = time.monotonic() - IDLE_SECONDS
+            while self.open_learners:
+                learner = next(iter(self.open_learners.values()))
+                if learner.last_active > idle_since:
+                    break
+                self.release(learner)
+
+    async def chapter_progress(self, learner, chapter):
+        """The learner's {qtype: progress} of a chapter, loading it on the I/O worker once."""
+        if chapter not in CHAPTERS:
+            raise HttpError(404, f"unknown chapter: {chapter}")
+        if (chapter, Q_TYPES[0]) not in learner.progress:
+            future = self.io.read(("load", learner.id, chapter), learner.load_chapter, chapter)
+            await asyncio.wrap_future(future)
+        return {qtype: learner.progress[(chapter, qtype)] for qtype in Q_TYPES}
+
+    # --- endpoints ---
+
+    async def health(self, query, body):
+        return {"ok": True, "learners": len(self.learners), "open": len(self.open_learners),
+                "requests": self.requests}
+
+    async def chapters(self, query, body):
+        return [{"chapter": chapter, **{qtype: len(self.banks[(chapter, qtype)]) for qtype in Q_TYPES}}
+                for chapter in CHAPTERS]
+
+    async def progress(self, query, body):
+        learner = self.learner(query.get("learner"))
+        chapter = query.get("chapter")
+        result = {}
+        for qtype, progress in (await self.chapter_progress(learner, chapter)).items():
+            keys = self.ids[(chapter, qtype)].keys
+            with learner.lock:
+                learned = sum(1 for key in keys if progress.get(key, 0) >= LEARNED_THRESHOLD)
+            result[qtype] = {"learned": learned, "total": len(keys)}
+        return result
+
+    async def draw(self, query, body):
+        learner = self.learner(body.get("learner"))
+        chapter = body.get("chapter")
+        mode = body.get("mode", "learn_new")
+        if mode not in ("learn_new", "review_old"):
+            raise HttpError(400, "mode must be learn_new or review_old")
+        progress = await self.chapter_progress(learner, chapter)
+        count = body.get("count") or learner.settings.get("questions_per_session", 10)
+        weights = learner.settings.get("type_weights") or DEFAULT_TYPE_WEIGHTS
+        banks = {qtype: (chapter, self.banks[(chapter, qtype)], progress[qtype], self.ids[(chapter, qtype)])
+                 for qtype in Q_TYPES}
+        draw_mode = 'unlearned' if mode == 'learn_new' else 'learned'
+        with learner.lock:
+            drawn = learner.sampler.draw(banks, int(count), draw_mode, weights, random)
+
+        round_id = next(self._round_ids)
+        items, questions = [], []
+        for item, (qtype, index, question) in enumerate(drawn):
+            extra = self.distractors[(chapter, qtype)].get(self.ids[(chapter, qtype)].key(index), ())
+            options, correct_answers = pick_options(qtype, question, extra=extra)
+            items.append({"qtype": qtype, "index": index, "options": options, "correct_answers": correct_answers,
+                          "answered": False})
+            questions.append({"item": item, "qtype": qtype, "index": index,
+                              "question": question["question"], "options": options})
+        learner.rounds[round_id] = (chapter, mode, items)
+        while len(learner.rounds) > MAX_ROUNDS:
+            learner.rounds.popitem(last=False)
+        return {"round": round_id, "chapter": chapter, "mode": mode, "questions": questions}
+
+    async def answer(self, query, body):
+        learner = self.learner(body.get("learner"))
+        entry = learner.rounds.get(body.get("round"))
+        if entry is None:
+            raise HttpError(404, "unknown or expired round")
+        chapter, mode, items = entry
+        try:
+            item = items[body["item"]]
+        except (KeyError, IndexError, TypeError):
+            raise HttpError(400, "item must be the position of a question in the round")
+        if item["answered"]:
+            raise HttpError(409, "question already answered in this round")
+        chosen = body.get("chosen")
+        if item["qtype"] == "multi":
+            if not isinstance(chosen, list) or any(option not in item["options"] for option in chosen):
+                raise HttpError(400, "chosen must be a list of options for a multi question")
+        elif not isinstance(chosen, str) or chosen not in item["options"]:
+            raise HttpError(400, "chosen must be one of the options for a single question")
+        response_ms = body.get("response_ms")
+        if response_ms is not None and (isinstance(response_ms, bool) or not isinstance(response_ms, (int, float))
+                                        or not math.isfinite(response_ms) or response_ms < 0):
+            raise HttpError(400, "response_ms must be a non-negative number or null")
+
+        qtype, index = item["qtype"], item["index"]
+        correct = is_correct_answer(qtype, chosen, item["correct_answers"])
+        key = self.ids[(chapter, qtype)].key(index)
+        item["answered"] = True
+        # journaled in order on the I/O worker; unique keys, so nothing is coalesced away
+        future = self.io.write(("answer", learner.id, self.requests), learner.record, chapter, qtype, index, key,
+                               correct, [chosen] if qtype == "single" else chosen, response_ms, mode)
+        try:
+            streak = await asyncio.wrap_future(future)
+        except BaseException:
+            # nothing was applied: the question can be answered again
+            item["answered"] = False
+            raise
+        question = self.banks[(chapter, qtype)][index]
+        return {"correct": correct, "streak": streak, "correct_answers": item["correct_answers"],
+                "explanation": question.get("explanation", "")}
+
+    # --- HTTP ---
+
+    async def handle(self, reader, writer):
+        """Serves one keep-alive connection."""
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                status, payload = await self.dispatch(method, target, body)
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader):
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            header = await reader.readline()
+            if header in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = header.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_BODY:
+            raise ConnectionError("request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, headers, body
+
+    async def dispatch(self, method, target, body):
+        self.requests += 1
+        url = urlsplit(target)
+        handler = self.routes.get((method, url.path))
+        if handler is None:
+            return 404, {"error": f"no route for {method} {url.path}"}
+        try:
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            payload = json.loads(body) if body else {}
+            if not isinstance(payload, dict):
+                raise HttpError(400, "body must be a JSON object")
+            return 200, await handler(query, payload)
+        except HttpError as e:
+            return e.status, {"error": str(e)}
+        except ValueError as e:
+            return 400, {"error": f"bad request: {e}"}
+        except Exception as e:
+            print(f"[server] {method} {url.path} 失败: {e!r}")
+            return 500, {"error": "internal error"}
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT):
+        self.load_banks()
+        server = await asyncio.start_server(self.handle, host, port)
+        addresses = ", ".join(str(sock.getsockname()) for sock in server.sockets)
+        print(f"[server] 已载入 {sum(len(b) for b in self.banks.values())} 道题，监听 {addresses}")
+        sweeper = asyncio.create_task(self.release_idle())
+        async with server:
+            try:
+                await server.serve_forever()
+            finally:
+                sweeper.cancel()
+                self.close()
+
+    def close(self):
+        """Writes a snapshot for every learner in memory and waits for the I/O worker."""
+        for learner in self.learners.values():
+            self.io.write(("close", learner.id), learner.close)
+        self.learners.clear()
+        self.open_learners.clear()
+        self.io.drain(timeout=30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless HTTP/JSON quiz server for many learners.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--state-dir", default=None,
+                        help="where learner directories live (default: the app's state/ directory)")
+    parser.add_argument("--max-learners", type=int, default=MAX_LEARNERS)
+    parser.add_argument("--max-open", type=int, default=None,
+                        help="learners whose files stay open (default: derived from the descriptor limit)")
+    args = parser.parse_args(argv)
+    server = QuizServer(args.state_dir, args.max_learners, args.max_open)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
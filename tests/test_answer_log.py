@@ -0,0 +1,55 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from utils.answer_log import AnswerLog
+
+
+class CompactionTest(unittest.TestCase):
+    """Archived records are counted once, whether or not the log has been rewritten yet."""
+
+    def test_archive_before_compact(self):
+        with tempfile.TemporaryDirectory() as root:
+            log = AnswerLog(Path(root))
+            for i in range(6):
+                log.append("basics", "single", str(i % 3), i % 2 == 0, 1)
+            seq = log.touched()[0]
+            log.archive(seq)
+            # answers journaled between archive() and compact()
+            log.append("basics", "single", "0", False, 0)
+            expected = {"0": [3, 2], "1": [2, 1], "2": [2, 1]}
+
+            for step in ("archived", "compacted"):
+                with self.subTest(step=step):
+                    stats = log.question_stats()["basics/single"]
+                    self.assertEqual({k: v[:2] for k, v in stats.items()}, expected)
+                    self.assertEqual([r[0] for r in log.records()], list(range(1, 8)))
+                self.assertEqual(log.archive(seq), 0)
+                log.compact(seq)
+            self.assertEqual(log.pending(), 1)
+            log.invalidate()
+
+
+class CloseTest(unittest.TestCase):
+    """A closed log re-opens on demand and reports that records may have been missed."""
+
+    def test_sync_after_close(self):
+        with tempfile.TemporaryDirectory() as root:
+            log, other = AnswerLog(Path(root)), AnswerLog(Path(root))
+            with log.locked():
+                log.sync()
+                log.append("basics", "single", "0", True, 1)
+            log.close()
+            with other.locked():
+                other.sync()
+                other.append("basics", "single", "0", True, 2)
+            with log.locked():
+                self.assertEqual(log.sync(), ([], True))
+                self.assertEqual(log.sync(), ([], False))
+            self.assertEqual(log.pending(), 2)
+            log.close()
+            other.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+
+from benchmarks.synthetic import make_bank
+from utils import distractors
+
+
+@unittest.skipIf(distractors.np is None, "NumPy is not installed")
+class ScorerEquivalenceTest(unittest.TestCase):
+    """The NumPy and pure-Python scorers must pick exactly the same distractors."""
+
+    def test_same_neighbours(self):
+        for seed in range(4):
+            banks = {
+                qtype: [(str(i), question) for i, question in
+                        enumerate(make_bank(100, seed=seed * 2 + (qtype == "multi"), multi=qtype == "multi"))]
+                for qtype in distractors.QTYPES
+            }
+            with self.subTest(seed=seed):
+                self.assertEqual(distractors.build_neighbours(banks, use_numpy=True),
+                                 distractors.build_neighbours(banks, use_numpy=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import json
+import os
+import tempfile
+import unittest
+
+from benchmarks.synthetic import isolated_data, write_banks
+from utils import loader
+from utils.quiz_pack import PackedBank, build_pack
+
+
+class PackValidityTest(unittest.TestCase):
+    """The pack serves a bank as long as the JSON file's content is the one it was compiled from."""
+
+    def _bank_after(self, change):
+        with tempfile.TemporaryDirectory() as root, isolated_data(root):
+            write_banks(loader.DATA_DIR, 20, chapters=["basics"])
+            build_pack(loader.DATA_DIR)
+            path = loader.DATA_DIR / "quiz_basics_single.json"
+            change(path)
+            loader.quiz_cache.invalidate()
+            bank = loader.quiz_cache.get("basics", "single")
+            return bank, json.loads(path.read_text(encoding="utf-8"))
+
+    def test_unchanged_file(self):
+        bank, _ = self._bank_after(lambda path: None)
+        self.assertIsInstance(bank, PackedBank)
+
+    def test_copy_with_new_mtime(self):
+        def touch(path):
+            st = path.stat()
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        bank, questions = self._bank_after(touch)
+        self.assertIsInstance(bank, PackedBank)
+        self.assertEqual(list(bank), questions)
+
+    def test_edit_of_the_same_size(self):
+        def edit(path):
+            text = path.read_text(encoding="utf-8")
+            path.write_text(text.replace("？", "！", 1), encoding="utf-8")
+        bank, questions = self._bank_after(edit)
+        self.assertNotIsInstance(bank, PackedBank)
+        self.assertEqual(bank, questions)
+
+
+if __name__ == '__main__':
+    unittest.main()
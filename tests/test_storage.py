@@ -0,0 +1,52 @@
+import json
+import tempfile
+import unittest
+
+from benchmarks.synthetic import isolated_data, make_bank
+from utils import loader
+from utils.progress_array import StreakView
+
+
+class BinaryBackendIdsTest(unittest.TestCase):
+    """Streak vectors only hold banks whose question ids are their positions."""
+
+    def _write_bank(self, ids):
+        bank = make_bank(len(ids))
+        for question, qid in zip(bank, ids):
+            question["id"] = qid
+        loader.DATA_DIR.mkdir(parents=True, exist_ok=True)
+        with open(loader.DATA_DIR / "quiz_basics_single.json", "w", encoding="utf-8") as f:
+            json.dump(bank, f, ensure_ascii=False)
+
+    def _round_trip(self, ids, progress):
+        with tempfile.TemporaryDirectory() as root, isolated_data(root, "binary"):
+            self._write_bank(ids)
+            backend = loader.get_backend()
+            backend.save_progress("basics", "single", progress)
+            loaded = backend.load_progress("basics", "single")
+            return loaded, {p.suffix for p in loader.PROGRESS_DIR.iterdir()}
+
+    def test_positional_bank_is_a_vector(self):
+        loaded, suffixes = self._round_trip([0, 1, 2, 3], {"1": 2, "3": 1})
+        self.assertIsInstance(loaded, StreakView)
+        self.assertEqual(dict(loaded), {"0": 0, "1": 2, "2": 0, "3": 1})
+        self.assertEqual(suffixes, {".bin"})
+
+    def test_named_ids_stay_in_json(self):
+        loaded, suffixes = self._round_trip(["a", "b", "c"], {"b": 2, "c": 1})
+        self.assertEqual(loaded, {"b": 2, "c": 1})
+        self.assertEqual(suffixes, {".json"})
+
+    def test_large_numeric_ids_stay_in_json(self):
+        loaded, suffixes = self._round_trip([10 ** 9, 10 ** 9 + 1], {str(10 ** 9 + 1): 3})
+        self.assertEqual(loaded, {str(10 ** 9 + 1): 3})
+        self.assertEqual(suffixes, {".json"})
+
+    def test_keys_outside_the_bank_stay_in_json(self):
+        loaded, suffixes = self._round_trip([0, 1], {"0": 1, "5": 2})
+        self.assertEqual(loaded, {"0": 1, "5": 2})
+        self.assertEqual(suffixes, {".json"})
+
+
+if __name__ == '__main__':
+    unittest.main()
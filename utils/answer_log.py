@@ -0,0 +1,457 @@
+import gzip
+import json
+import os
+import threading
+import time
+
+from utils import loader
+from utils.file_lock import FileLock, NullLock
+from utils.storage import atomic_write_json
+
+LOG_NAME = "answers.log"
+ARCHIVE_NAME = "answers_archive.log.gz"
+STATS_NAME = "answer_stats.json"
+LOCK_NAME = "answers.lock"
+COMPACT_LOCK_NAME = "answers.compact.lock"
+# Answers kept in the log before progress_store folds them into a snapshot.
+COMPACT_THRESHOLD = 500
+
+# Record layouts (one compact JSON array per line):
+#   answer: [seq, ts, chapter, qtype, qkey, correct, streak, response_ms, chosen, mode]
+#   reset:  [seq, ts, "reset", chapter]
+# `qkey` is the question's stable key (utils/question_ids.py), stored as a
+# number when it is one.
+# `streak` is the streak *after* the answer, so replaying a record is
+# idempotent: applying any suffix of the log to a newer snapshot is exact.
+RESET = "reset"
+
+
+def _encode(record):
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _stored_key(qkey):
+    qkey = str(qkey)
+    return int(qkey) if qkey.isdigit() and str(int(qkey)) == qkey else qkey
+
+
+def _identity(st):
+    return (st.st_dev, st.st_ino)
+
+
+class AnswerLog:
+    """
+    Append-only journal of every answer (progress/answers.log).
+
+    update_progress appends one record per answer instead of rewriting a
+    progress file; progress loaded from the backend (the snapshot) is
+    brought up to date by replay(). compact() moves the journaled records
+    into the gzip archive and the per-question statistics once
+    progress_store has written a new snapshot, and leaves only records that
+    arrived after it in the log.
+
+    Several threads or processes may share one progress directory (the quiz
+    server, benchmarks.contention). Writers serialise on a lock file
+    (locked()), and sync() tails what the others appended, so a streak is
+    always read from the latest record before the next one is written.
+    Compactions serialise on a second lock file (compacting()) instead, so
+    writing the snapshot, archive and statistics does not stop answers from
+    being journaled.
+
+    The app's instance follows loader.PROGRESS_DIR (and so the current
+    learner); pass `progress_dir` to journal a fixed directory instead
+    (the quiz server keeps one log per learner).
+    """
+
+    def __init__(self, progress_dir=None):
+        self.progress_dir = progress_dir
+        # switched off only by `benchmarks.contention --unsafe`, to show what the lock prevents
+        self.locking = True
+        self._lock = threading.RLock()
+        self._file_locks = {}
+        self._path = None
+        self._file = None
+        self._records = []
+        self._ops = {}  # (chapter, qtype) -> [(qkey or None for a reset, streak, seq)]
+        self._seq = 0
+        self._offset = 0  # bytes of the log parsed so far
+        self._identity = None  # (st_dev, st_ino) of the open log; compaction replaces the file
+        self._closed = False  # close()d since the last sync(): records may have been missed
+
+    def _dir(self):
+        return self.progress_dir if self.progress_dir is not None else loader.PROGRESS_DIR
+
+    def locked(self):
+        """
+        The lock that makes read-streak / append / apply atomic across every
+        thread and process sharing the progress directory. Take it before any
+        other lock but compacting(), and call sync() inside it before reading
+        a streak.
+        """
+        return self._file_lock(LOCK_NAME)
+
+    def compacting(self):
+        """
+        The lock that allows one compaction at a time in the progress
+        directory, held from taking the snapshot until compact() returns.
+        Take it before locked().
+        """
+        return self._file_lock(COMPACT_LOCK_NAME)
+
+    def _file_lock(self, name):
+        if not self.locking:
+            return NullLock()
+        path = self._dir() / name
+        with self._lock:
+            lock = self._file_locks.get(path)
+            if lock is None:
+                lock = self._file_locks[path] = FileLock(path)
+            return lock
+
+    # --- loading ---
+
+    def _ensure_open(self):
+        """Opens (or, after PROGRESS_DIR changed, re-opens) the log and parses it once."""
+        path = self._dir() / LOG_NAME
+        if self._path == path:
+            return
+        self._close()
+        self._path = path
+        self._records = []
+        self._ops = {}
+        self._seq = self._load_stats().get("last_seq", 0)
+        self._offset = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # unbuffered append: each record is one write() at the end of the file
+        self._file = open(path, "ab", buffering=0)
+        self._identity = _identity(os.fstat(self._file.fileno()))
+        self._read_new()
+
+    def _read_new(self):
+        """Parses the complete records after `_offset`; a torn last line is left for later."""
+        with open(self._path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        complete = data[:data.rfind(b"\n") + 1]
+        self._offset += len(complete)
+        new = []
+        for line in complete.decode("utf-8").splitlines():
+            try:
+                new.append(json.loads(line))
+            except ValueError:
+                continue
+        for record in new:
+            self._records.append(record)
+            self._add_op(record)
+            self._seq = max(self._seq, record[0])
+        return new
+
+    def _index(self, records):
+        self._ops = {}
+        for record in records:
+            self._add_op(record)
+
+    def _add_op(self, record):
+        if record[2] == RESET:
+            for qtype in ("single", "multi"):
+                self._ops.setdefault((record[3], qtype), []).append((None, 0, record[0]))
+        else:
+            _, _, chapter, qtype, qkey, _, streak = record[:7]
+            self._ops.setdefault((chapter, qtype), []).append((str(qkey), streak, record[0]))
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._path = None
+        self._identity = None
+
+    def sync(self):
+        """
+        Catches up with records other processes appended (call it inside
+        locked()). Returns (new records, reloaded); reloaded is True when
+        another process compacted the log, i.e. the snapshots changed and
+        the log was re-read from scratch.
+        """
+        with self._lock:
+            self._ensure_open()
+            if self._closed:
+                self._closed = False
+                return [], True
+            try:
+                st = os.stat(self._path)
+            except FileNotFoundError:
+                st = None
+            if st is None or _identity(st) != self._identity:
+                self._close()
+                self._ensure_open()
+                return [], True
+            if st.st_size <= self._offset:
+                return [], False
+            return self._read_new(), False
+
+    def invalidate(self):
+        """Closes the log; the next call re-reads it (e.g. after PROGRESS_DIR changed)."""
+        with self._lock:
+            self._close()
+            self._records = []
+            self._ops = {}
+
+    def close(self):
+        """
+        Closes the log and its lock files (e.g. of a learner the quiz server
+        has not heard from for a while); the next call re-opens them. The
+        first sync() after that reports reloaded, as nothing journaled by
+        others in the meantime was seen.
+        """
+        with self._lock:
+            self.invalidate()
+            self._closed = True
+            locks = list(self._file_locks.values())
+        # outside _lock: a thread holding a file lock may be waiting for it
+        for lock in locks:
+            lock.close()
+
+    def detach(self):
+        """Hands over the open log (see ProgressStore.detach) and starts closed."""
+        with self._lock:
+            state = (self._path, self._file, self._records, self._ops, self._seq, self._offset, self._identity)
+            self._path, self._file, self._identity = None, None, None
+            self._records, self._ops, self._seq, self._offset = [], {}, 0, 0
+            return state
+
+    def attach(self, state):
+        """Restores a log returned by detach()."""
+        with self._lock:
+            (self._path, self._file, self._records, self._ops, self._seq,
+             self._offset, self._identity) = state
+
+    @staticmethod
+    def close_state(state):
+        """Closes the file of a detached log that will not be attached again."""
+        if state[1] is not None:
+            state[1].close()
+
+    # --- writing ---
+
+    def _append(self, record_tail, durable=False):
+        """Appends [seq, *record_tail] at the end of the log; returns the seq."""
+        with self.locked(), self._lock:
+            self.sync()
+            fd = self._file.fileno()
+            if os.fstat(fd).st_size > self._offset:
+                # a writer crashed mid-record; every writer holds the lock, so this is safe
+                os.ftruncate(fd, self._offset)
+            self._seq += 1
+            record = [self._seq, *record_tail]
+            data = _encode(record)
+            self._file.write(data)
+            if durable:
+                os.fsync(fd)
+            self._offset += len(data)
+            self._records.append(record)
+            self._add_op(record)
+            return self._seq
+
+    def append(self, chapter, qtype, qkey, correct, streak, chosen=None, response_ms=None, mode="learn_new"):
+        """Journals one answer to question `qkey` in O(1); returns its sequence number."""
+        if chosen is not None:
+            chosen = sorted(chosen) if isinstance(chosen, (set, frozenset)) else list(chosen)
+        return self._append([
+            round(time.time(), 3), chapter, qtype, _stored_key(qkey), int(bool(correct)),
+            streak, None if response_ms is None else int(response_ms), chosen,
+            "r" if mode == "review_old" else "l",
+        ])
+
+    def append_reset(self, chapter):
+        """Journals a chapter reset; must be written before the zeroed snapshot."""
+        return self._append([round(time.time(), 3), RESET, chapter], durable=True)
+
+    # --- reading ---
+
+    def replay(self, chapter, qtype, progress):
+        """Applies the journaled answers of one bank to a snapshot; returns how many."""
+        with self._lock:
+            self._ensure_open()
+            ops = list(self._ops.get((chapter, qtype), ()))
+        for qkey, streak, _ in ops:
+            if qkey is None:
+                for key in list(progress):
+                    progress[key] = 0
+            else:
+                progress[qkey] = streak
+        return len(ops)
+
+    def bank_seq(self, chapter, qtype):
+        """Sequence number of the last journaled change to a bank (0 if none is pending)."""
+        with self._lock:
+            self._ensure_open()
+            ops = self._ops.get((chapter, qtype))
+            return ops[-1][2] if ops else 0
+
+    def pending(self):
+        """Number of records not yet compacted."""
+        with self._lock:
+            self._ensure_open()
+            return len(self._records)
+
+    def touched(self):
+        """
+        (last seq, {(chapter, qtype): changed keys or None}) for the records in
+        the log; None means the whole bank changed (a reset).
+        """
+        with self._lock:
+            self._ensure_open()
+            banks = {}
+            for key, ops in self._ops.items():
+                keys = set()
+                for qkey, _, _ in ops:
+                    if qkey is None:
+                        keys = None
+                    elif keys is not None:
+                        keys.add(qkey)
+                banks[key] = keys
+            return self._seq, banks
+
+    def records(self, chapter=None, qtype=None, qkey=None, archived=True):
+        """Answer records, oldest first, optionally filtered; includes the archive by default."""
+        with self._lock:
+            self._ensure_open()
+            recent = list(self._records)
+        if archived:
+            # records archived by a compaction that has not rewritten the log yet
+            last_seq = self._load_stats().get("last_seq", 0)
+            recent = self._archived() + [r for r in recent if r[0] > last_seq]
+        result = []
+        for record in recent:
+            if record[2] == RESET:
+                continue
+            if chapter is not None and record[2] != chapter:
+                continue
+            if qtype is not None and record[3] != qtype:
+                continue
+            if qkey is not None and str(record[4]) != str(qkey):
+                continue
+            result.append(record)
+        return result
+
+    def _archived(self):
+        path = self._dir() / ARCHIVE_NAME
+        if not path.exists():
+            return []
+        records = []
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+        return records
+
+    # --- statistics and compaction ---
+
+    def _load_stats(self):
+        try:
+            with open(self._dir() / STATS_NAME, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (ValueError, FileNotFoundError):
+            return {}
+
+    @staticmethod
+    def _fold(stats, records):
+        """Adds answer records to {"chapter/qtype": {qkey: [attempts, wrong, last_wrong_ts, total_ms, timed]}}."""
+        for record in records:
+            if record[2] == RESET:
+                continue
+            _, ts, chapter, qtype, qkey, correct, _, response_ms = record[:8]
+            entry = stats.setdefault(f"{chapter}/{qtype}", {}).setdefault(str(qkey), [0, 0, None, 0, 0])
+            entry[0] += 1
+            if not correct:
+                entry[1] += 1
+                entry[2] = ts
+            if response_ms is not None:
+                entry[3] += response_ms
+                entry[4] += 1
+        return stats
+
+    def question_stats(self):
+        """Per-question totals over every answer ever given (archive plus log)."""
+        with self._lock:
+            self._ensure_open()
+            recent = list(self._records)
+        saved = self._load_stats()
+        stats = {bank: {k: list(v) for k, v in entries.items()} for bank, entries in saved.get("banks", {}).items()}
+        last_seq = saved.get("last_seq", 0)
+        return self._fold(stats, [r for r in recent if r[0] > last_seq])
+
+    def most_missed(self, chapter=None, limit=10):
+        """
+        The questions answered wrong most often: [(chapter, qtype, qkey, wrong, attempts)],
+        most wrong answers first (ties: higher error rate, then most recent miss).
+        Keys are stable question keys; see utils/question_ids.py for positions.
+        """
+        missed = []
+        for bank, entries in self.question_stats().items():
+            bank_chapter, qtype = bank.split("/")
+            if chapter is not None and bank_chapter != chapter:
+                continue
+            for qkey, (attempts, wrong, last_wrong, _, _) in entries.items():
+                if wrong:
+                    missed.append((-wrong, -wrong / attempts, -(last_wrong or 0), bank_chapter, qtype, qkey, attempts))
+        missed.sort()
+        return [(c, q, i, -w, a) for w, _, _, c, q, i, a in missed[:limit]]
+
+    def archive(self, upto_seq):
+        """
+        Appends the records up to `upto_seq` to the archive and folds them into
+        the statistics; records an interrupted compaction already archived are
+        skipped. Needs compacting() but not locked(): answers can be journaled
+        meanwhile. Returns how many records were archived.
+        """
+        with self._lock:
+            self._ensure_open()
+            records = list(self._records)
+        saved = self._load_stats()
+        last_seq = saved.get("last_seq", 0)
+        done = [r for r in records if last_seq < r[0] <= upto_seq]
+        if not done:
+            return 0
+        progress_dir = self._dir()
+        with gzip.open(progress_dir / ARCHIVE_NAME, "ab") as f:
+            f.write(b"".join(_encode(record) for record in done))
+        stats = self._fold(saved.get("banks", {}), done)
+        atomic_write_json(progress_dir / STATS_NAME, {"last_seq": upto_seq, "banks": stats})
+        return len(done)
+
+    def compact(self, upto_seq):
+        """
+        Moves records up to `upto_seq` (already contained in the progress
+        snapshot) into the archive and statistics, unless archive() already
+        did, and rewrites the log with the rest. Hold compacting() from taking
+        the snapshot until this returns, and sync() under locked() first.
+        Returns how many records left the log.
+        """
+        with self.locked(), self._lock:
+            self._ensure_open()
+            self.archive(upto_seq)
+            rest = [r for r in self._records if r[0] > upto_seq]
+            if len(rest) == len(self._records):
+                return 0
+            tmp = self._path.with_suffix(".tmp")
+            data = b"".join(_encode(record) for record in rest)
+            with open(tmp, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self._path)
+            self._file.close()
+            self._file = open(self._path, "ab", buffering=0)
+            self._identity = _identity(os.fstat(self._file.fileno()))
+            self._offset = len(data)
+            removed = len(self._records) - len(rest)
+            self._records = rest
+            self._index(rest)
+            return removed
+
+
+answer_log = AnswerLog()
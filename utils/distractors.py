@@ -0,0 +1,227 @@
+import json
+import math
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # the pure-Python scorer picks the same distractors, only slower
+    np = None
+
+from utils import loader
+from utils.question_ids import question_ids
+from utils.search_index import index_tokens
+from utils.storage import atomic_write_json
+
+# One neighbour file per chapter: data/distractors/<chapter>.json
+INDEX_DIR_NAME = "distractors"
+INDEX_VERSION = 1
+QTYPES = ("single", "multi")
+# Cross-question distractors kept per question.
+NEIGHBOURS = 6
+# A candidate this similar to a correct answer is likely a paraphrase of it,
+# so it is never offered as a wrong option.
+MAX_SIMILARITY = 0.6
+# Questions scored per matrix product (bounds the block of similarities in memory).
+BLOCK = 256
+# Below this many answer strings the inverted index is faster than the matrix
+# products (every chapter the app ships), so NumPy is only used for large banks.
+NUMPY_MIN_STRINGS = 1000
+
+
+def _token_sets(strings):
+    """Character unigrams and bigrams of each string, as sets."""
+    return [set(index_tokens(s)) for s in strings]
+
+
+def _scores_numpy(token_sets, groups):
+    """
+    For each group of string rows, the cosine similarity of every string to
+    the closest string of the group: the row-wise maximum over those rows of
+    the string-by-string similarity matrix, computed a block of groups at a
+    time.
+    """
+    vocab, rows, cols = {}, [], []
+    for i, tokens in enumerate(token_sets):
+        for token in tokens:
+            rows.append(i)
+            cols.append(vocab.setdefault(token, len(vocab)))
+    vectors = np.zeros((len(token_sets), max(1, len(vocab))))
+    vectors[rows, cols] = 1.0
+    norms = np.sqrt(vectors.sum(axis=1))
+    norms[norms == 0] = 1.0
+    vectors /= norms[:, None]
+    for start in range(0, len(groups), BLOCK):
+        block = groups[start:start + BLOCK]
+        offsets = np.cumsum([0] + [len(group) for group in block[:-1]])
+        similarity = vectors[[r for group in block for r in group]] @ vectors.T
+        yield from np.maximum.reduceat(similarity, offsets, axis=0)
+
+
+def _scores_python(token_sets, groups):
+    """Same scores as _scores_numpy, from an inverted index of the tokens."""
+    postings = {}
+    for i, tokens in enumerate(token_sets):
+        for token in tokens:
+            postings.setdefault(token, []).append(i)
+    norms = [math.sqrt(len(tokens)) or 1.0 for tokens in token_sets]
+    for group in groups:
+        best = [0.0] * len(token_sets)
+        for r in group:
+            shared = {}
+            for token in token_sets[r]:
+                for i in postings[token]:
+                    shared[i] = shared.get(i, 0) + 1
+            for i, count in shared.items():
+                score = count / (norms[r] * norms[i])
+                if score > best[i]:
+                    best[i] = score
+        yield best
+
+
+def build_neighbours(banks, use_numpy=None):
+    """
+    banks: {qtype: [(qkey, question)]} of one chapter.
+    Returns {qtype: {qkey: [distractor, ...]}}: for every question, the
+    NEIGHBOURS wrong options of the chapter's other questions that are most
+    similar to its own options. Strings that are a correct answer anywhere
+    in the chapter are never used, nor anything containing (or contained
+    in) one of the question's correct answers or too similar to one.
+    """
+    strings, position, correct_anywhere = [], {}, set()
+    for questions in banks.values():
+        for _, question in questions:
+            correct_anywhere.update(question.get("correct_answers", []))
+            for text in question.get("correct_answers", []) + question.get("wrong_options", []):
+                if text not in position:
+                    position[text] = len(strings)
+                    strings.append(text)
+    entries = [(qtype, qkey, question) for qtype, questions in banks.items()
+               for qkey, question in questions if question.get("correct_answers")]
+    corrects = [[position[text] for text in question["correct_answers"]] for _, _, question in entries]
+    options = [rows + [position[text] for text in question.get("wrong_options", [])]
+               for rows, (_, _, question) in zip(corrects, entries)]
+
+    if use_numpy is None:
+        use_numpy = np is not None and len(strings) >= NUMPY_MIN_STRINGS
+    token_sets = _token_sets(strings)
+    scorer = _scores_numpy if use_numpy else _scores_python
+    neighbours = {qtype: {} for qtype in banks}
+    scored = zip(entries, scorer(token_sets, corrects), scorer(token_sets, options))
+    for (qtype, qkey, question), to_correct, to_options in scored:
+        # rounded so both scorers order near-ties and decide the threshold the same way
+        plausible = [round(float(score), 9) for score in to_options]
+        to_correct = [round(float(score), 9) for score in to_correct]
+        answers = question["correct_answers"]
+        own = set(answers) | set(question.get("wrong_options", []))
+        picked = []
+        for i in sorted(range(len(strings)), key=lambda i: -plausible[i]):
+            if plausible[i] <= 0 or len(picked) == NEIGHBOURS:
+                break
+            text = strings[i]
+            if text in own or text in correct_anywhere or to_correct[i] >= MAX_SIMILARITY:
+                continue
+            if any(answer in text or text in answer for answer in answers):
+                continue
+            picked.append(text)
+        neighbours[qtype][qkey] = picked
+    return neighbours
+
+
+class DistractorIndex:
+    """
+    Cross-question distractors for every question, so options are not drawn
+    from the same few wrong_options on every pass.
+
+    The neighbour lists of a chapter are computed once from a character
+    n-gram similarity matrix over all of its answer strings (vectorized with
+    NumPy for large banks when it is installed) and stored under
+    data/distractors/ with the signatures and content hashes of the
+    chapter's banks; like the search index, a chapter is only recomputed
+    when one of its banks' content changed. Lookups are keyed by stable
+    question key (utils/question_ids.py) and cost a dict access, so
+    rendering a question compares no text at all.
+    """
+
+    def __init__(self):
+        self._chapters = {}  # chapter -> {"banks": {qtype: {"signature", "hash"}}, "neighbours"}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _index_path(chapter):
+        return loader.DATA_DIR / INDEX_DIR_NAME / f"{chapter}.json"
+
+    @staticmethod
+    def _signatures(chapter):
+        signatures = {}
+        for qtype in QTYPES:
+            signature = loader.quiz_cache.signature(chapter, qtype)
+            signatures[qtype] = list(signature) if signature is not None else None
+        return signatures
+
+    def _read(self, chapter):
+        try:
+            with open(self._index_path(chapter), "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (ValueError, OSError):
+            return None
+        return saved if saved.get("version") == INDEX_VERSION else None
+
+    def chapter(self, chapter: str):
+        """{qtype: {qkey: [distractor, ...]}} of a chapter, recomputed only if a bank changed."""
+        signatures = self._signatures(chapter)
+        with self._lock:
+            entry = self._chapters.get(chapter)
+            if entry is not None and all(entry["banks"][q]["signature"] == signatures[q] for q in QTYPES):
+                return entry["neighbours"]
+            entry = self._read(chapter) if entry is None else entry
+            if entry is None or any(entry["banks"][q]["signature"] != signatures[q] for q in QTYPES):
+                entry = self._refresh(chapter, entry, signatures)
+            self._chapters[chapter] = entry
+            return entry["neighbours"]
+
+    def _refresh(self, chapter, entry, signatures):
+        hashes = {qtype: loader.quiz_cache.content_hash(chapter, qtype) if signatures[qtype] else None
+                  for qtype in QTYPES}
+        if entry is None or any(entry["banks"][q]["hash"] != hashes[q] for q in QTYPES):
+            banks = {}
+            for qtype in QTYPES:
+                quiz = loader.load_quiz(chapter, qtype)
+                ids = question_ids.bank(chapter, qtype)
+                banks[qtype] = [(ids.key(i), quiz[i]) for i in range(len(quiz))]
+            entry = {"neighbours": build_neighbours(banks)}
+        entry["version"] = INDEX_VERSION
+        entry["banks"] = {q: {"signature": signatures[q], "hash": hashes[q]} for q in QTYPES}
+        path = self._index_path(chapter)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(path, entry)
+        return entry
+
+    def distractors(self, chapter: str, qtype: str, qkey: str):
+        """The precomputed cross-question distractors of one question (best first)."""
+        return self.chapter(chapter).get(qtype, {}).get(qkey, [])
+
+    def invalidate(self):
+        """Forgets the neighbour lists in memory; the next lookup re-checks the files."""
+        with self._lock:
+            self._chapters.clear()
+
+
+distractor_index = DistractorIndex()
+
+
+if __name__ == '__main__':
+    # python -m utils.distractors          ->  为所有章节计算干扰项并显示耗时
+    # python -m utils.distractors basics   ->  同时列出该章每道题的跨题干扰项
+    import sys
+    import time
+    from utils.progress_manager import CHAPTERS
+    print(f"NumPy: {'已启用' if np is not None else '未安装，使用纯 Python 计算'}")
+    for chapter in CHAPTERS:
+        started = time.perf_counter()
+        neighbours = distractor_index.chapter(chapter)
+        count = sum(len(bank) for bank in neighbours.values())
+        print(f"{chapter}: {count} 道题，{(time.perf_counter() - started) * 1000:.1f} ms")
+        if sys.argv[1:2] == [chapter]:
+            for qtype, bank in neighbours.items():
+                for qkey, texts in bank.items():
+                    print(f"  {qtype}#{qkey}: {' / '.join(texts)}")
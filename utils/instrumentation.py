@@ -0,0 +1,191 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# NVSHU_TRACE=1 turns tracing on (=0 forces it off); otherwise the "trace"
+# key of state/settings.json decides, see Tracer.configure().
+TRACE_ENV = "NVSHU_TRACE"
+# Oldest trace events are dropped beyond this; the per-span aggregates keep counting.
+MAX_EVENTS = 200_000
+TRACE_FILE = "trace.json"
+SUMMARY_FILE = "trace_summary.json"
+
+
+class _NullSpan:
+    """Returned by Tracer.span() while tracing is off; does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.start, time.perf_counter(), self.args)
+        return False
+
+
+class Tracer:
+    """
+    Spans and counters for the hot paths (bank loading, progress I/O, drawing,
+    rendering), exported as per-span aggregates and as a Chrome trace-event
+    file that chrome://tracing or https://ui.perfetto.dev can open.
+
+    While disabled, a traced call costs one attribute check and span() hands
+    back a shared no-op object, so the instrumentation can stay in place.
+    """
+
+    def __init__(self, enabled=False, max_events=MAX_EVENTS):
+        self.enabled = enabled
+        self.t0 = time.perf_counter()
+        self.events = deque(maxlen=max_events)
+        self.spans = {}  # name -> [count, total_s, max_s]
+        self.counters = {}
+        self._threads = {}  # thread id -> thread name
+        self._lock = threading.Lock()
+
+    def configure(self, settings=None):
+        """Enables or disables tracing from TRACE_ENV, else settings["trace"]."""
+        env = os.environ.get(TRACE_ENV)
+        if env is not None:
+            self.enabled = env not in ("", "0")
+        else:
+            self.enabled = bool((settings or {}).get("trace", False))
+        return self.enabled
+
+    def span(self, name: str, **args):
+        """Context manager timing one block: `with tracer.span("build", n=3): ...`"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def record(self, name: str, start: float, end: float, args=None):
+        """Adds one finished span (perf_counter() timestamps)."""
+        duration = end - start
+        thread = threading.current_thread()
+        with self._lock:
+            agg = self.spans.get(name)
+            if agg is None:
+                self.spans[name] = [1, duration, duration]
+            else:
+                agg[0] += 1
+                agg[1] += duration
+                if duration > agg[2]:
+                    agg[2] = duration
+            self._threads[thread.ident] = thread.name
+            event = {
+                "name": name, "cat": "span", "ph": "X",
+                "ts": (start - self.t0) * 1e6, "dur": duration * 1e6,
+                "pid": os.getpid(), "tid": thread.ident,
+            }
+            if args:
+                event["args"] = args
+            self.events.append(event)
+
+    def count(self, name: str, delta=1):
+        """Adds delta to a counter (shown as a counter track in the trace)."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            value = self.counters.get(name, 0) + delta
+            self.counters[name] = value
+            self.events.append({
+                "name": name, "cat": "counter", "ph": "C",
+                "ts": (now - self.t0) * 1e6, "pid": os.getpid(),
+                "args": {"value": value},
+            })
+
+    def summary(self):
+        """Per-span count/total/mean/max in milliseconds, plus counter totals."""
+        with self._lock:
+            spans = {
+                name: {
+                    "count": count,
+                    "total_ms": round(total * 1000, 3),
+                    "mean_ms": round(total * 1000 / count, 3),
+                    "max_ms": round(peak * 1000, 3),
+                }
+                for name, (count, total, peak) in sorted(self.spans.items(), key=lambda kv: -kv[1][1])
+            }
+            return {"spans": spans, "counters": dict(self.counters)}
+
+    def trace_events(self):
+        """The recorded events plus thread-name metadata, in trace-event format."""
+        with self._lock:
+            pid = os.getpid()
+            meta = [
+                {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                for tid, name in self._threads.items()
+            ]
+            return meta + list(self.events)
+
+    def dump(self, directory):
+        """
+        Writes TRACE_FILE and SUMMARY_FILE into `directory`.
+        Returns whether anything was written (nothing is when no span was recorded).
+        """
+        if not self.spans and not self.counters:
+            return False
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / TRACE_FILE, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f)
+        with open(directory / SUMMARY_FILE, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2, ensure_ascii=False)
+        return True
+
+    def reset(self):
+        """Forgets every recorded span, counter and event."""
+        with self._lock:
+            self.events.clear()
+            self.spans.clear()
+            self.counters.clear()
+            self._threads.clear()
+            self.t0 = time.perf_counter()
+
+
+tracer = Tracer()
+tracer.configure()
+
+
+def traced(name: str = None):
+    """
+    Decorator recording every call of a function as a span named `name`
+    (default: the function's qualified name). String and number positional
+    arguments, e.g. chapter and qtype, are attached to the trace event.
+    """
+    def decorate(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                call_args = [a for a in args if isinstance(a, (str, int, float))]
+                tracer.record(span_name, start, time.perf_counter(),
+                              {"args": call_args} if call_args else None)
+        return wrapper
+    return decorate
@@ -0,0 +1,118 @@
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+from utils.instrumentation import tracer
+
+
+def _call_now(callback, future):
+    callback(future)
+
+
+class _Task:
+    __slots__ = ("kind", "key", "fn", "args", "future", "callbacks")
+
+    def __init__(self, kind, key, fn, args):
+        self.kind = kind
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.future = Future()
+        self.callbacks = []
+
+
+class IOWorker:
+    """
+    One background thread that runs every disk read and write of the app, so
+    the Kivy main loop never waits on storage.
+
+    read() and write() return a concurrent.futures.Future; the optional
+    callback receives that future once it is done, through the dispatcher.
+    main.py sets a dispatcher that calls back via Clock.schedule_once, so
+    callbacks run on the main thread and may touch widgets.
+
+    Tasks run one at a time in submission order. Requests with the same key
+    are coalesced while they are still queued: a read joins the pending read
+    (unless a write to the key was queued after it), and a write replaces
+    the arguments of the pending write, so only the latest data is written.
+    """
+
+    def __init__(self, name="io-worker"):
+        self.name = name
+        self._queue = deque()
+        self._pending = {}  # (kind, key) -> queued task that has not started
+        self._cond = threading.Condition()
+        self._busy = False
+        self._thread = None
+        self._dispatch = _call_now
+
+    def set_dispatcher(self, dispatch):
+        """dispatch(callback, future) decides on which thread callbacks run."""
+        self._dispatch = dispatch
+
+    def read(self, key, fn, *args, callback=None):
+        """Queues fn(*args); identical pending reads share one call."""
+        with self._cond:
+            task = self._pending.get(("read", key))
+            if task is None:
+                task = self._enqueue("read", key, fn, args)
+            else:
+                tracer.count("io.coalesced_reads")
+            if callback is not None:
+                task.callbacks.append(callback)
+            return task.future
+
+    def write(self, key, fn, *args, callback=None):
+        """Queues fn(*args); a pending write to the same key is replaced by this one."""
+        with self._cond:
+            task = self._pending.get(("write", key))
+            if task is None:
+                task = self._enqueue("write", key, fn, args)
+                # later reads of this key must run after the write
+                self._pending.pop(("read", key), None)
+            else:
+                task.fn, task.args = fn, args
+                tracer.count("io.coalesced_writes")
+            if callback is not None:
+                task.callbacks.append(callback)
+            return task.future
+
+    def _enqueue(self, kind, key, fn, args):
+        task = _Task(kind, key, fn, args)
+        self._pending[(kind, key)] = task
+        self._queue.append(task)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        self._cond.notify()
+        return task
+
+    def drain(self, timeout=None):
+        """Waits until every queued task has run; returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and not self._busy, timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue)
+                task = self._queue.popleft()
+                if self._pending.get((task.kind, task.key)) is task:
+                    del self._pending[(task.kind, task.key)]
+                self._busy = True
+                fn, args = task.fn, task.args
+            try:
+                task.future.set_result(fn(*args))
+            except BaseException as e:
+                task.future.set_exception(e)
+            for callback in task.callbacks:
+                try:
+                    self._dispatch(callback, task.future)
+                except Exception as e:
+                    print(f"[io_worker] 回调失败: {e}")
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+
+io_worker = IOWorker()
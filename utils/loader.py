@@ -1,37 +1,276 @@
+import hashlib
 import json
+import os
+import struct
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
+from utils.instrumentation import traced, tracer
+from utils.quiz_pack import PACK_NAME, QuizPack
+from utils.storage import BinaryBackend, JsonBackend, SqliteBackend, atomic_write_json, migrate_json_to_sqlite
+
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
 PROGRESS_DIR = DATA_DIR / "progress"
 STATE_FILE = Path(__file__).resolve().parent.parent / "state" / "settings.json"
+DB_FILE = STATE_FILE.parent / "learner.db"
 
-def load_quiz(chapter: str, qtype: str):
-    """Loads quiz data for a given chapter and type."""
-    filename = DATA_DIR / f"quiz_{chapter}_{qtype}.json"
+
+def _file_signature(path: Path):
+    """(mtime_ns, size) of a file, or None if it does not exist."""
     try:
-        with open(filename, "r", encoding="utf-8") as f:
-            return json.load(f)
+        st = path.stat()
     except FileNotFoundError:
-        return []
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class QuizCache:
+    """
+    Thread-safe in-process cache of parsed quiz banks.
+
+    Entries are keyed by (chapter, qtype) and remember the mtime/size of the
+    file they were parsed from, so an edited bank is re-read on the next
+    lookup. `max_entries` bounds the cache with LRU eviction (None = unbounded).
+    The cached lists are shared between callers and must be treated as read-only.
+
+    If data/quiz_pack.bin (see utils/quiz_pack.py) was compiled from the
+    current JSON file, the bank is served from the pack instead: a lazy
+    sequence whose len() is free and whose questions are decoded on access.
+    A JSON file whose mtime differs from the pack's but whose size matches is
+    hashed once and, if its content is unchanged, still served from the pack.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._pack = None
+        self._pack_signature = None
+        self._pack_verified = {}  # (chapter, qtype) -> JSON signature whose content matches the pack
+
+    def _current_pack(self):
+        """Opens (or re-opens after a rebuild) the compiled pack, if there is one."""
+        signature = _file_signature(DATA_DIR / PACK_NAME)
+        if signature != self._pack_signature:
+            # The old pack is not closed here: banks handed out earlier keep its
+            # mmap alive until they are garbage collected.
+            self._pack = None
+            self._pack_verified.clear()
+            if signature is not None:
+                try:
+                    self._pack = QuizPack(DATA_DIR / PACK_NAME)
+                except (OSError, ValueError, struct.error) as e:
+                    print(f"[loader] 无法读取 {PACK_NAME}: {e}")
+            self._pack_signature = signature
+        return self._pack
+
+    def get(self, chapter: str, qtype: str):
+        """Returns the parsed bank, re-reading it only if the file changed."""
+        key = (chapter, qtype)
+        path = DATA_DIR / f"quiz_{chapter}_{qtype}.json"
+        signature = _file_signature(path)
+
+        unverified = None
+        with self._lock:
+            pack = self._current_pack()
+            if pack is not None and (chapter, qtype) in pack.banks:
+                packed = pack.source_signature(chapter, qtype)
+                if signature is None or signature == tuple(packed) or self._pack_verified.get(key) == signature:
+                    self.hits += 1
+                    tracer.count("quiz_cache.hits")
+                    return pack.bank(chapter, qtype)
+                if signature[1] == packed[1]:
+                    # same size, new mtime: possibly a copy of the compiled file
+                    unverified = pack
+
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                tracer.count("quiz_cache.hits")
+                return entry[1]
+            self.misses += 1
+            tracer.count("quiz_cache.misses")
+
+        data = []
+        if signature is not None:
+            try:
+                raw = path.read_bytes()
+            except FileNotFoundError:
+                signature = None
+            else:
+                if unverified is not None and hashlib.sha1(raw).digest() == unverified.source_hash(chapter, qtype):
+                    with self._lock:
+                        if self._pack is unverified:
+                            self._pack_verified[key] = signature
+                    return unverified.bank(chapter, qtype)
+                data = json.loads(raw.decode("utf-8"))
+
+        with self._lock:
+            self._entries[key] = (signature, data)
+            self._entries.move_to_end(key)
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return data
+
+    def packed_banks(self):
+        """The (chapter, qtype) of every bank in the compiled pack (empty without one)."""
+        with self._lock:
+            pack = self._current_pack()
+            return set(pack.banks) if pack is not None else set()
+
+    def signature(self, chapter: str, qtype: str):
+        """
+        (mtime_ns, size) of the bank's JSON file, or of the pack serving it
+        when there is no JSON file; None if the bank does not exist.
+        """
+        signature = _file_signature(DATA_DIR / f"quiz_{chapter}_{qtype}.json")
+        if signature is None:
+            with self._lock:
+                pack = self._current_pack()
+                if pack is not None and (chapter, qtype) in pack.banks:
+                    return self._pack_signature
+        return signature
+
+    def content_hash(self, chapter: str, qtype: str):
+        """sha1 of the bank's JSON file (or the pack signature when there is no JSON file)."""
+        path = DATA_DIR / f"quiz_{chapter}_{qtype}.json"
+        try:
+            return hashlib.sha1(path.read_bytes()).hexdigest()
+        except FileNotFoundError:
+            # served from the compiled pack only
+            return "pack:" + repr(self.signature(chapter, qtype))
+
+    def invalidate(self, chapter: str = None, qtype: str = None):
+        """Drops one bank (or every bank when called without arguments)."""
+        with self._lock:
+            if chapter is None:
+                self._entries.clear()
+            else:
+                self._entries.pop((chapter, qtype), None)
+
+    def stats(self):
+        """Returns hit/miss counters and the current number of cached banks."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+# Shared by every screen; pass max_entries here to bound memory for huge banks.
+quiz_cache = QuizCache()
 
+@traced("load_quiz")
+def load_quiz(chapter: str, qtype: str):
+    """Loads quiz data for a given chapter and type (served from quiz_cache)."""
+    return quiz_cache.get(chapter, qtype)
+
+# --- Learner state storage ---
+# Progress and settings go through a pluggable backend (see utils/storage.py).
+# Set NVSHU_STORAGE=json|sqlite|binary to force one; otherwise SQLite is used once
+# `python -m utils.loader migrate` has created DB_FILE.
+STORAGE_ENV = "NVSHU_STORAGE"
+_backend = None
+_backend_lock = threading.Lock()
+
+def create_backend(name: str = None):
+    """Creates a storage backend by name ('json', 'sqlite' or 'binary')."""
+    if name is None:
+        name = "sqlite" if DB_FILE.exists() else "json"
+    if name == "json":
+        return JsonBackend(PROGRESS_DIR, STATE_FILE)
+    if name == "sqlite":
+        return SqliteBackend(DB_FILE)
+    if name == "binary":
+        return BinaryBackend(PROGRESS_DIR, STATE_FILE)
+    raise ValueError(f"Unknown storage backend: {name}")
+
+def get_backend():
+    """Returns the active storage backend, creating it on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend(os.environ.get(STORAGE_ENV))
+        return _backend
+
+def set_backend(backend):
+    """Replaces the active storage backend (closing the previous one)."""
+    global _backend
+    with _backend_lock:
+        if _backend is not None and _backend is not backend:
+            _backend.close()
+        _backend = backend
+
+def use_paths(progress_dir, state_file, backend=None):
+    """
+    Points progress and settings at another directory (a learner profile, see
+    utils/profiles.py). `backend` is an already open backend for those paths,
+    or None to create one on first use. Returns the backend that was active;
+    it is not closed.
+    """
+    global PROGRESS_DIR, STATE_FILE, DB_FILE, _backend
+    with _backend_lock:
+        previous = _backend
+        PROGRESS_DIR = Path(progress_dir)
+        STATE_FILE = Path(state_file)
+        DB_FILE = STATE_FILE.parent / "learner.db"
+        _backend = backend
+        return previous
+
+def migrate_to_sqlite():
+    """Copies the JSON progress/settings files into DB_FILE and switches to it."""
+    set_backend(migrate_json_to_sqlite(PROGRESS_DIR, STATE_FILE, DB_FILE))
+
+@traced("load_progress")
 def load_progress(chapter: str, qtype: str):
     """Loads progress for a given chapter and type."""
-    PROGRESS_DIR.mkdir(parents=True, exist_ok=True)
-    path = PROGRESS_DIR / f"learned_{chapter}_{qtype}.json"
-    if not path.exists():
-        return {}
+    return get_backend().load_progress(chapter, qtype)
+
+@traced("save_progress")
+def save_progress(chapter: str, qtype: str, progress: dict, changed=None):
+    """
+    Saves progress for a given chapter and type.
+    `changed` optionally lists the keys that differ from what is stored, which
+    lets row-based backends skip rewriting the rest.
+    """
+    get_backend().save_progress(chapter, qtype, progress, changed)
+
+def progress_signature(chapter: str, qtype: str):
+    """A value that changes whenever a bank's stored progress changes (None if unknown)."""
+    return get_backend().progress_signature(chapter, qtype)
+
+def has_progress(chapter: str, qtype: str):
+    """Returns whether any progress has been stored for a chapter and type."""
+    return get_backend().has_progress(chapter, qtype)
+
+def load_schedule(chapter: str, qtype: str):
+    """Loads the review schedule for a chapter and type, or None if there is none yet."""
+    path = PROGRESS_DIR / f"schedule_{chapter}_{qtype}.json"
     try:
         with open(path, "r", encoding="utf-8") as f:
             return json.load(f)
     except (json.JSONDecodeError, FileNotFoundError):
-        return {}
+        return None
 
-def save_progress(chapter: str, qtype: str, progress: dict):
-    """Saves progress for a given chapter and type."""
+def save_schedule(chapter: str, qtype: str, schedule: dict):
+    """Saves the review schedule for a chapter and type."""
     PROGRESS_DIR.mkdir(parents=True, exist_ok=True)
-    path = PROGRESS_DIR / f"learned_{chapter}_{qtype}.json"
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(progress, f, indent=2, ensure_ascii=False)
+    atomic_write_json(PROGRESS_DIR / f"schedule_{chapter}_{qtype}.json", schedule)
+
+def load_mastery_index():
+    """Loads the persisted per-bank learned/total summary, or None if there is none yet."""
+    try:
+        with open(PROGRESS_DIR / "mastery_index.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, FileNotFoundError):
+        return None
+
+def save_mastery_index(index: dict):
+    """Saves the per-bank learned/total summary."""
+    PROGRESS_DIR.mkdir(parents=True, exist_ok=True)
+    atomic_write_json(PROGRESS_DIR / "mastery_index.json", index, indent=2)
 
 def reset_progress(chapter: str):
     """Resets the progress for a specific chapter."""
@@ -42,10 +281,24 @@ def reset_progress(chapter: str):
 
 def load_settings():
     """Loads app settings."""
-    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
-    if not STATE_FILE.exists():
-        with open(STATE_FILE, "w", encoding="utf-8") as f:
-            json.dump({"questions_per_session": 10}, f)
-    with open(STATE_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return get_backend().load_settings()
+
+def save_settings(settings: dict):
+    """Saves app settings."""
+    get_backend().save_settings(settings)
+
+def update_settings(changes: dict):
+    """Applies `changes` on top of the stored settings, saves and returns the result."""
+    settings = load_settings()
+    settings.update(changes)
+    save_settings(settings)
+    return settings
+
 
+if __name__ == '__main__':
+    # python -m utils.loader migrate  ->  一次性把 JSON 进度迁移到 SQLite
+    import sys
+    if sys.argv[1:] == ["migrate"]:
+        migrate_to_sqlite()
+    else:
+        print("usage: python -m utils.loader migrate")
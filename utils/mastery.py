@@ -0,0 +1,166 @@
+import threading
+
+from utils import loader
+from utils.answer_log import answer_log
+from utils.progress_store import progress_store
+from utils.question_ids import question_ids
+from utils.sampler import LEARNED_THRESHOLD
+
+
+def _plain(signature):
+    # JSON round-trips tuples as lists
+    return list(signature) if signature is not None else None
+
+
+def _progress_signature(chapter, qtype):
+    # the stored snapshot plus the answers journaled on top of it
+    return [_plain(loader.progress_signature(chapter, qtype)), answer_log.bank_seq(chapter, qtype)]
+
+
+class MasteryIndex:
+    """
+    Per-bank question totals and learned counts, persisted next to the
+    progress files (progress/mastery_index.json) so the chapter list can be
+    drawn without loading any bank or progress dict.
+
+    Each entry remembers the signature of the bank file and of the stored
+    progress (snapshot plus answer log position) it was computed from. The first time a bank is used in a
+    process the signatures are compared with the files and the entry is
+    rebuilt if either changed (e.g. an edited bank, or progress written by
+    an older version). From then on update_progress keeps the learned count
+    current in O(1), and the index is written together with progress by
+    progress_store.flush().
+    """
+
+    def __init__(self):
+        self._entries = None  # "chapter/qtype" -> {"total", "learned", "bank", "progress"}
+        self._checked = set()
+        self._dirty = set()
+        self._lock = threading.RLock()
+        progress_store.add_flush_hook(self.flush)
+
+    def _load(self):
+        if self._entries is None:
+            saved = loader.load_mastery_index() or {}
+            self._entries = saved.get("banks", {})
+
+    def _entry(self, chapter, qtype):
+        """Returns the up-to-date entry of a bank, rebuilding it if its files changed."""
+        key = f"{chapter}/{qtype}"
+        self._load()
+        entry = self._entries.get(key)
+        if key in self._checked and entry is not None:
+            return entry
+        bank_sig = _plain(loader.quiz_cache.signature(chapter, qtype))
+        progress_sig = _progress_signature(chapter, qtype)
+        if entry is None or entry.get("bank") != bank_sig or entry.get("progress") != progress_sig:
+            entry = self._rebuild(chapter, qtype, bank_sig, progress_sig)
+        self._checked.add(key)
+        return entry
+
+    def _rebuild(self, chapter, qtype, bank_sig, progress_sig):
+        progress = progress_store.get(chapter, qtype)
+        ids = question_ids.bank(chapter, qtype)
+        if ids.identity and len(progress) == len(ids) and hasattr(progress, "count_at_least"):
+            learned = progress.count_at_least(LEARNED_THRESHOLD)
+        else:
+            # only questions still in the bank count
+            learned = sum(1 for key in ids.keys if progress.get(key, 0) >= LEARNED_THRESHOLD)
+        entry = {
+            "total": len(ids),
+            "learned": learned,
+            "bank": bank_sig,
+            "progress": progress_sig,
+        }
+        key = f"{chapter}/{qtype}"
+        self._entries[key] = entry
+        self._dirty.add(key)
+        # written by the next flush, after any pending progress
+        progress_store.request_flush()
+        return entry
+
+    def counts(self, chapter: str, qtype: str):
+        """(learned, total) of one bank."""
+        with self._lock:
+            entry = self._entry(chapter, qtype)
+            return entry["learned"], entry["total"]
+
+    def chapter_counts(self, chapter: str, qtypes=("single", "multi")):
+        """(learned, total) summed over a chapter's banks."""
+        learned = total = 0
+        for qtype in qtypes:
+            bank_learned, bank_total = self.counts(chapter, qtype)
+            learned += bank_learned
+            total += bank_total
+        return learned, total
+
+    def on_streak_change(self, chapter, qtype, old_streak, new_streak):
+        """Adjusts the learned count when an answer crosses LEARNED_THRESHOLD."""
+        key = f"{chapter}/{qtype}"
+        with self._lock:
+            self._load()
+            stored = self._entries.get(key)
+            entry = self._entry(chapter, qtype)
+            self._dirty.add(key)
+            if entry is not stored:
+                # just rebuilt from the live progress, which already has this answer
+                return
+            was_learned = old_streak >= LEARNED_THRESHOLD
+            is_learned = new_streak >= LEARNED_THRESHOLD
+            if is_learned and not was_learned:
+                entry["learned"] += 1
+            elif was_learned and not is_learned:
+                entry["learned"] -= 1
+
+    def rebuild(self, chapter: str, qtypes=("single", "multi")):
+        """Recomputes a chapter's entries from its files, e.g. after a reset."""
+        with self._lock:
+            self._load()
+            for qtype in qtypes:
+                self._checked.discard(f"{chapter}/{qtype}")
+                self._entries.pop(f"{chapter}/{qtype}", None)
+                self._entry(chapter, qtype)
+
+    def invalidate(self):
+        """Forgets everything in memory; the next lookup re-reads and re-checks the index."""
+        with self._lock:
+            self._entries = None
+            self._checked.clear()
+            self._dirty.clear()
+
+    def detach(self):
+        """Hands over the in-memory index (see ProgressStore.detach) and starts empty."""
+        with self._lock:
+            state = (self._entries, self._checked, self._dirty)
+            self._entries, self._checked, self._dirty = None, set(), set()
+            return state
+
+    def attach(self, state):
+        """Restores an index returned by detach()."""
+        with self._lock:
+            self._entries, self._checked, self._dirty = state
+
+    def flush(self):
+        """
+        Writes the index if it changed, stamping the banks in use with their
+        current signatures (a compaction changes them without any answer).
+        """
+        with self._lock:
+            if self._entries is None:
+                return
+            for key in self._checked | self._dirty:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    chapter, qtype = key.split("/")
+                    signature = _progress_signature(chapter, qtype)
+                    if entry.get("progress") != signature:
+                        entry["progress"] = signature
+                        self._dirty.add(key)
+            if not self._dirty:
+                return
+            self._dirty.clear()
+            snapshot = {"version": 1, "banks": {k: dict(v) for k, v in self._entries.items()}}
+        loader.save_mastery_index(snapshot)
+
+
+mastery_index = MasteryIndex()
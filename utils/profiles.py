@@ -0,0 +1,197 @@
+import json
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+from utils import loader
+from utils.answer_log import answer_log
+from utils.mastery import mastery_index
+from utils.progress_store import progress_store
+from utils.sampler import sampler
+from utils.scheduler import scheduler
+from utils.storage import atomic_write_json
+
+DEFAULT_PROFILE = "default"
+DEFAULT_NAME = "默认学习者"
+REGISTRY_NAME = "profiles.json"
+PROFILES_DIR_NAME = "profiles"
+# Learners whose in-memory state is kept after switching away from them.
+PROFILE_CACHE_SIZE = 4
+MAX_NAME_LENGTH = 20
+
+# Everything that holds per-learner state in memory.
+_COMPONENTS = (progress_store, sampler, scheduler, mastery_index, answer_log)
+
+
+class ProfileManager:
+    """
+    Learner profiles, for devices shared by a class.
+
+    The default profile keeps the original locations (data/progress/ and
+    state/settings.json), so an existing install keeps its progress. Every
+    other learner gets a directory of their own, state/profiles/<id>/, with
+    settings.json, progress/ and (if migrated) learner.db. The registry
+    state/profiles.json holds the names and the current learner. Switching
+    flushes the current learner and points loader at the other directory;
+    no profile directory is ever listed, so the cost of a switch does not
+    grow with the number of learners.
+
+    The in-memory state of the PROFILE_CACHE_SIZE most recently used
+    learners (progress, draw pools, review schedules, mastery index, the
+    open answer log and storage backend) is kept in an LRU, so switching
+    back to one of them reads no file at all.
+    """
+
+    def __init__(self, cache_size=PROFILE_CACHE_SIZE, state_dir=None):
+        self.cache_size = cache_size
+        # the install-wide locations, captured before any switch
+        self._state_dir = Path(state_dir) if state_dir is not None else loader.STATE_FILE.parent
+        self._default_paths = (loader.PROGRESS_DIR, loader.STATE_FILE)
+        self._registry = None
+        self._current = DEFAULT_PROFILE
+        self._cache = OrderedDict()  # profile id -> (component states, backend)
+        self._lock = threading.RLock()
+
+    # --- registry ---
+
+    def _load_registry(self):
+        if self._registry is None:
+            try:
+                with open(self._state_dir / REGISTRY_NAME, "r", encoding="utf-8") as f:
+                    self._registry = json.load(f)
+            except (ValueError, FileNotFoundError):
+                self._registry = {"version": 1, "current": DEFAULT_PROFILE, "profiles": {}}
+            self._registry["profiles"].setdefault(DEFAULT_PROFILE, {"name": DEFAULT_NAME, "last_used": 0})
+        return self._registry
+
+    def _save_registry(self):
+        self._state_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(self._state_dir / REGISTRY_NAME, self._registry)
+
+    def paths(self, profile_id):
+        """(progress directory, settings file) of a profile."""
+        if profile_id == DEFAULT_PROFILE:
+            return self._default_paths
+        root = self._state_dir / PROFILES_DIR_NAME / profile_id
+        return root / "progress", root / "settings.json"
+
+    @property
+    def current(self):
+        return self._current
+
+    def current_name(self):
+        with self._lock:
+            return self._load_registry()["profiles"][self._current]["name"]
+
+    def profiles(self):
+        """[(id, name)] of every learner, most recently used first."""
+        with self._lock:
+            entries = self._load_registry()["profiles"]
+            order = sorted(entries, key=lambda pid: -entries[pid].get("last_used", 0))
+            return [(pid, entries[pid]["name"]) for pid in order]
+
+    @staticmethod
+    def _clean_name(name):
+        name = (name or "").strip()
+        if not name:
+            raise ValueError("学习者名字不能为空")
+        return name[:MAX_NAME_LENGTH]
+
+    def create(self, name):
+        """Registers a new learner and returns its id; its files are created on first use."""
+        name = self._clean_name(name)
+        with self._lock:
+            registry = self._load_registry()
+            profile_id = uuid.uuid4().hex[:12]
+            registry["profiles"][profile_id] = {"name": name, "created": time.time(), "last_used": 0}
+            self._save_registry()
+            return profile_id
+
+    def rename(self, profile_id, name):
+        name = self._clean_name(name)
+        with self._lock:
+            self._load_registry()["profiles"][profile_id]["name"] = name
+            self._save_registry()
+
+    def delete(self, profile_id):
+        """Removes a learner and their files; the default and the current learner cannot be deleted."""
+        if profile_id in (DEFAULT_PROFILE, self._current):
+            raise ValueError("不能删除默认学习者或当前学习者")
+        with self._lock:
+            registry = self._load_registry()
+            if registry["profiles"].pop(profile_id, None) is None:
+                raise KeyError(profile_id)
+            cached = self._cache.pop(profile_id, None)
+            if cached is not None:
+                self._close(cached)
+            self._save_registry()
+        shutil.rmtree(self._state_dir / PROFILES_DIR_NAME / profile_id, ignore_errors=True)
+
+    # --- switching ---
+
+    def activate(self):
+        """Switches to the learner that was current when the app last ran."""
+        with self._lock:
+            profile_id = self._load_registry().get("current", DEFAULT_PROFILE)
+            if profile_id in self._registry["profiles"] and profile_id != self._current:
+                self.switch(profile_id)
+            return self._current
+
+    def switch(self, profile_id):
+        """Makes another learner current (run it on the I/O worker: it writes the current one's progress)."""
+        with self._lock:
+            registry = self._load_registry()
+            if profile_id not in registry["profiles"]:
+                raise KeyError(profile_id)
+            if profile_id != self._current:
+                # hooks write schedules and the mastery index together with progress
+                progress_store.flush()
+                states = tuple(component.detach() for component in _COMPONENTS)
+                cached = self._cache.pop(profile_id, None)
+                progress_dir, state_file = self.paths(profile_id)
+                previous_backend = loader.use_paths(progress_dir, state_file, cached[1] if cached else None)
+                self._cache[self._current] = (states, previous_backend)
+                if cached is not None:
+                    for component, state in zip(_COMPONENTS, cached[0]):
+                        component.attach(state)
+                self._current = profile_id
+                while len(self._cache) > self.cache_size:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._close(evicted)
+            registry["current"] = profile_id
+            registry["profiles"][profile_id]["last_used"] = time.time()
+            self._save_registry()
+            return profile_id
+
+    @staticmethod
+    def _close(cached):
+        states, backend = cached
+        answer_log.close_state(states[_COMPONENTS.index(answer_log)])
+        if backend is not None:
+            backend.close()
+
+    def cached(self):
+        """Ids of the learners whose state is held in memory, least recently used first."""
+        with self._lock:
+            return list(self._cache)
+
+
+profile_manager = ProfileManager()
+
+
+if __name__ == '__main__':
+    # python -m utils.profiles            ->  列出所有学习者
+    # python -m utils.profiles add 小明    ->  新建学习者
+    # python -m utils.profiles rm <id>    ->  删除学习者及其进度
+    import sys
+    if sys.argv[1:2] == ["add"] and len(sys.argv) > 2:
+        print(profile_manager.create(" ".join(sys.argv[2:])))
+    elif sys.argv[1:2] == ["rm"] and len(sys.argv) == 3:
+        profile_manager.activate()
+        profile_manager.delete(sys.argv[2])
+    else:
+        for pid, name in profile_manager.profiles():
+            print(f"{pid:<14} {name}")
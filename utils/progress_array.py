@@ -0,0 +1,154 @@
+import mmap
+import os
+import struct
+import threading
+from collections.abc import MutableMapping
+from pathlib import Path
+
+# Fixed-layout progress file:
+#   header  magic(4s) version(H) reserved(H) count(I)   -> 12 bytes, little-endian
+#   body    count x uint8 streaks, indexed by question id (see utils/question_ids.py)
+MAGIC = b"NVSP"
+VERSION = 1
+HEADER = struct.Struct("<4sHHI")
+MAX_STREAK = 255
+
+
+class StreakView(MutableMapping):
+    """
+    Dict-compatible view of a streak vector.
+
+    Keys are positions as strings ("0", "1", ...), which are also the
+    question ids of a bank without ids of its own, exactly like the JSON
+    progress dicts, so existing callers keep working. The storage is a
+    bytearray with one byte per question; values are clamped to 0..255.
+    """
+
+    __slots__ = ("streaks",)
+
+    def __init__(self, streaks=None):
+        self.streaks = bytearray(streaks or b"")
+
+    @classmethod
+    def from_dict(cls, progress: dict, size: int):
+        """
+        Builds a vector of `size` streaks from a {str(position): streak} dict.
+        Raises KeyError for a key that is not a position below `size`, rather
+        than dropping its progress or growing the vector to fit it.
+        """
+        view = cls(bytes(size))
+        for key, value in progress.items():
+            pos = view._position(key)
+            if pos >= size or str(key) != str(pos):
+                raise KeyError(key)
+            view.streaks[pos] = _clamp(value)
+        return view
+
+    def _position(self, key):
+        try:
+            pos = int(key)
+        except (TypeError, ValueError):
+            raise KeyError(key) from None
+        if pos < 0:
+            raise KeyError(key)
+        return pos
+
+    def __getitem__(self, key):
+        pos = self._position(key)
+        if pos >= len(self.streaks):
+            raise KeyError(key)
+        return self.streaks[pos]
+
+    def __setitem__(self, key, value):
+        pos = self._position(key)
+        if pos >= len(self.streaks):
+            self.streaks.extend(bytes(pos + 1 - len(self.streaks)))
+        self.streaks[pos] = _clamp(value)
+
+    def __delitem__(self, key):
+        # Positions cannot disappear from a vector; deleting resets the streak.
+        self[key] = 0
+
+    def __iter__(self):
+        return (str(i) for i in range(len(self.streaks)))
+
+    def __len__(self):
+        return len(self.streaks)
+
+    def get(self, key, default=None):
+        try:
+            pos = int(key)
+        except (TypeError, ValueError):
+            return default
+        if 0 <= pos < len(self.streaks):
+            return self.streaks[pos]
+        return default
+
+    def values(self):
+        # bytearray iterates as ints without building any key strings
+        return self.streaks
+
+    def copy(self):
+        return StreakView(self.streaks)
+
+    def count_at_least(self, threshold: int) -> int:
+        """Counts streaks >= threshold using C-level bytearray.count."""
+        return len(self.streaks) - sum(self.streaks.count(v) for v in range(min(threshold, MAX_STREAK + 1)))
+
+    def __repr__(self):
+        return f"StreakView({len(self.streaks)} questions)"
+
+
+def _clamp(value):
+    return max(0, min(MAX_STREAK, int(value)))
+
+
+def read_streaks(path: Path):
+    """Reads a progress file through mmap. Returns a StreakView, or None if missing/invalid."""
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                magic, version, _, count = HEADER.unpack_from(mm, 0)
+                if magic != MAGIC or version != VERSION or len(mm) < HEADER.size + count:
+                    return None
+                return StreakView(mm[HEADER.size:HEADER.size + count])
+    except FileNotFoundError:
+        return None
+
+
+def temp_path(path: Path) -> Path:
+    """Temp file for an atomic rewrite of `path`, private to this process and thread."""
+    return path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+
+
+def write_streaks(path: Path, view: StreakView):
+    """Writes a whole progress file atomically (temp file + rename)."""
+    tmp_path = temp_path(path)
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(view.streaks)))
+        f.write(view.streaks)
+    os.replace(tmp_path, path)
+
+
+def update_streaks_in_place(path: Path, view: StreakView, positions) -> bool:
+    """
+    Patches only the given positions of an existing file through a writable
+    mmap. Returns False when the file is missing or its size no longer
+    matches, in which case the caller must rewrite it with write_streaks.
+    """
+    try:
+        with open(path, "r+b") as f:
+            if os.fstat(f.fileno()).st_size != HEADER.size + len(view.streaks):
+                return False
+            with mmap.mmap(f.fileno(), 0) as mm:
+                magic, version, _, count = HEADER.unpack_from(mm, 0)
+                if magic != MAGIC or version != VERSION or count != len(view.streaks):
+                    return False
+                for pos in positions:
+                    mm[HEADER.size + pos] = view.streaks[pos]
+                mm.flush()
+        return True
+    except FileNotFoundError:
+        return False
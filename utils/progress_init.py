@@ -1,12 +1,13 @@
 import os
 import json
 from utils.loader import load_quiz
+from utils.question_ids import question_key
 
 def ensure_progress_file(chapter, qtype):
     path = f"progress/learned_{chapter}_{qtype}.json"
     if not os.path.exists(path):
         quiz = load_quiz(chapter, qtype)
-        progress = {str(i): 0 for i in range(len(quiz))}
+        progress = {question_key(quiz[i], i): 0 for i in range(len(quiz))}
         os.makedirs("progress", exist_ok=True)
         with open(path, "w", encoding="utf-8") as f:
             json.dump(progress, f, indent=2)
@@ -1,6 +1,14 @@
 import json
 from pathlib import Path
 
+from utils.answer_log import answer_log
+from utils.loader import has_progress, save_progress
+from utils.mastery import mastery_index
+from utils.progress_store import progress_store
+from utils.question_ids import question_key
+from utils.sampler import sampler
+from utils.scheduler import scheduler
+
 # --- 路径定义 ---
 # 获取项目根目录 (utils -> nvshu-app)
 ROOT_DIR = Path(__file__).resolve().parent.parent
@@ -17,16 +25,15 @@ def initialize_all_progress_files():
     如果进度文件不存在，则根据对应的题库文件生成一个全新的进度文件。
     """
     print("开始检查并初始化所有进度文件...")
-    PROGRESS_DIR.mkdir(parents=True, exist_ok=True)
     
     count_created = 0
     for chapter in CHAPTERS:
         for q_type in Q_TYPES:
             quiz_path = DATA_DIR / f"quiz_{chapter}_{q_type}.json"
-            progress_path = PROGRESS_DIR / f"learned_{chapter}_{q_type}.json"
+            progress_name = f"learned_{chapter}_{q_type}"
 
-            # 只有在题库存在而进度文件不存在时才创建
-            if quiz_path.exists() and not progress_path.exists():
+            # 只有在题库存在而进度尚未保存时才创建
+            if quiz_path.exists() and not has_progress(chapter, q_type):
                 try:
                     with open(quiz_path, "r", encoding="utf-8") as f:
                         quiz_data = json.load(f)
@@ -34,21 +41,20 @@ def initialize_all_progress_files():
                     # 创建一个所有题目 streak 均为 0 的进度字典
                     # 确保题库是列表，并且列表中的项是字典
                     if isinstance(quiz_data, list) and all(isinstance(item, dict) for item in quiz_data):
-                        # 使用 item.get('id', i) 作为备用，以防万一 'id' 键不存在
-                        progress_data = {str(item.get('id', i)): 0 for i, item in enumerate(quiz_data)}
+                        # 与 quiz_logic 相同的题目 id（缺少 'id' 时才退回题目位置），题库增删题目不会错位
+                        progress_data = {question_key(item, i): 0 for i, item in enumerate(quiz_data)}
                     else:
                         print(f"  - [警告] {quiz_path.name} 的格式不正确，应为JSON数组。跳过。")
                         continue
                     
-                    with open(progress_path, "w", encoding="utf-8") as f:
-                        json.dump(progress_data, f, indent=2, ensure_ascii=False)
+                    save_progress(chapter, q_type, progress_data)
                     
-                    print(f"  - 已创建进度文件: {progress_path.name}")
+                    print(f"  - 已创建进度文件: {progress_name}")
                     count_created += 1
                 except (json.JSONDecodeError, KeyError) as e:
                     print(f"  - [错误] 处理 {quiz_path.name} 时出错: {e}")
                 except Exception as e:
-                    print(f"  - [未知错误] 创建 {progress_path.name} 时失败: {e}")
+                    print(f"  - [未知错误] 创建 {progress_name} 时失败: {e}")
 
     if count_created == 0:
         print("所有进度文件均已存在，无需创建。")
@@ -67,9 +73,26 @@ def reset_chapter_progress(chapter_key: str):
         return
 
     print(f"正在重置章节 '{chapter_key}' 的学习进度...")
+    # 整个重置过程持有答题日志的锁，其他线程/进程不会在中途写入作答
+    with answer_log.locked():
+        progress_store.sync()
+        # 先丢弃内存中尚未写盘的进度，避免延迟写入覆盖重置结果
+        progress_store.discard(chapter_key)
+        # 先在答题日志中记下重置，回放日志时才不会把重置前的作答重新算进去
+        answer_log.append_reset(chapter_key)
+        _write_zero_progress(chapter_key)
+    sampler.invalidate(chapter_key)
+    scheduler.discard(chapter_key)
+    # 按重置后的进度重新统计本章掌握情况
+    mastery_index.rebuild(chapter_key, Q_TYPES)
+    print(f"章节 '{chapter_key}' 重置完成。")
+
+
+def _write_zero_progress(chapter_key: str):
+    """为本章每个题型写入 streak 全为 0 的进度。"""
     for q_type in Q_TYPES:
         quiz_path = DATA_DIR / f"quiz_{chapter_key}_{q_type}.json"
-        progress_path = PROGRESS_DIR / f"learned_{chapter_key}_{q_type}.json"
+        progress_name = f"learned_{chapter_key}_{q_type}"
 
         if quiz_path.exists():
             try:
@@ -77,20 +100,18 @@ def reset_chapter_progress(chapter_key: str):
                     quiz_data = json.load(f)
 
                 if isinstance(quiz_data, list) and all(isinstance(item, dict) for item in quiz_data):
-                    progress_data = {str(item.get('id', i)): 0 for i, item in enumerate(quiz_data)}
+                    progress_data = {question_key(item, i): 0 for i, item in enumerate(quiz_data)}
                 else:
                      print(f"  - [警告] {quiz_path.name} 的格式不正确，应为JSON数组。跳过。")
                      continue
 
-                with open(progress_path, "w", encoding="utf-8") as f:
-                    json.dump(progress_data, f, indent=2, ensure_ascii=False)
+                save_progress(chapter_key, q_type, progress_data)
                 
-                print(f"  - 已重置进度文件: {progress_path.name}")
+                print(f"  - 已重置进度文件: {progress_name}")
             except Exception as e:
-                print(f"  - [错误] 重置 {progress_path.name} 时失败: {e}")
+                print(f"  - [错误] 重置 {progress_name} 时失败: {e}")
         else:
             print(f"  - [跳过] 未找到题库文件: {quiz_path.name}，无法重置进度。")
-    print(f"章节 '{chapter_key}' 重置完成。")
 
 
 # ====================================================================
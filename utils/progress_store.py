@@ -0,0 +1,250 @@
+import threading
+
+from utils.answer_log import COMPACT_THRESHOLD, RESET, answer_log
+from utils.instrumentation import tracer
+from utils.loader import load_progress, save_progress
+
+# Seconds to wait after the last change before writing dirty chapters to disk.
+FLUSH_DELAY = 2.0
+
+
+class ProgressStore:
+    """
+    In-memory owner of the per-chapter progress dicts (write-behind).
+
+    Reads are served from memory after the first load. Updates touch a single
+    key and mark the (chapter, qtype) pair dirty; dirty pairs are written in a
+    batch by a debounce timer, or explicitly via flush() (screen leave, app
+    pause/stop). Writes go through loader.save_progress with the changed keys,
+    so row-based backends only touch those rows.
+
+    Answers are journaled by utils.answer_log instead: the stored progress is
+    a snapshot that get() brings up to date by replaying the log, and once
+    COMPACT_THRESHOLD answers have piled up a flush writes a new snapshot
+    and compacts the log (see compact()). Compaction only holds the answer
+    log's lock, which update_progress takes on the UI thread, for the steps
+    that touch no file but the (short) log itself.
+    """
+
+    def __init__(self, flush_delay=FLUSH_DELAY):
+        self.flush_delay = flush_delay
+        self._data = {}
+        # (chapter, qtype) -> keys changed since the last flush
+        self._dirty = {}
+        self._lock = threading.RLock()
+        # Serialises disk writes so a reset never races an in-flight flush.
+        self._flush_lock = threading.Lock()
+        # One flush or compaction at a time, so that a learner switch (which
+        # flushes first) never lands between the steps of a compaction.
+        self._compact_lock = threading.Lock()
+        self._timer = None
+        # Extra writers (e.g. the review scheduler) flushed together with progress.
+        self._flush_hooks = []
+        # Told about answers that other processes journaled (see sync()).
+        self._sync_hooks = []
+
+    def add_flush_hook(self, hook):
+        """Registers a callable that is run on every flush, after progress is written."""
+        self._flush_hooks.append(hook)
+
+    def add_sync_hook(self, hook):
+        """
+        Registers hook(changes), run by sync() with [(chapter, qtype, qkey,
+        old, new)] for the loaded banks (qtype None: a chapter was reset), or
+        with None when every bank had to be reloaded.
+        """
+        self._sync_hooks.append(hook)
+
+    def request_flush(self):
+        """(Re)starts the debounce timer without changing any progress."""
+        with self._lock:
+            self._schedule_flush()
+
+    def get(self, chapter: str, qtype: str) -> dict:
+        """Returns the live progress dict for a chapter/type, loading it once."""
+        key = (chapter, qtype)
+        with self._lock:
+            progress = self._data.get(key)
+            if progress is None:
+                progress = load_progress(chapter, qtype)
+                answer_log.replay(chapter, qtype, progress)
+                self._data[key] = progress
+            return progress
+
+    def get_streak(self, chapter: str, qtype: str, qkey: str) -> int:
+        """Returns the streak stored under one question key."""
+        return self.get(chapter, qtype).get(qkey, 0)
+
+    def set_streak(self, chapter: str, qtype: str, qkey: str, value: int, journaled: bool = False):
+        """
+        Sets one streak in O(1) and schedules a deferred flush. A journaled
+        change is already durable in the answer log, so it does not make the
+        snapshot dirty; the flush only runs the hooks (and compaction).
+        """
+        with self._lock:
+            self.get(chapter, qtype)[qkey] = value
+            if not journaled:
+                self._mark_dirty((chapter, qtype), {qkey})
+            self._schedule_flush()
+
+    def _mark_dirty(self, key, keys):
+        # keys=None means the whole bank has to be rewritten
+        changed = self._dirty.get(key, set())
+        if changed is None or keys is None:
+            self._dirty[key] = None
+        else:
+            changed.update(keys)
+            self._dirty[key] = changed
+
+    def sync(self):
+        """
+        Applies the answers other processes journaled since the last sync
+        (call it inside answer_log.locked() before reading a streak). Loaded
+        banks are updated in place; if another process compacted the log,
+        the loaded banks are dropped and reloaded on next use.
+        """
+        records, reloaded = answer_log.sync()
+        if not records and not reloaded:
+            return
+        changes = None
+        with self._lock:
+            if reloaded:
+                for key in [k for k in self._data if k not in self._dirty]:
+                    del self._data[key]
+            else:
+                changes = []
+                for record in records:
+                    if record[2] == RESET:
+                        for key in [k for k in self._data if k[0] == record[3] and k not in self._dirty]:
+                            del self._data[key]
+                        changes.append((record[3], None, None, None, None))
+                        continue
+                    _, _, chapter, qtype, qkey, _, streak = record[:7]
+                    qkey = str(qkey)
+                    progress = self._data.get((chapter, qtype))
+                    if progress is not None:
+                        old = progress.get(qkey, 0)
+                        progress[qkey] = streak
+                        changes.append((chapter, qtype, qkey, old, streak))
+        for hook in self._sync_hooks:
+            hook(changes)
+
+    def flush(self):
+        """Writes every dirty chapter/type to disk now, compacting a long answer log."""
+        self._flush(compact=answer_log.pending() >= COMPACT_THRESHOLD)
+
+    def compact(self):
+        """Writes a progress snapshot of every journaled answer and empties the answer log."""
+        self._flush(compact=True)
+
+    def _flush(self, compact):
+        # lock order: compaction, answer log (compacting, then locked), flush, store
+        with self._compact_lock:
+            with self._flush_lock:
+                failed = self._write_dirty()
+            if compact and not failed:
+                self._compact()
+            with self._flush_lock:
+                self._run_hooks()
+
+    def _compact(self):
+        with answer_log.compacting():
+            with answer_log.locked():
+                # the snapshot must include what other processes journaled
+                self.sync()
+                seq, banks = answer_log.touched()
+            # Answers journaled from here on have a later seq and stay in the
+            # log; replaying them over a snapshot that already has some is exact.
+            for (chapter, qtype), keys in banks.items():
+                # loads and replays banks that were answered but not used since start-up
+                if self.get(chapter, qtype):
+                    with self._lock:
+                        self._mark_dirty((chapter, qtype), keys)
+            with self._flush_lock:
+                if self._write_dirty():
+                    return
+            answer_log.archive(seq)
+            with answer_log.locked():
+                # apply what other processes journaled meanwhile before the log is rewritten
+                self.sync()
+                answer_log.compact(seq)
+
+    def _write_dirty(self):
+        """Saves the dirty banks; returns how many failed (they stay dirty)."""
+        with self._lock:
+            self._cancel_timer()
+            pending = [(key, self._data[key].copy(), changed) for key, changed in self._dirty.items()]
+            self._dirty.clear()
+        tracer.count("progress_store.flushed_keys", sum(len(progress if changed is None else changed)
+                                                        for _, progress, changed in pending))
+        failed = 0
+        for (chapter, qtype), progress, changed in pending:
+            try:
+                save_progress(chapter, qtype, progress, changed)
+            except Exception as e:
+                print(f"[progress_store] 保存 {chapter}_{qtype} 失败: {e}")
+                failed += 1
+                with self._lock:
+                    self._mark_dirty((chapter, qtype), changed)
+        return failed
+
+    def _run_hooks(self):
+        for hook in self._flush_hooks:
+            try:
+                hook()
+            except Exception as e:
+                print(f"[progress_store] flush hook 失败: {e}")
+
+    def discard(self, chapter: str):
+        """
+        Forgets the cached (and any unsaved) progress of a chapter, e.g. right
+        before its files are reset on disk.
+        """
+        with self._flush_lock:
+            with self._lock:
+                for key in [k for k in self._data if k[0] == chapter]:
+                    del self._data[key]
+                    self._dirty.pop(key, None)
+
+    def invalidate(self):
+        """
+        Forgets every cached bank, unsaved changes included (flush() first to
+        keep them); the next get() reads from disk again.
+        """
+        with self._lock:
+            self._cancel_timer()
+            self._data.clear()
+            self._dirty.clear()
+
+    def detach(self):
+        """
+        Hands over the in-memory state (e.g. of the learner being switched
+        away from) and starts empty. flush() first, or unsaved changes travel
+        with the state.
+        """
+        with self._compact_lock, self._lock:
+            self._cancel_timer()
+            state = (self._data, self._dirty)
+            self._data, self._dirty = {}, {}
+            return state
+
+    def attach(self, state):
+        """Restores a state returned by detach()."""
+        with self._lock:
+            self._data, self._dirty = state
+            if self._dirty:
+                self._schedule_flush()
+
+    def _schedule_flush(self):
+        self._cancel_timer()
+        self._timer = threading.Timer(self.flush_delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+progress_store = ProgressStore()
@@ -0,0 +1,163 @@
+import json
+import threading
+
+from utils import loader
+from utils.storage import atomic_write_json
+
+# One map per bank: data/question_ids/<chapter>_<qtype>.json
+INDEX_DIR_NAME = "question_ids"
+INDEX_VERSION = 1
+
+
+def question_key(question, position):
+    """The key a question's progress is stored under: its "id", or its position in a bank without ids."""
+    return str(question.get("id", position))
+
+
+class BankIds:
+    """
+    Position <-> question key map of one bank, O(1) in both directions.
+
+    When the bank was edited while the previous map was in use, `parent` is
+    that map and `moved` is {key: (old position or None, new position or
+    None)} for exactly the questions that were inserted, removed or shifted,
+    so position-keyed caches can patch those entries instead of rebuilding.
+    """
+
+    __slots__ = ("keys", "positions", "identity", "parent", "moved")
+
+    def __init__(self, keys, parent=None):
+        self.keys = keys
+        self.positions = {}
+        for position, key in enumerate(keys):
+            # a duplicated id keeps its first position
+            self.positions.setdefault(key, position)
+        # keys are "0", "1", ...: array-backed progress can be indexed directly
+        self.identity = all(key == str(i) for i, key in enumerate(keys))
+        self.parent = parent
+        self.moved = self.diff(parent) if parent is not None else None
+
+    def key(self, position):
+        return self.keys[position]
+
+    def position(self, key):
+        """The position of a question key, or None if the bank no longer has it."""
+        return self.positions.get(str(key))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def diff(self, old):
+        """{key: (old position, new position)} of every question whose position differs from `old`."""
+        moved = {}
+        new_keys, old_keys = self.keys, old.keys
+        for position in range(max(len(new_keys), len(old_keys))):
+            new = new_keys[position] if position < len(new_keys) else None
+            was = old_keys[position] if position < len(old_keys) else None
+            if new == was:
+                continue
+            if new is not None:
+                moved[new] = (old.positions.get(new), position)
+            if was is not None and was not in self.positions:
+                moved[was] = (position, None)
+        return moved
+
+
+class QuestionIds:
+    """
+    Stable keys for the questions of every bank.
+
+    Progress, the answer log and review schedules are keyed by question id,
+    so inserting or reordering questions in a bank never shifts anyone's
+    progress; code that works with positions (draws, search hits, the
+    learning screen) translates through bank(), which costs one stat per
+    call once the bank's map is in memory.
+
+    The map of each bank is stored under data/question_ids/ together with
+    the bank's signature and content hash, so it is built once per bank
+    version: a changed signature with an unchanged hash only re-stamps the
+    file, and only a changed hash reads the questions again. A map that
+    replaces one in use carries the list of moved questions (see BankIds).
+    """
+
+    def __init__(self):
+        self._banks = {}  # (chapter, qtype) -> (signature, BankIds)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _index_path(chapter, qtype):
+        return loader.DATA_DIR / INDEX_DIR_NAME / f"{chapter}_{qtype}.json"
+
+    def _read(self, chapter, qtype):
+        try:
+            with open(self._index_path(chapter, qtype), "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (ValueError, OSError):
+            return None
+        return saved if saved.get("version") == INDEX_VERSION else None
+
+    def _save(self, chapter, qtype, signature, bank_hash, keys):
+        path = self._index_path(chapter, qtype)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(path, {"version": INDEX_VERSION, "signature": signature, "hash": bank_hash, "keys": keys})
+
+    def bank(self, chapter: str, qtype: str) -> BankIds:
+        """The current map of a bank, rebuilt only if the bank changed."""
+        signature = loader.quiz_cache.signature(chapter, qtype)
+        signature = list(signature) if signature is not None else None
+        with self._lock:
+            entry = self._banks.get((chapter, qtype))
+            if entry is not None and entry[0] == signature:
+                return entry[1]
+            current = entry[1] if entry is not None else None
+            keys = self._load_keys(chapter, qtype, signature)
+            if current is None or current.keys != keys:
+                if current is not None:
+                    # only the previous map is kept for diffing
+                    current.parent = current.moved = None
+                current = BankIds(keys, parent=current)
+            self._banks[(chapter, qtype)] = (signature, current)
+            return current
+
+    def _load_keys(self, chapter, qtype, signature):
+        if signature is None:
+            return []
+        saved = self._read(chapter, qtype)
+        if saved is not None and saved["signature"] == signature:
+            return saved["keys"]
+        bank_hash = loader.quiz_cache.content_hash(chapter, qtype)
+        if saved is not None and saved["hash"] == bank_hash:
+            keys = saved["keys"]
+        else:
+            quiz = loader.load_quiz(chapter, qtype)
+            keys = [question_key(quiz[i], i) for i in range(len(quiz))]
+            if len(set(keys)) != len(keys):
+                print(f"[question_ids] quiz_{chapter}_{qtype} 中有重复的题目 id，重复的题目将共用进度")
+        self._save(chapter, qtype, signature, bank_hash, keys)
+        return keys
+
+    def key(self, chapter: str, qtype: str, position: int) -> str:
+        """The progress key of the question at `position`."""
+        return self.bank(chapter, qtype).key(position)
+
+    def position(self, chapter: str, qtype: str, key):
+        """The current position of a question key, or None if it was removed from the bank."""
+        return self.bank(chapter, qtype).position(key)
+
+    def invalidate(self):
+        """Forgets the maps in memory; the next lookup re-checks the files."""
+        with self._lock:
+            self._banks.clear()
+
+
+question_ids = QuestionIds()
+
+
+if __name__ == '__main__':
+    # python -m utils.question_ids  ->  为所有题库建立题目 id 映射，并列出题目位置与 id 不一致的题库
+    from utils.progress_manager import CHAPTERS, Q_TYPES
+    for chapter in CHAPTERS:
+        for qtype in Q_TYPES:
+            ids = question_ids.bank(chapter, qtype)
+            note = "" if ids.identity else "  (id 与位置不一致)"
+            print(f"{chapter}/{qtype}: {len(ids)} 道题{note}")
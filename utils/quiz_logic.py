@@ -1,98 +1,177 @@
 import random
-from utils.loader import load_quiz, load_progress, load_settings, save_progress
+from utils.answer_log import answer_log
+from utils.instrumentation import traced
+from utils.loader import load_quiz, load_settings
+from utils.mastery import mastery_index
+from utils.progress_array import StreakView
+from utils.progress_store import progress_store
+from utils.question_ids import question_ids
+from utils.sampler import DEFAULT_TYPE_WEIGHTS, LEARNED_THRESHOLD, sampler
+from utils.scheduler import scheduler
 
-def get_question_indices(quiz, progress, mode='unlearned'):
+def get_question_indices(quiz, progress, mode='unlearned', ids=None):
     """
     Gets question indices based on the mode.
     'unlearned': questions answered correctly < 2 times.
     'learned': questions answered correctly >= 2 times.
     'all': all questions.
+    ids: the bank's question keys (utils/question_ids.BankIds); None reads
+    progress by position.
     """
     if mode == 'all':
         return list(range(len(quiz)))
-    
+
+    if ids is not None and not ids.identity:
+        if mode == 'learned':
+            return [i for i, key in enumerate(ids.keys) if progress.get(key, 0) >= 2]
+        return [i for i, key in enumerate(ids.keys) if progress.get(key, 0) < 2]
+
+    if isinstance(progress, StreakView):
+        # Array-backed progress: index the streak bytes directly, no str(i) keys.
+        streaks = progress.streaks
+        known = min(len(quiz), len(streaks))
+        if mode == 'learned':
+            return [i for i in range(known) if streaks[i] >= 2]
+        return [i for i in range(known) if streaks[i] < 2] + list(range(known, len(quiz)))
+
+    # range(len()) rather than enumerate(): a packed bank would decode every question
     if mode == 'learned':
-        return [i for i, _ in enumerate(quiz) if progress.get(str(i), 0) >= 2]
+        return [i for i in range(len(quiz)) if progress.get(str(i), 0) >= 2]
     
     # Default to 'unlearned'
-    return [i for i, _ in enumerate(quiz) if progress.get(str(i), 0) < 2]
+    return [i for i in range(len(quiz)) if progress.get(str(i), 0) < 2]
 
-def draw_questions(chapter: str, mode: str = 'learn_new'):
+@traced("draw_questions")
+def draw_questions(chapter: str, mode: str = 'learn_new', seed=None, weights=None):
     """
     Draws questions for a learning session.
-    mode: 'learn_new' for unlearned questions, 'review_old' for learned questions.
+    mode: 'learn_new' for unlearned questions, 'review_old' for learned questions
+    (the ones the scheduler says are most due, overdue first).
+    seed: optional seed for a reproducible round.
+    weights: optional {qtype: weight} mix; defaults to the "type_weights"
+    setting, or 0.7/0.3 single/multi.
     """
     settings = load_settings()
     total_to_draw = settings.get("questions_per_session", 10)
+    weights = weights or settings.get("type_weights") or DEFAULT_TYPE_WEIGHTS
 
-    quiz_single = load_quiz(chapter, "single")
-    quiz_multi = load_quiz(chapter, "multi")
-
-    prog_single = load_progress(chapter, "single")
-    prog_multi = load_progress(chapter, "multi")
+    banks = {
+        qtype: (chapter, load_quiz(chapter, qtype), progress_store.get(chapter, qtype),
+                question_ids.bank(chapter, qtype))
+        for qtype in ("single", "multi")
+    }
 
     # Determine the pool of questions to draw from based on the mode
     draw_mode = 'unlearned' if mode == 'learn_new' else 'learned'
-    
-    single_indices = get_question_indices(quiz_single, prog_single, draw_mode)
-    multi_indices = get_question_indices(quiz_multi, prog_multi, draw_mode)
+    rng = random.Random(seed) if seed is not None else random
 
-    # If no questions are available in the selected mode, return empty.
-    if not single_indices and not multi_indices:
-        return []
+    pick = None
+    if mode == 'review_old':
+        pick = lambda qtype, count: scheduler.next_due(chapter, qtype, count)
 
-    result = []
-    
-    # Adjust total questions to draw if available are less than the setting
-    total_available = len(single_indices) + len(multi_indices)
-    total_to_draw = min(total_to_draw, total_available)
-
-    while len(result) < total_to_draw:
-        # Determine question type based on weight, fallback if one type is exhausted
-        choice = random.choices(["single", "multi"], weights=[0.7, 0.3])[0]
-        
-        if choice == "single" and single_indices:
-            idx = random.choice(single_indices)
-            result.append(("single", idx, quiz_single[idx]))
-            single_indices.remove(idx)
-        elif choice == "multi" and multi_indices:
-            idx = random.choice(multi_indices)
-            result.append(("multi", idx, quiz_multi[idx]))
-            multi_indices.remove(idx)
-        elif single_indices: # Fallback to single if multi is chosen but unavailable
-            idx = random.choice(single_indices)
-            result.append(("single", idx, quiz_single[idx]))
-            single_indices.remove(idx)
-        elif multi_indices: # Fallback to multi if single is chosen but unavailable
-            idx = random.choice(multi_indices)
-            result.append(("multi", idx, quiz_multi[idx]))
-            multi_indices.remove(idx)
+    # If no questions are available in the selected mode, this is empty.
+    return sampler.draw(banks, total_to_draw, draw_mode, weights, rng, pick)
+
+def pick_options(qtype: str, question: dict, rng=random, extra=()):
+    """
+    Picks and shuffles the options shown for one question.
+    'single': one correct answer among up to three wrong options.
+    'multi': 2-3 correct answers, padded with wrong options to five options.
+    extra: cross-question distractors (utils/distractors.py) that are drawn
+    from together with the question's own wrong options.
+    Returns (options, correct_answers).
+    """
+    wrong_pool = question["wrong_options"] + list(extra)
+    if qtype == "single":
+        correct = rng.choice(question["correct_answers"])
+        correct_answers = [correct]
+        wrongs = rng.sample(wrong_pool, min(3, len(wrong_pool)))
+        options = wrongs + [correct]
+    else:
+        corrects = question["correct_answers"]
+        num_corrects = rng.randint(2, min(3, len(corrects)))
+        correct_answers = rng.sample(corrects, num_corrects)
+        num_wrongs = max(1, 5 - len(correct_answers))
+        wrongs = rng.sample(wrong_pool, min(len(wrong_pool), num_wrongs))
+        options = correct_answers + wrongs
+    rng.shuffle(options)
+    return options, correct_answers
+
+def is_correct_answer(qtype: str, chosen, correct_answers) -> bool:
+    """A single-choice answer is one option; a multi-choice answer must match the correct set exactly."""
+    if qtype == 'multi':
+        return set(chosen) == set(correct_answers)
+    return chosen in correct_answers
+
+def practice_round(chapter: str, items, limit=None):
+    """
+    Builds a round from chosen (qtype, position) questions of one chapter,
+    e.g. search hits or the most missed questions.
+    Returns (mode, questions): the unlearned ones as a 'learn_new' round, or,
+    if all of them are learned, the learned ones as a 'review_old' round.
+    """
+    unlearned, learned = [], []
+    for qtype, position in items:
+        bank = load_quiz(chapter, qtype)
+        if position >= len(bank):
+            continue  # the bank shrank since the position was recorded
+        question = (qtype, position, bank[position])
+        if progress_store.get_streak(chapter, qtype, question_ids.key(chapter, qtype, position)) >= LEARNED_THRESHOLD:
+            learned.append(question)
         else:
-            break # No more questions to draw
-            
-    return result
+            unlearned.append(question)
+    mode, questions = ('learn_new', unlearned) if unlearned else ('review_old', learned)
+    return mode, questions[:limit]
 
-def update_progress(chapter: str, qtype: str, index: int, correct: bool, mode: str = 'learn_new'):
+@traced("update_progress")
+def update_progress(chapter: str, qtype: str, index: int, correct: bool, mode: str = 'learn_new',
+                    chosen=None, response_ms=None):
     """
-    Updates the progress for a single question.
-    In 'review_old' mode, progress is not updated.
+    Updates the progress for the question at position `index` (stored under
+    its stable key, see utils/question_ids.py).
+    In 'review_old' mode, progress is not updated; the answer only moves the
+    question between the scheduler's review boxes.
     Returns the new consecutive correct count for that question.
+    Every answer is appended to the answer log (with the chosen options and
+    the response time, when given); progress_store applies it in memory and
+    snapshots it to disk later. The streak is read and written under the
+    answer log's lock, so concurrent threads and processes never lose an
+    update.
     """
-    if mode == 'review_old':
-        key = str(index)
-        progress = load_progress(chapter, qtype)
-        return progress.get(key, 0)
+    key = question_ids.key(chapter, qtype, index)
+    with answer_log.locked():
+        progress_store.sync()
+        old_streak = progress_store.get_streak(chapter, qtype, key)
+        if mode == 'review_old':
+            answer_log.append(chapter, qtype, key, correct, old_streak, chosen, response_ms, mode)
+            scheduler.record_review(chapter, qtype, key, correct)
+            return old_streak
 
-    progress = load_progress(chapter, qtype)
-    key = str(index)
-    
-    if correct:
-        current_streak = progress.get(key, 0)
-        new_streak = current_streak + 1
-        progress[key] = new_streak
-    else:
-        progress[key] = 0
-        new_streak = 0
-        
-    save_progress(chapter, qtype, progress)
+        new_streak = old_streak + 1 if correct else 0
+        answer_log.append(chapter, qtype, key, correct, new_streak, chosen, response_ms, mode)
+        progress_store.set_streak(chapter, qtype, key, new_streak, journaled=True)
+        _on_streak_change(chapter, qtype, index, key, old_streak, new_streak)
     return new_streak
+
+def _on_streak_change(chapter, qtype, index, key, old_streak, new_streak):
+    if index is not None:
+        sampler.on_streak_change(chapter, qtype, index, new_streak)
+    scheduler.on_streak_change(chapter, qtype, key, new_streak)
+    mastery_index.on_streak_change(chapter, qtype, old_streak, new_streak)
+
+def _on_sync(changes):
+    """Keeps draw pools, schedules and mastery counts in step with answers from other processes."""
+    if changes is None:
+        sampler.invalidate()
+        mastery_index.invalidate()
+        return
+    for chapter, qtype, key, old_streak, new_streak in changes:
+        if qtype is None:
+            # a reset in another process: rebuilt from the files on next use
+            sampler.invalidate(chapter)
+            mastery_index.invalidate()
+        else:
+            index = question_ids.position(chapter, qtype, key)
+            _on_streak_change(chapter, qtype, index, key, old_streak, new_streak)
+
+progress_store.add_sync_hook(_on_sync)
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+from collections.abc import Sequence
+from pathlib import Path
+
+# Compiled quiz pack (build with `python -m utils.quiz_pack`):
+#
+#   header     magic(4s) version(H) bank_count(H)
+#   directory  bank_count x [chapter(16s) qtype(8s) count(I) table_offset(Q)
+#                            src_mtime_ns(q) src_size(Q) src_sha1(20s)]
+#   tables     per bank, count x [core_offset(I) core_len(I) expl_offset(I) expl_len(I)]
+#   records    UTF-8 JSON of each question without its explanation ("core"),
+#              and the explanation text on its own
+#
+# src_mtime_ns/src_size/src_sha1 describe the quiz_*.json file a bank was
+# compiled from, so the loader can tell when the pack is stale and fall back
+# to JSON. The hash keeps the pack valid for a copy of the same file that got
+# a new mtime (an install or checkout that does not preserve timestamps).
+MAGIC = b"NVQP"
+VERSION = 2
+HEADER = struct.Struct("<4sHH")
+BANK_ENTRY = struct.Struct("<16s8sIQqQ20s")
+RECORD = struct.Struct("<IIII")
+PACK_NAME = "quiz_pack.bin"
+
+
+class PackedBank(Sequence):
+    """
+    A read-only, list-like quiz bank backed by the pack's mmap. len() reads
+    the header only; a question is decoded the first time it is indexed.
+    """
+
+    def __init__(self, pack, chapter, qtype, count, table_offset):
+        self.pack = pack
+        self.chapter = chapter
+        self.qtype = qtype
+        self._count = count
+        self._table_offset = table_offset
+        self._decoded = {}
+
+    def __len__(self):
+        return self._count
+
+    def _record(self, index):
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return RECORD.unpack_from(self.pack.mm, self._table_offset + index * RECORD.size)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        question = self._decoded.get(index)
+        if question is None:
+            core_off, core_len, expl_off, expl_len = self._record(index)
+            mm = self.pack.mm
+            question = json.loads(mm[core_off:core_off + core_len].decode("utf-8"))
+            if expl_len:
+                question["explanation"] = mm[expl_off:expl_off + expl_len].decode("utf-8")
+            self._decoded[index] = question
+        return question
+
+    def explanation(self, index):
+        """Decodes only the explanation of one question."""
+        _, _, expl_off, expl_len = self._record(index)
+        return self.pack.mm[expl_off:expl_off + expl_len].decode("utf-8")
+
+    def core(self, index):
+        """Decodes one question without its (long) explanation."""
+        core_off, core_len, _, _ = self._record(index)
+        return json.loads(self.pack.mm[core_off:core_off + core_len].decode("utf-8"))
+
+
+class QuizPack:
+    """Read side of a compiled pack: parses the directory once, decodes records on demand."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, bank_count = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{self.path.name} is not a version {VERSION} quiz pack")
+        self.banks = {}
+        offset = HEADER.size
+        for _ in range(bank_count):
+            chapter, qtype, count, table_offset, mtime_ns, size, sha1 = BANK_ENTRY.unpack_from(self.mm, offset)
+            key = (chapter.rstrip(b"\0").decode("utf-8"), qtype.rstrip(b"\0").decode("utf-8"))
+            self.banks[key] = (count, table_offset, (mtime_ns, size), sha1)
+            offset += BANK_ENTRY.size
+        self._views = {}
+
+    def source_signature(self, chapter, qtype):
+        """(mtime_ns, size) of the JSON file the bank was compiled from, or None."""
+        entry = self.banks.get((chapter, qtype))
+        return entry[2] if entry else None
+
+    def source_hash(self, chapter, qtype):
+        """sha1 digest of the JSON file the bank was compiled from, or None."""
+        entry = self.banks.get((chapter, qtype))
+        return entry[3] if entry else None
+
+    def count(self, chapter, qtype):
+        entry = self.banks.get((chapter, qtype))
+        return entry[0] if entry else 0
+
+    def bank(self, chapter, qtype):
+        """Returns the PackedBank for a chapter/type (one shared view per bank)."""
+        key = (chapter, qtype)
+        view = self._views.get(key)
+        if view is None:
+            count, table_offset, _, _ = self.banks[key]
+            view = PackedBank(self, chapter, qtype, count, table_offset)
+            self._views[key] = view
+        return view
+
+    def close(self):
+        self.mm.close()
+        self._file.close()
+
+
+def build_pack(data_dir: Path, out_path: Path = None) -> Path:
+    """Compiles every data_dir/quiz_<chapter>_<qtype>.json into one pack file."""
+    data_dir = Path(data_dir)
+    out_path = Path(out_path) if out_path else data_dir / PACK_NAME
+
+    banks = []
+    for path in sorted(data_dir.glob("quiz_*_*.json")):
+        chapter, qtype = path.stem[len("quiz_"):].rsplit("_", 1)
+        raw = path.read_bytes()
+        questions = json.loads(raw.decode("utf-8"))
+        st = path.stat()
+        banks.append((chapter, qtype, questions, (st.st_mtime_ns, st.st_size, hashlib.sha1(raw).digest())))
+
+    table_start = HEADER.size + BANK_ENTRY.size * len(banks)
+    data_start = table_start + sum(RECORD.size * len(b[2]) for b in banks)
+
+    directory, tables, blob = [], [], bytearray()
+    table_offset = table_start
+    for chapter, qtype, questions, (mtime_ns, size, sha1) in banks:
+        if len(chapter.encode("utf-8")) > 16 or len(qtype.encode("utf-8")) > 8:
+            raise ValueError(f"bank name too long for the pack directory: {chapter}_{qtype}")
+        directory.append(BANK_ENTRY.pack(
+            chapter.encode("utf-8"), qtype.encode("utf-8"), len(questions), table_offset, mtime_ns, size, sha1))
+        for question in questions:
+            core = dict(question)
+            explanation = core.pop("explanation", "").encode("utf-8")
+            core_bytes = json.dumps(core, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            core_off = data_start + len(blob)
+            blob += core_bytes
+            expl_off = data_start + len(blob)
+            blob += explanation
+            tables.append(RECORD.pack(core_off, len(core_bytes), expl_off, len(explanation)))
+        table_offset += RECORD.size * len(questions)
+
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(banks)))
+        f.writelines(directory)
+        f.writelines(tables)
+        f.write(blob)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+# ====================================================================
+# python -m utils.quiz_pack  ->  把 data/quiz_*.json 编译成 data/quiz_pack.bin
+# ====================================================================
+if __name__ == '__main__':
+    from utils.loader import DATA_DIR
+    out = build_pack(DATA_DIR)
+    pack = QuizPack(out)
+    for (chapter, qtype), (count, _, _, _) in sorted(pack.banks.items()):
+        print(f"  - {chapter}_{qtype}: {count} 题")
+    print(f"已生成 {out.name} ({out.stat().st_size} 字节)")
+    pack.close()
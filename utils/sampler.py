@@ -0,0 +1,243 @@
+import random
+import threading
+
+# A question counts as learned once its consecutive-correct streak reaches this.
+LEARNED_THRESHOLD = 2
+DEFAULT_TYPE_WEIGHTS = {"single": 0.7, "multi": 0.3}
+
+
+class IndexPool:
+    """
+    A set of question indices with O(1) add/discard and O(k) random sampling
+    without replacement (partial Fisher-Yates over the backing list, with the
+    swaps undone afterwards so a seeded draw does not depend on earlier draws).
+    """
+
+    __slots__ = ("_items", "_pos")
+
+    def __init__(self, items=()):
+        self._items = list(items)
+        self._pos = {v: i for i, v in enumerate(self._items)}
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, value):
+        return value in self._pos
+
+    def add(self, value):
+        if value not in self._pos:
+            self._pos[value] = len(self._items)
+            self._items.append(value)
+
+    def discard(self, value):
+        i = self._pos.pop(value, None)
+        if i is None:
+            return
+        last = self._items.pop()
+        if i < len(self._items):
+            self._items[i] = last
+            self._pos[last] = i
+
+    def sample(self, rng, k):
+        """Returns k distinct random members (fewer if the pool is smaller)."""
+        items = self._items
+        n = len(items)
+        k = min(k, n)
+        swaps = []
+        for j in range(k):
+            r = rng.randrange(j, n)
+            items[j], items[r] = items[r], items[j]
+            swaps.append(r)
+        picked = items[:k]
+        # Restore the original order; positions in _pos stay valid.
+        for j in range(k - 1, -1, -1):
+            r = swaps[j]
+            items[j], items[r] = items[r], items[j]
+        return picked
+
+
+class EligibleIndex:
+    """
+    Learned/unlearned index pools for one bank, built once from its progress
+    and then kept current through on_streak_change instead of rescanning.
+    Progress is read through the bank's question keys (utils/question_ids.py;
+    None means the keys are the positions); after an edit to the bank only
+    the moved questions are re-filed (remap).
+    """
+
+    def __init__(self, quiz, progress, ids=None):
+        self.quiz = quiz
+        self.progress = progress
+        self.ids = ids
+        self.learned = IndexPool()
+        self.unlearned = IndexPool()
+        keys = ids.keys if ids is not None else map(str, range(len(quiz)))
+        for i, key in enumerate(keys):
+            if progress.get(key, 0) >= LEARNED_THRESHOLD:
+                self.learned.add(i)
+            else:
+                self.unlearned.add(i)
+
+    def pool(self, draw_mode):
+        return self.learned if draw_mode == 'learned' else self.unlearned
+
+    def on_streak_change(self, index, new_streak):
+        if index >= len(self.quiz):
+            return
+        if new_streak >= LEARNED_THRESHOLD:
+            self.unlearned.discard(index)
+            self.learned.add(index)
+        else:
+            self.learned.discard(index)
+            self.unlearned.add(index)
+
+    def remap(self, quiz, ids):
+        """Follows an edited bank by re-filing only the questions in ids.moved."""
+        self.quiz, self.ids = quiz, ids
+        for old, _ in ids.moved.values():
+            if old is not None:
+                self.learned.discard(old)
+                self.unlearned.discard(old)
+        for key, (_, new) in ids.moved.items():
+            if new is not None:
+                self.on_streak_change(new, self.progress.get(key, 0))
+
+
+class QuestionSampler:
+    """
+    Draws a round of questions from a chapter's single/multi banks.
+
+    Each slot picks a question type by weight, falling back to the other type
+    once one is exhausted (the same mix as the original loop). The per-type
+    counts are then filled with O(k) samples from cached eligible pools.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def eligible(self, chapter, qtype, quiz, progress, ids=None):
+        """Returns the cached pools for a bank, rebuilding them if the bank or progress object changed."""
+        with self._lock:
+            return self._eligible_locked(chapter, qtype, quiz, progress, ids)
+
+    def on_streak_change(self, chapter, qtype, index, new_streak):
+        """Moves one question between pools after its progress changed."""
+        with self._lock:
+            eligible = self._indexes.get((chapter, qtype))
+            if eligible is not None:
+                eligible.on_streak_change(index, new_streak)
+
+    def invalidate(self, chapter=None):
+        """Drops cached pools (for one chapter, or all) so they are rebuilt on next draw."""
+        with self._lock:
+            if chapter is None:
+                self._indexes.clear()
+            else:
+                for key in [k for k in self._indexes if k[0] == chapter]:
+                    del self._indexes[key]
+
+    def detach(self):
+        """Hands over the cached pools (see ProgressStore.detach) and starts empty."""
+        with self._lock:
+            state, self._indexes = self._indexes, {}
+            return state
+
+    def attach(self, state):
+        """Restores pools returned by detach()."""
+        with self._lock:
+            self._indexes = state
+
+    def draw(self, banks, total, draw_mode='unlearned', weights=None, rng=None, pick=None):
+        """
+        banks: {qtype: (chapter, quiz, progress, ids)}, ids being the bank's
+        question keys (utils/question_ids.BankIds) or None for plain positions.
+        pick: optional pick(qtype, count) -> indices that replaces the random
+        sample once the per-type counts are known (used by the scheduler).
+        Returns [(qtype, index, question), ...] in draw order.
+        """
+        rng = rng or random
+        weights = weights or DEFAULT_TYPE_WEIGHTS
+        with self._lock:
+            pools = {}
+            for qtype, (chapter, quiz, progress, ids) in banks.items():
+                pools[qtype] = (quiz, self._eligible_locked(chapter, qtype, quiz, progress, ids).pool(draw_mode))
+
+            qtypes = [t for t in pools if weights.get(t, 0) > 0 and len(pools[t][1])]
+            # types with zero weight are only used as a fallback
+            fallback = [t for t in pools if t not in qtypes and len(pools[t][1])]
+            remaining = {t: len(pools[t][1]) for t in pools}
+            total = min(total, sum(remaining.values()))
+
+            # Decide the type of every slot first; this is O(k).
+            slots = []
+            for _ in range(total):
+                live = [t for t in qtypes if remaining[t]]
+                if live:
+                    w_sum = sum(weights[t] for t in live)
+                    r = rng.random() * w_sum
+                    for t in live:
+                        r -= weights[t]
+                        if r < 0:
+                            break
+                else:
+                    t = next(t for t in fallback if remaining[t])
+                slots.append(t)
+                remaining[t] -= 1
+
+            if pick is None:
+                drawn = {t: iter(pools[t][1].sample(rng, slots.count(t))) for t in pools}
+
+        if pick is not None:
+            drawn = {t: iter(pick(t, slots.count(t))) for t in pools}
+
+        result = []
+        for t in slots:
+            idx = next(drawn[t], None)
+            if idx is not None:
+                result.append((t, idx, pools[t][0][idx]))
+        return result
+
+    def _eligible_locked(self, chapter, qtype, quiz, progress, ids=None):
+        index = self._indexes.get((chapter, qtype))
+        if index is not None and index.progress is progress and index.quiz is not quiz and ids is not None:
+            if ids is index.ids:
+                index.quiz = quiz  # re-read, but no question moved
+            elif index.ids is not None and ids.parent is index.ids:
+                index.remap(quiz, ids)
+        if index is None or index.quiz is not quiz or index.progress is not progress:
+            index = EligibleIndex(quiz, progress, ids)
+            self._indexes[(chapter, qtype)] = index
+        return index
+
+
+sampler = QuestionSampler()
+
+
+# ====================================================================
+# python -m utils.sampler  ->  在 10^3 ~ 10^6 规模的合成题库上测量抽题耗时
+# ====================================================================
+if __name__ == '__main__':
+    import time
+
+    print(f"{'size':>9} {'build(ms)':>10} {'draw k=10(us)':>14} {'draw k=50(us)':>14}")
+    for size in (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6):
+        quiz = [{"id": i} for i in range(size)]
+        progress = {str(i): (2 if i % 3 == 0 else 0) for i in range(size)}
+        bench = QuestionSampler()
+        banks = {"single": ("bench", quiz, progress, None), "multi": ("bench", quiz[: size // 3], progress, None)}
+
+        t0 = time.perf_counter()
+        bench.draw(banks, 1)
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        timings = []
+        for k in (10, 50):
+            rng = random.Random(k)
+            rounds = 200
+            t0 = time.perf_counter()
+            for _ in range(rounds):
+                bench.draw(banks, k, rng=rng)
+            timings.append((time.perf_counter() - t0) / rounds * 1e6)
+        print(f"{size:>9} {build_ms:>10.1f} {timings[0]:>14.1f} {timings[1]:>14.1f}")
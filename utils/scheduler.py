@@ -0,0 +1,176 @@
+import heapq
+import threading
+import time
+
+from utils.loader import load_schedule, save_schedule
+from utils.progress_store import progress_store
+from utils.question_ids import question_ids
+from utils.sampler import LEARNED_THRESHOLD
+
+DAY = 24 * 60 * 60
+# Leitner boxes: a learned question starts in box 1; every correct review
+# moves it up one box, a wrong review sends it back to box 1.
+BOX_INTERVALS = (0, 1 * DAY, 2 * DAY, 4 * DAY, 8 * DAY, 16 * DAY, 32 * DAY)
+MAX_BOX = len(BOX_INTERVALS) - 1
+
+
+class BankSchedule:
+    """
+    Review state of one bank: {qkey: [box, due]} plus a min-heap of
+    (due, qkey). Heap entries are invalidated lazily: an entry whose due time
+    no longer matches the dict is skipped when popped.
+    """
+
+    def __init__(self, entries=None):
+        self.entries = entries or {}
+        self._rebuild_heap()
+
+    def _rebuild_heap(self):
+        self.heap = [(due, qkey) for qkey, (_, due) in self.entries.items()]
+        heapq.heapify(self.heap)
+
+    def set(self, qkey, box, due):
+        self.entries[qkey] = [box, due]
+        heapq.heappush(self.heap, (due, qkey))
+        if len(self.heap) > 2 * len(self.entries) + 16:
+            self._rebuild_heap()
+
+    def remove(self, qkey):
+        # the heap entry goes stale and is dropped when popped
+        self.entries.pop(qkey, None)
+
+    def next_due(self, k, position=None):
+        """
+        Returns up to k keys with the earliest due times, in O(k log n);
+        position(qkey) translates them to bank positions (None: the question
+        was removed from the bank and is skipped).
+        """
+        picked, result, seen = [], [], set()
+        while self.heap and len(result) < k:
+            due, qkey = heapq.heappop(self.heap)
+            entry = self.entries.get(qkey)
+            if entry is None or entry[1] != due or qkey in seen:
+                continue
+            picked.append((due, qkey))
+            seen.add(qkey)
+            item = qkey if position is None else position(qkey)
+            if item is not None:
+                result.append(item)
+        # nothing was answered yet, so the popped items go back in
+        for item in picked:
+            heapq.heappush(self.heap, item)
+        return result
+
+
+class Scheduler:
+    """
+    Spaced-repetition scheduler driving 'review_old' rounds.
+
+    A bank without a saved schedule is migrated from its streak progress on
+    first use: every question with streak >= LEARNED_THRESHOLD is put in a
+    box (longer streaks start higher) and is due immediately. Afterwards the
+    schedule is kept in step with progress: questions enter box 1 when they
+    become learned in 'learn_new' and leave when their streak drops.
+    Schedules are written together with progress by progress_store.flush().
+    """
+
+    def __init__(self):
+        self._banks = {}
+        self._dirty = set()
+        self._lock = threading.RLock()
+        progress_store.add_flush_hook(self.flush)
+
+    def bank(self, chapter, qtype, now=None):
+        """Returns the schedule of a bank, loading or migrating it once."""
+        key = (chapter, qtype)
+        with self._lock:
+            schedule = self._banks.get(key)
+            if schedule is None:
+                schedule = self._load(chapter, qtype, time.time() if now is None else now)
+                self._banks[key] = schedule
+            return schedule
+
+    def _load(self, chapter, qtype, now):
+        saved = load_schedule(chapter, qtype) or {}
+        progress = progress_store.get(chapter, qtype)
+        entries = {}
+        for qkey, streak in progress.items():
+            if streak < LEARNED_THRESHOLD:
+                continue
+            if qkey in saved:
+                entries[qkey] = saved[qkey]
+            else:
+                entries[qkey] = [min(MAX_BOX, streak - LEARNED_THRESHOLD + 1), now]
+        if entries != saved:
+            self._dirty.add((chapter, qtype))
+        return BankSchedule(entries)
+
+    def next_due(self, chapter, qtype, k, now=None):
+        """The positions of the k learned questions most in need of review (overdue first)."""
+        ids = question_ids.bank(chapter, qtype)
+        with self._lock:
+            return self.bank(chapter, qtype, now).next_due(k, ids.position)
+
+    def on_streak_change(self, chapter, qtype, qkey, new_streak, now=None):
+        """Keeps the schedule in step with a 'learn_new' progress update of question `qkey`."""
+        now = time.time() if now is None else now
+        with self._lock:
+            schedule = self.bank(chapter, qtype, now)
+            if new_streak >= LEARNED_THRESHOLD and qkey not in schedule.entries:
+                schedule.set(qkey, 1, now + BOX_INTERVALS[1])
+            elif new_streak < LEARNED_THRESHOLD and qkey in schedule.entries:
+                schedule.remove(qkey)
+            else:
+                return
+            self._dirty.add((chapter, qtype))
+        progress_store.request_flush()
+
+    def record_review(self, chapter, qtype, qkey, correct, now=None):
+        """Moves a reviewed question (by key) between boxes and returns its new box."""
+        now = time.time() if now is None else now
+        with self._lock:
+            schedule = self.bank(chapter, qtype, now)
+            box, _ = schedule.entries.get(qkey, (1, now))
+            box = min(MAX_BOX, box + 1) if correct else 1
+            schedule.set(qkey, box, now + BOX_INTERVALS[box])
+            self._dirty.add((chapter, qtype))
+        progress_store.request_flush()
+        return box
+
+    def discard(self, chapter):
+        """Forgets a chapter's schedules, e.g. when its progress is reset."""
+        with self._lock:
+            for key in [k for k in self._banks if k[0] == chapter]:
+                del self._banks[key]
+                self._dirty.discard(key)
+            for qtype in ("single", "multi"):
+                save_schedule(chapter, qtype, {})
+
+    def invalidate(self):
+        """Forgets every loaded schedule, unsaved changes included; the next lookup reads from disk."""
+        with self._lock:
+            self._banks.clear()
+            self._dirty.clear()
+
+    def detach(self):
+        """Hands over the loaded schedules (see ProgressStore.detach) and starts empty."""
+        with self._lock:
+            state = (self._banks, self._dirty)
+            self._banks, self._dirty = {}, set()
+            return state
+
+    def attach(self, state):
+        """Restores schedules returned by detach()."""
+        with self._lock:
+            self._banks, self._dirty = state
+
+    def flush(self):
+        """Writes every changed schedule to disk."""
+        with self._lock:
+            pending = [(key, dict(self._banks[key].entries)) for key in self._dirty if key in self._banks]
+            self._dirty.clear()
+        for (chapter, qtype), entries in pending:
+            save_schedule(chapter, qtype, entries)
+
+
+scheduler = Scheduler()
@@ -0,0 +1,362 @@
+import json
+import math
+import operator
+import os
+import re
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from itertools import repeat
+
+from utils import loader
+from utils.progress_array import temp_path
+
+# One postings file per bank: data/search_index/<chapter>_<qtype>.idx
+#
+#   header     magic(4s) version(H) reserved(H) docs(I) token_count(I)
+#              posting_count(I) meta_len(I)
+#   meta       UTF-8 JSON {"signature", "hash", "tokens"} (tokens sorted)
+#   offsets    (token_count + 1) x uint32: first posting of each token
+#   positions  posting_count x uint32, ascending within each token
+#   weights    posting_count x uint16, weighted term frequency of each posting
+#
+# All little-endian. Version 1 stored the postings as JSON dicts and is
+# removed when found.
+INDEX_DIR_NAME = "search_index"
+INDEX_VERSION = 2
+MAGIC = b"NVSI"
+HEADER = struct.Struct("<4sHHIIII")
+MAX_WEIGHT = 0xFFFF
+# Dense rows of recently queried tokens (see BankPostings.dense) kept per bank.
+MAX_DENSE = 32
+# A hit in the question counts more than one in an option or the explanation.
+FIELD_WEIGHTS = {"question": 3, "correct_answers": 2, "wrong_options": 1, "explanation": 1}
+
+# Runs of CJK ideographs (incl. extension A), Nvshu, or ASCII letters/digits.
+_RUN = re.compile(r"([㐀-䶿一-鿿\U0001B170-\U0001B2FF]+)|([0-9a-z]+)")
+_MASKED = re.compile(b"\x01")
+
+
+def _runs(text):
+    for match in _RUN.finditer(text.lower()):
+        yield match.group(1), match.group(2)
+
+
+def index_tokens(text):
+    """Every CJK character and character bigram, plus whole ASCII words."""
+    tokens = []
+    for cjk, word in _runs(text):
+        if cjk:
+            tokens.extend(cjk)
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def query_tokens(text):
+    """Bigrams of each CJK run (a lone character stays a unigram), plus ASCII words."""
+    tokens = []
+    for cjk, word in _runs(text):
+        if cjk:
+            if len(cjk) == 1:
+                tokens.append(cjk)
+            else:
+                tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            tokens.append(word)
+    return list(dict.fromkeys(tokens))
+
+
+def _field_texts(question):
+    for field, weight in FIELD_WEIGHTS.items():
+        value = question.get(field)
+        if isinstance(value, str):
+            yield value, weight
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, str):
+                    yield item, weight
+
+
+def build_postings(bank):
+    """{token: {question position: weighted term frequency}} for one bank."""
+    postings = {}
+    for position in range(len(bank)):
+        question = bank[position]
+        for text, weight in _field_texts(question):
+            for token in index_tokens(text):
+                docs = postings.setdefault(token, {})
+                docs[position] = docs.get(position, 0) + weight
+    return postings
+
+
+def _little_endian(values):
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+class BankPostings:
+    """
+    The postings of one bank as three flat arrays: a token's positions and
+    weights are the slice offsets[i]:offsets[i + 1], so a bank costs six
+    bytes per posting plus its token table, however many tokens it has.
+    """
+
+    __slots__ = ("docs", "signature", "hash", "tokens", "offsets", "positions", "weights", "_dense")
+
+    def __init__(self, docs, signature, bank_hash, tokens, offsets, positions, weights):
+        self.docs = docs
+        self.signature = signature
+        self.hash = bank_hash
+        self.tokens = tokens  # token -> index into offsets
+        self.offsets = offsets
+        self.positions = positions
+        self.weights = weights
+        self._dense = {}
+
+    @classmethod
+    def build(cls, bank, signature, bank_hash):
+        postings = build_postings(bank)
+        tokens = sorted(postings)
+        offsets, positions, weights = array("I", [0]), array("I"), array("H")
+        for token in tokens:
+            for position, weight in sorted(postings[token].items()):
+                positions.append(position)
+                weights.append(min(weight, MAX_WEIGHT))
+            offsets.append(len(positions))
+        return cls(len(bank), signature, bank_hash, {t: i for i, t in enumerate(tokens)},
+                   offsets, positions, weights)
+
+    @classmethod
+    def read(cls, path):
+        """Loads a bank file; None if it is missing, truncated or of another version."""
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            magic, version, _, docs, token_count, count, meta_len = HEADER.unpack_from(data, 0)
+            if magic != MAGIC or version != INDEX_VERSION:
+                return None
+            offset = HEADER.size
+            meta = json.loads(data[offset:offset + meta_len].decode("utf-8"))
+            offset += meta_len
+            arrays = []
+            for typecode, length in (("I", token_count + 1), ("I", count), ("H", count)):
+                values = array(typecode)
+                values.frombytes(data[offset:offset + length * values.itemsize])
+                offset += length * values.itemsize
+                arrays.append(_little_endian(values))
+        except (OSError, ValueError, struct.error):
+            return None
+        if len(arrays[2]) != count:
+            return None
+        tokens = {t: i for i, t in enumerate(meta["tokens"])}
+        return cls(docs, meta["signature"], meta["hash"], tokens, *arrays)
+
+    def write(self, path):
+        meta = json.dumps({"signature": self.signature, "hash": self.hash, "tokens": list(self.tokens)},
+                          ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = temp_path(path)
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, INDEX_VERSION, 0, self.docs, len(self.tokens), len(self.positions),
+                                len(meta)))
+            f.write(meta)
+            for values in (self.offsets, self.positions, self.weights):
+                f.write(_little_endian(values).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def count(self, token):
+        """Number of questions containing `token`."""
+        i = self.tokens.get(token)
+        return 0 if i is None else self.offsets[i + 1] - self.offsets[i]
+
+    def get(self, token):
+        """(ascending positions, weights) of the questions containing `token`, or None."""
+        i = self.tokens.get(token)
+        if i is None:
+            return None
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.positions[start:end], self.weights[start:end]
+
+    def dense(self, token, postings):
+        """
+        (mask, row) of a token for multi-token queries: the questions that
+        contain it as an int with one byte per question (1 if present), so
+        candidates intersect with `&`, and its weight of every question by
+        position. Kept for the most recently queried tokens, which typing a
+        query reuses.
+        """
+        entry = self._dense.get(token)
+        if entry is None:
+            marks = bytearray(self.docs)
+            row = array("H", bytes(2 * self.docs))
+            for position, weight in zip(*postings):
+                marks[position] = 1
+                row[position] = weight
+            entry = (int.from_bytes(marks, "little"), row)
+            if len(self._dense) >= MAX_DENSE:
+                self._dense.clear()
+            self._dense[token] = entry
+        return entry
+
+
+class SearchIndex:
+    """
+    Inverted index over every question bank, tokenized into CJK bigrams so
+    that multi-character terms like "结交老同" match without a word segmenter.
+
+    The postings of each bank are stored under data/search_index/ together
+    with the bank's content hash, as flat arrays (see BankPostings) that
+    load with one read and a few memcpys. refresh() (run before the first
+    search, on the I/O worker by the search screen) stats every bank and
+    only re-hashes a bank whose file changed and only re-tokenizes one whose
+    hash changed, so edits to one bank cost one bank.
+
+    A query matches a question only if the question contains every query
+    token; hits are ranked by sum(weight * idf) over the query tokens.
+    """
+
+    def __init__(self):
+        self._banks = {}  # (chapter, qtype) -> BankPostings
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _bank_keys(self):
+        keys = set()
+        for path in loader.DATA_DIR.glob("quiz_*_*.json"):
+            chapter, qtype = path.stem[len("quiz_"):].rsplit("_", 1)
+            keys.add((chapter, qtype))
+        keys.update(loader.quiz_cache.packed_banks())
+        return sorted(keys)
+
+    @staticmethod
+    def _index_path(chapter, qtype):
+        return loader.DATA_DIR / INDEX_DIR_NAME / f"{chapter}_{qtype}.idx"
+
+    def _load(self):
+        index_dir = loader.DATA_DIR / INDEX_DIR_NAME
+        for path in index_dir.glob("*_*.json"):
+            path.unlink(missing_ok=True)  # version 1
+        for path in index_dir.glob("*_*.idx"):
+            bank = BankPostings.read(path)
+            if bank is not None:
+                chapter, qtype = path.stem.rsplit("_", 1)
+                self._banks[(chapter, qtype)] = bank
+        self._loaded = True
+
+    def refresh(self):
+        """
+        Brings the index up to date with the bank files; returns the banks
+        that had to be re-tokenized.
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            rebuilt = []
+            keys = self._bank_keys()
+            for chapter, qtype in [k for k in self._banks if k not in keys]:
+                del self._banks[(chapter, qtype)]
+                self._index_path(chapter, qtype).unlink(missing_ok=True)
+            for chapter, qtype in keys:
+                signature = loader.quiz_cache.signature(chapter, qtype)
+                signature = list(signature) if signature is not None else None
+                bank = self._banks.get((chapter, qtype))
+                if bank is not None and bank.signature == signature:
+                    continue
+                bank_hash = loader.quiz_cache.content_hash(chapter, qtype)
+                if bank is None or bank.hash != bank_hash:
+                    bank = BankPostings.build(loader.load_quiz(chapter, qtype), signature, bank_hash)
+                    rebuilt.append((chapter, qtype))
+                bank.signature = signature
+                self._banks[(chapter, qtype)] = bank
+                bank.write(self._index_path(chapter, qtype))
+            return rebuilt
+
+    def search(self, query: str, limit: int = 50):
+        """Returns up to `limit` (chapter, qtype, position) hits, best first."""
+        tokens = query_tokens(query)
+        if not tokens:
+            return []
+        if not self._loaded:
+            self.refresh()
+
+        with self._lock:
+            banks = sorted(self._banks.items(), key=lambda item: item[0])
+        total_docs = 0
+        df = dict.fromkeys(tokens, 0)
+        for _, bank in banks:
+            total_docs += bank.docs
+            for token in tokens:
+                df[token] += bank.count(token)
+        if any(count == 0 for count in df.values()):
+            return []
+        idf = {token: math.log(1 + total_docs / count) for token, count in df.items()}
+        # rarest token first (scores are summed in this order)
+        tokens.sort(key=df.get)
+
+        # A common bigram can match thousands of questions, so the per-hit
+        # work runs in C: candidates are intersected as masks, weights are
+        # read from dense rows and summed token by token with map(), and one
+        # stable sort over every bank (visited in key order, positions
+        # ascending) ranks them exactly like (-score, chapter, qtype, position).
+        ranked, sources = [], []
+        for (chapter, qtype), bank in banks:
+            lists = [bank.get(token) for token in tokens]
+            if not all(lists):
+                continue
+            if len(lists) == 1:
+                # one token has the same idf in every bank: weights rank like scores
+                candidates, scores = lists[0]
+            else:
+                dense = [bank.dense(token, postings) for token, postings in zip(tokens, lists)]
+                mask = -1
+                for token_mask, _ in dense:
+                    mask &= token_mask
+                if not mask:
+                    continue
+                candidates = [m.start() for m in _MASKED.finditer(mask.to_bytes(bank.docs, "little"))]
+                scores = None
+                for token, (_, row) in zip(tokens, dense):
+                    products = map(operator.mul, map(row.__getitem__, candidates), repeat(idf[token]))
+                    scores = products if scores is None else map(operator.add, scores, products)
+            sources.append((len(ranked), chapter, qtype, candidates))
+            ranked.extend(scores)
+        best = sorted(range(len(ranked)), key=ranked.__getitem__, reverse=True)[:limit]
+        starts = [source[0] for source in sources]
+        hits = []
+        for i in best:
+            start, chapter, qtype, candidates = sources[bisect_right(starts, i) - 1]
+            hits.append((chapter, qtype, candidates[i - start]))
+        return hits
+
+    def invalidate(self):
+        """Forgets the in-memory index; the next search reloads and refreshes it."""
+        with self._lock:
+            self._banks.clear()
+            self._loaded = False
+
+
+search_index = SearchIndex()
+
+
+if __name__ == '__main__':
+    # python -m utils.search_index 江永  ->  更新索引并打印检索结果与耗时
+    import sys
+    started = time.perf_counter()
+    rebuilt = search_index.refresh()
+    print(f"索引更新 {(time.perf_counter() - started) * 1000:.1f} ms，重建 {len(rebuilt)} 个题库")
+    for query in sys.argv[1:]:
+        started = time.perf_counter()
+        hits = search_index.search(query)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"{query}: {len(hits)} 条结果，{elapsed:.3f} ms")
+        for chapter, qtype, position in hits[:10]:
+            print(f"  {chapter}/{qtype}#{position}  {loader.load_quiz(chapter, qtype)[position]['question']}")
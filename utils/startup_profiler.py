@@ -0,0 +1,72 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+# Set NVSHU_PROFILE_STARTUP=1 to also write the report to state/startup_profile.json.
+PROFILE_ENV = "NVSHU_PROFILE_STARTUP"
+
+
+class StartupProfiler:
+    """
+    Records how long each cold-start phase takes (imports, kv loading, font
+    registration, screen construction), measured from process start of main.py.
+    Recording is a couple of perf_counter() calls, so it is always on.
+    """
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.records = []  # (category, name, start_ms, duration_ms)
+        self.marks = {}
+
+    @contextmanager
+    def measure(self, category: str, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.records.append((category, name, (start - self.t0) * 1000, (end - start) * 1000))
+
+    def mark(self, name: str):
+        """Remembers a point in time, e.g. 'first_frame'."""
+        self.marks[name] = (time.perf_counter() - self.t0) * 1000
+
+    def totals(self):
+        """Milliseconds spent per category."""
+        totals = {}
+        for category, _, _, duration in self.records:
+            totals[category] = totals.get(category, 0.0) + duration
+        return totals
+
+    def report(self) -> str:
+        lines = ["启动耗时分析 (ms):"]
+        for category, name, start, duration in self.records:
+            lines.append(f"  {category:<10} {name:<24} @{start:8.1f}  {duration:8.1f}")
+        for category, total in self.totals().items():
+            lines.append(f"  合计 {category:<10} {total:8.1f}")
+        for name, at in self.marks.items():
+            lines.append(f"  {name:<35} @{at:8.1f}")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {
+            "records": [
+                {"category": c, "name": n, "start_ms": round(s, 3), "duration_ms": round(d, 3)}
+                for c, n, s, d in self.records
+            ],
+            "totals_ms": {k: round(v, 3) for k, v in self.totals().items()},
+            "marks_ms": {k: round(v, 3) for k, v in self.marks.items()},
+        }
+
+    def dump(self, path):
+        """Writes the report as JSON when PROFILE_ENV is set; returns whether it did."""
+        if not os.environ.get(PROFILE_ENV):
+            return False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        return True
+
+
+startup_profiler = StartupProfiler()
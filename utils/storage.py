@@ -0,0 +1,296 @@
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from utils.progress_array import StreakView, read_streaks, temp_path, update_streaks_in_place, write_streaks
+
+DEFAULT_SETTINGS = {"questions_per_session": 10}
+
+
+class JsonBackend:
+    """
+    The original layout: one pretty-printed JSON file per chapter/type under
+    `progress_dir`, plus a single settings file.
+    """
+    name = "json"
+
+    def __init__(self, progress_dir: Path, state_file: Path):
+        self.progress_dir = Path(progress_dir)
+        self.state_file = Path(state_file)
+        self._dirs_ready = False
+
+    def _ensure_dirs(self):
+        # mkdir once per backend instead of on every read/write
+        if not self._dirs_ready:
+            self.progress_dir.mkdir(parents=True, exist_ok=True)
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            self._dirs_ready = True
+
+    def _progress_path(self, chapter, qtype):
+        return self.progress_dir / f"learned_{chapter}_{qtype}.json"
+
+    def has_progress(self, chapter: str, qtype: str) -> bool:
+        return self._progress_path(chapter, qtype).exists()
+
+    def load_progress(self, chapter: str, qtype: str) -> dict:
+        self._ensure_dirs()
+        try:
+            with open(self._progress_path(chapter, qtype), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError):
+            return {}
+
+    def save_progress(self, chapter: str, qtype: str, progress: dict, changed=None):
+        # A JSON file can only be rewritten as a whole, so `changed` is ignored.
+        self._ensure_dirs()
+        atomic_write_json(self._progress_path(chapter, qtype), progress, indent=2)
+
+    def progress_signature(self, chapter: str, qtype: str):
+        """[mtime_ns, size] of the progress file, or None if there is none."""
+        return _file_signature(self._progress_path(chapter, qtype))
+
+    def learned_counts(self, threshold: int = 2) -> dict:
+        """Returns {(chapter, qtype): (learned, tracked)} for every progress file."""
+        self._ensure_dirs()
+        counts = {}
+        for path in self.progress_dir.glob("learned_*_*.json"):
+            chapter, qtype = path.stem[len("learned_"):].rsplit("_", 1)
+            progress = self.load_progress(chapter, qtype)
+            counts[(chapter, qtype)] = (sum(1 for v in progress.values() if v >= threshold), len(progress))
+        return counts
+
+    def load_settings(self) -> dict:
+        self._ensure_dirs()
+        if not self.state_file.exists():
+            self.save_settings(dict(DEFAULT_SETTINGS))
+        with open(self.state_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_settings(self, settings: dict):
+        self._ensure_dirs()
+        atomic_write_json(self.state_file, settings, indent=2)
+
+    def close(self):
+        pass
+
+
+class BinaryBackend(JsonBackend):
+    """
+    Progress as fixed-layout streak vectors (see utils/progress_array.py): one
+    byte per question, memory-mapped on load and patched in place on save.
+    load_progress returns a dict-compatible StreakView. Settings stay in JSON.
+    A bank that has no .bin file yet is read from its JSON file once and
+    converted on the next save.
+
+    A vector is indexed by position, so it only holds banks whose question
+    ids are their positions (BankIds.identity) and progress whose keys all
+    fit the bank; any other bank keeps its JSON file.
+    """
+    name = "binary"
+
+    def _bin_path(self, chapter, qtype):
+        return self.progress_dir / f"learned_{chapter}_{qtype}.bin"
+
+    @staticmethod
+    def _bank_size(chapter, qtype):
+        """The number of questions in a positional bank, or None if its ids are not positions."""
+        # question_ids goes through the loader, which imports this module
+        from utils.question_ids import question_ids
+        ids = question_ids.bank(chapter, qtype)
+        return len(ids) if ids.identity else None
+
+    def _to_vector(self, chapter, qtype, progress):
+        """`progress` as a StreakView, or None if the bank cannot be stored as a vector."""
+        size = self._bank_size(chapter, qtype)
+        if size is None:
+            return None
+        try:
+            return StreakView.from_dict(progress, size)
+        except KeyError:
+            return None
+
+    def has_progress(self, chapter: str, qtype: str) -> bool:
+        return self._bin_path(chapter, qtype).exists() or super().has_progress(chapter, qtype)
+
+    def load_progress(self, chapter: str, qtype: str):
+        self._ensure_dirs()
+        if self._bank_size(chapter, qtype) is None:
+            return super().load_progress(chapter, qtype)
+        view = read_streaks(self._bin_path(chapter, qtype))
+        if view is None:
+            progress = super().load_progress(chapter, qtype)
+            view = self._to_vector(chapter, qtype, progress)
+            if view is None:
+                return progress
+        return view
+
+    def progress_signature(self, chapter: str, qtype: str):
+        if self._bank_size(chapter, qtype) is None:
+            return super().progress_signature(chapter, qtype)
+        return _file_signature(self._bin_path(chapter, qtype)) or super().progress_signature(chapter, qtype)
+
+    def save_progress(self, chapter: str, qtype: str, progress, changed=None):
+        self._ensure_dirs()
+        if not isinstance(progress, StreakView):
+            view = self._to_vector(chapter, qtype, progress)
+            if view is None:
+                return super().save_progress(chapter, qtype, progress, changed)
+            progress, changed = view, None
+        path = self._bin_path(chapter, qtype)
+        if changed is not None:
+            positions = [int(k) for k in changed]
+            if update_streaks_in_place(path, progress, positions):
+                return
+        write_streaks(path, progress)
+
+    def learned_counts(self, threshold: int = 2) -> dict:
+        self._ensure_dirs()
+        counts = {}
+        # .bin files plus any JSON bank that has not been converted yet
+        stems = {p.stem for p in self.progress_dir.glob("learned_*_*.bin")}
+        stems.update(p.stem for p in self.progress_dir.glob("learned_*_*.json"))
+        for stem in stems:
+            chapter, qtype = stem[len("learned_"):].rsplit("_", 1)
+            progress = self.load_progress(chapter, qtype)
+            if isinstance(progress, StreakView):
+                counts[(chapter, qtype)] = (progress.count_at_least(threshold), len(progress))
+            else:
+                counts[(chapter, qtype)] = (sum(1 for v in progress.values() if v >= threshold), len(progress))
+        return counts
+
+
+class SqliteBackend:
+    """
+    All learner state in one SQLite database (WAL mode). Progress rows are keyed
+    by (chapter, qtype, qid), so an answer only upserts the rows that changed.
+    """
+    name = "sqlite"
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS progress (
+        chapter TEXT NOT NULL,
+        qtype   TEXT NOT NULL,
+        qid     TEXT NOT NULL,
+        streak  INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (chapter, qtype, qid)
+    ) WITHOUT ROWID;
+    -- covers per-chapter mastery counts without touching the table rows
+    CREATE INDEX IF NOT EXISTS idx_progress_streak ON progress (chapter, qtype, streak);
+    -- cross-chapter queries such as "every learned question"
+    CREATE INDEX IF NOT EXISTS idx_progress_by_streak ON progress (streak);
+    CREATE TABLE IF NOT EXISTS settings (
+        key   TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # The progress store flushes from a timer thread, so share one
+        # connection and serialise access with a lock.
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+            self._conn.commit()
+
+    def has_progress(self, chapter: str, qtype: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM progress WHERE chapter = ? AND qtype = ? LIMIT 1", (chapter, qtype)
+            ).fetchone()
+        return row is not None
+
+    def load_progress(self, chapter: str, qtype: str) -> dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT qid, streak FROM progress WHERE chapter = ? AND qtype = ?", (chapter, qtype)
+            ).fetchall()
+        return dict(rows)
+
+    def save_progress(self, chapter: str, qtype: str, progress: dict, changed=None):
+        """Upserts only `changed` keys when given, otherwise replaces the whole chapter/type."""
+        with self._lock, self._conn:
+            if changed is None:
+                self._conn.execute("DELETE FROM progress WHERE chapter = ? AND qtype = ?", (chapter, qtype))
+                keys = progress.keys()
+            else:
+                keys = changed
+            self._conn.executemany(
+                "INSERT INTO progress (chapter, qtype, qid, streak) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (chapter, qtype, qid) DO UPDATE SET streak = excluded.streak",
+                [(chapter, qtype, str(k), int(progress.get(k, 0))) for k in keys],
+            )
+
+    def progress_signature(self, chapter: str, qtype: str):
+        # The database is only written through this backend, so there is
+        # nothing external to detect.
+        return None
+
+    def learned_counts(self, threshold: int = 2) -> dict:
+        """Returns {(chapter, qtype): (learned, tracked)} with a single indexed query."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chapter, qtype, SUM(streak >= ?), COUNT(*) FROM progress GROUP BY chapter, qtype",
+                (threshold,),
+            ).fetchall()
+        return {(chapter, qtype): (learned or 0, total) for chapter, qtype, learned, total in rows}
+
+    def load_settings(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM settings").fetchall()
+        if not rows:
+            self.save_settings(dict(DEFAULT_SETTINGS))
+            return dict(DEFAULT_SETTINGS)
+        return {key: json.loads(value) for key, value in rows}
+
+    def save_settings(self, settings: dict):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM settings")
+            self._conn.executemany(
+                "INSERT INTO settings (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value, ensure_ascii=False)) for key, value in settings.items()],
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _file_signature(path: Path):
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def atomic_write_json(path: Path, data, indent=None):
+    """Writes JSON to a temp file and renames it, so a crash never leaves a truncated file."""
+    tmp_path = temp_path(path)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def migrate_json_to_sqlite(progress_dir: Path, state_file: Path, db_path: Path) -> SqliteBackend:
+    """
+    One-shot copy of every learned_*.json file and the settings file into a
+    SQLite database. The JSON files are left untouched as a backup.
+    """
+    source = JsonBackend(progress_dir, state_file)
+    target = SqliteBackend(db_path)
+    migrated = 0
+    for path in sorted(Path(progress_dir).glob("learned_*_*.json")):
+        chapter, qtype = path.stem[len("learned_"):].rsplit("_", 1)
+        target.save_progress(chapter, qtype, source.load_progress(chapter, qtype))
+        migrated += 1
+    if Path(state_file).exists():
+        target.save_settings(source.load_settings())
+    print(f"已迁移 {migrated} 个进度文件到 {db_path}")
+    return target
@@ -0,0 +1,126 @@
+from collections import OrderedDict
+
+from kivy.factory import Factory
+from kivy.uix.button import Button
+from kivy.uix.label import Label
+
+# Rasterised textures kept alive by the cache (RGBA, 4 bytes per pixel).
+DEFAULT_BUDGET_BYTES = 24 * 1024 * 1024
+
+# Label properties that change how the text is rasterised.
+_KEY_PROPERTIES = (
+    "font_name", "font_size", "text_size", "markup", "color", "disabled_color",
+    "halign", "valign", "padding", "line_height", "bold", "italic", "shorten",
+    "max_lines", "strip", "disabled",
+)
+
+
+class TextRenderCache:
+    """
+    LRU cache of rendered text textures keyed by the text and every option
+    that affects rasterisation (font, size, wrap width, markup, colour...).
+
+    Question texts, option strings and Nvshu titles are laid out again on
+    every pass and round; with this cache each distinct string is rasterised
+    from the (large) Nvshu font once, until it is evicted under the memory
+    budget.
+    """
+
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def _texture_bytes(texture):
+        width, height = texture.size
+        return width * height * 4
+
+    def get(self, key):
+        texture = self._entries.get(key)
+        if texture is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return texture
+
+    def put(self, key, texture):
+        size = self._texture_bytes(texture)
+        if size > self.budget_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.used_bytes -= self._texture_bytes(old)
+        self._entries[key] = texture
+        self.used_bytes += size
+        while self.used_bytes > self.budget_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.used_bytes -= self._texture_bytes(evicted)
+
+    def clear(self):
+        self._entries.clear()
+        self.used_bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self.used_bytes,
+        }
+
+
+text_cache = TextRenderCache()
+
+
+class TextCacheMixin:
+    """
+    Makes a Label (or Button) take its texture from text_cache when the same
+    text was already rendered with the same options. Every cached texture
+    belongs to the cache alone: a widget never renders into one again.
+    """
+
+    def _text_cache_key(self):
+        text = self.text
+        # refs/anchors are computed while rendering and are not cached
+        if not text or (self.markup and ("[ref=" in text or "[anchor=" in text)):
+            return None
+        values = []
+        for name in _KEY_PROPERTIES:
+            value = getattr(self, name)
+            values.append(tuple(value) if isinstance(value, list) else value)
+        return (text, tuple(values))
+
+    def texture_update(self, *largs):
+        key = self._text_cache_key()
+        if key is None:
+            return super().texture_update(*largs)
+        texture = text_cache.get(key)
+        if texture is not None:
+            self.texture = texture
+            self.texture_size = list(texture.size)
+            return
+        super().texture_update(*largs)
+        if self.texture is not None:
+            text_cache.put(key, self.texture)
+            # The core label re-renders into its own texture whenever the next
+            # text has the same size, which would overwrite the cached entry;
+            # detached, its next render creates a new texture.
+            self._label.texture = None
+
+
+class CachedLabel(TextCacheMixin, Label):
+    pass
+
+
+class CachedButton(TextCacheMixin, Button):
+    pass
+
+
+Factory.register("CachedLabel", cls=CachedLabel)
+Factory.register("CachedButton", cls=CachedButton)
@@ -1 +1,149 @@
-# 将在此定义字体混排辅助函数
+# 字体混排辅助函数
+#
+# 女书字符 (U+1B170–U+1B2FF) 只有 NvshuFont 能显示，汉字则交给中文字体。
+# 这里把一段文字按文字种类切分成若干段，并为每段加上 Kivy 的 [font=...] 标记，
+# 同一段文字只切分一次（结果有缓存）。
+import os
+import re
+from bisect import bisect_right
+from functools import lru_cache
+
+HAN = "han"
+NVSHU = "nvshu"
+
+# (first, last, script), sorted by first codepoint. Anything not covered
+# (ASCII, spaces, newlines, general punctuation) is neutral and joins the
+# run around it, so "女书 (𛆁𛈬)" stays two runs instead of five.
+SCRIPT_RANGES = (
+    (0x3000, 0x303F, HAN),      # CJK symbols and punctuation
+    (0x3400, 0x4DBF, HAN),      # CJK extension A
+    (0x4E00, 0x9FFF, HAN),      # CJK unified ideographs
+    (0xF900, 0xFAFF, HAN),      # CJK compatibility ideographs
+    (0xFF00, 0xFFEF, HAN),      # fullwidth forms (，？：！)
+    (0x1B170, 0x1B2FF, NVSHU),  # Nüshu
+    (0x20000, 0x2FA1F, HAN),    # CJK extensions B–F, compatibility supplement
+)
+_STARTS = [first for first, _, _ in SCRIPT_RANGES]
+
+# Neutral-only text is drawn with this script's font.
+DEFAULT_SCRIPT = HAN
+
+# Fonts (LabelBase names) per script. Both start as NvshuFont, which is what
+# every label used before; main.py points HAN at a CJK font when it finds one.
+_fonts = {HAN: "NvshuFont", NVSHU: "NvshuFont"}
+
+# Tried in order by find_han_font(): a bundled font first, then the usual
+# system CJK fonts on Android, Windows, macOS and Linux.
+HAN_FONT_CANDIDATES = (
+    "assets/fonts/HanFont.ttf",
+    "assets/fonts/HanFont.otf",
+    "/system/fonts/NotoSansCJK-Regular.ttc",
+    "/system/fonts/NotoSansSC-Regular.otf",
+    "/system/fonts/DroidSansFallback.ttf",
+    "C:/Windows/Fonts/msyh.ttc",
+    "C:/Windows/Fonts/simhei.ttf",
+    "/System/Library/Fonts/PingFang.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+)
+
+CACHE_SIZE = 4096
+
+
+def _char_class(script):
+    parts = []
+    for first, last, range_script in SCRIPT_RANGES:
+        if range_script == script:
+            parts.append(f"{re.escape(chr(first))}-{re.escape(chr(last))}")
+    return "[" + "".join(parts) + "]+"
+
+
+# One alternation per script, generated from SCRIPT_RANGES: the regex engine
+# finds the runs, so no Python code runs per character.
+_SCRIPT_RUN = re.compile(f"(?P<{HAN}>{_char_class(HAN)})|(?P<{NVSHU}>{_char_class(NVSHU)})")
+
+
+def script_of(char):
+    """Returns HAN, NVSHU or None (neutral) for one character."""
+    cp = ord(char)
+    i = bisect_right(_STARTS, cp) - 1
+    if i >= 0 and cp <= SCRIPT_RANGES[i][1]:
+        return SCRIPT_RANGES[i][2]
+    return None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def segment(text):
+    """
+    Splits text into ((script, run), ...). Neutral characters stay with the
+    preceding run (or the first run, at the start of the text).
+    """
+    runs = []  # [script, start, end]
+    for match in _SCRIPT_RUN.finditer(text):
+        script = match.lastgroup
+        if runs and runs[-1][0] == script:
+            runs[-1][2] = match.end()
+        elif runs:
+            runs[-1][2] = match.start()
+            runs.append([script, match.start(), match.end()])
+        else:
+            runs.append([script, 0, match.end()])
+    if not runs:
+        return ((DEFAULT_SCRIPT, text),) if text else ()
+    runs[-1][2] = len(text)
+    return tuple((script, text[start:end]) for script, start, end in runs)
+
+
+def escape_markup(text):
+    """Same as kivy.utils.escape_markup, without importing Kivy."""
+    return text.replace("&", "&amp;").replace("[", "&bl;").replace("]", "&br;")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _to_markup(text, escape, han_font, nvshu_font):
+    if han_font == nvshu_font:
+        return escape_markup(text) if escape else text
+    fonts = {HAN: han_font, NVSHU: nvshu_font}
+    parts = []
+    for script, run in segment(text):
+        if escape:
+            run = escape_markup(run)
+        parts.append(f"[font={fonts[script]}]{run}[/font]")
+    return "".join(parts)
+
+
+def to_markup(text, escape=True):
+    """
+    Returns text with every script run wrapped in [font=...] for its font;
+    show it in a label with markup: True.
+    escape=False keeps markup that is already in the text (e.g. [b], [color]);
+    tags are ASCII, so run boundaries never fall inside one.
+    """
+    return _to_markup(text, escape, _fonts[HAN], _fonts[NVSHU])
+
+
+def to_markup_many(texts, escape=True):
+    """Batch version of to_markup() for report lines, option lists and the like."""
+    han_font, nvshu_font = _fonts[HAN], _fonts[NVSHU]
+    return [_to_markup(text, escape, han_font, nvshu_font) for text in texts]
+
+
+def configure_fonts(han=None, nvshu=None):
+    """Sets the font used for each script (LabelBase names)."""
+    if han:
+        _fonts[HAN] = han
+    if nvshu:
+        _fonts[NVSHU] = nvshu
+
+
+def find_han_font(candidates=HAN_FONT_CANDIDATES):
+    """Returns the path of the first CJK font that exists, or None."""
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def cache_info():
+    """lru_cache statistics of the markup cache."""
+    return _to_markup.cache_info()